@@ -4,10 +4,11 @@ Each file type (Image, Video, Document) has its own dedicated page
 Each algorithm (RLE, Huffman, LZW) has its own set of routes
 """
 
-from flask import Flask, render_template_string, request, jsonify, send_file
+from flask import Flask, render_template_string, request, jsonify, send_file, g
 import sys
 import os
 import io
+import threading
 from pathlib import Path
 
 # Add project root to path
@@ -15,16 +16,57 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 # Import blueprints
 from routes import rle_bp, huffman_bp, lzw_bp
+from utils.performance import trace_peak_memory
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max
 app.config['SECRET_KEY'] = 'compression_project_separated_2025'
+app.config['COMPRESSION_TIMEOUT'] = 120  # seconds before an in-request codec gives up
+app.config['VIDEO_FRAME_LIMIT'] = 100  # frames the /<codec>/compress/video routes code in-request
+app.config['JOB_TIMEOUT'] = 60 * 60  # seconds before a background job is cancelled
+app.config['TRACE_MEMORY'] = False  # report each request's peak heap use (serialises requests; diagnostics only)
 
 # Register blueprints
 app.register_blueprint(rle_bp)
 app.register_blueprint(huffman_bp)
 app.register_blueprint(lzw_bp)
 
+
+# tracemalloc is process-wide: a request traced alongside another would count
+# the other's allocations too, so traced requests run one at a time
+_memory_trace_lock = threading.Lock()
+
+
+@app.before_request
+def start_memory_trace():
+    """Start tracing allocations when TRACE_MEMORY is enabled."""
+    if app.config.get('TRACE_MEMORY'):
+        _memory_trace_lock.acquire()
+        g.memory_trace_locked = True
+        g.memory_trace = trace_peak_memory()
+        g.memory_usage = g.memory_trace.__enter__()
+
+
+@app.after_request
+def report_memory_trace(response):
+    """Report the request's peak heap use in the X-Memory-Peak header."""
+    trace = g.pop('memory_trace', None)
+    if trace is not None:
+        trace.__exit__(None, None, None)
+        response.headers['X-Memory-Peak'] = str(g.memory_usage['peak'])
+    return response
+
+
+@app.teardown_request
+def end_memory_trace(exc):
+    """Stop tracing even when the request failed, and release the trace lock."""
+    trace = g.pop('memory_trace', None)
+    if trace is not None:
+        trace.__exit__(None, None, None)
+    if g.pop('memory_trace_locked', False):
+        _memory_trace_lock.release()
+
+
 # Create necessary directories
 os.makedirs('uploads', exist_ok=True)
 os.makedirs('compressed', exist_ok=True)
@@ -1077,6 +1119,16 @@ VIDEO_PAGE = COMMON_CSS + """
                 <label for="grayscale">Convert to grayscale before compression</label>
             </div>
             
+            <div class="checkbox-container" style="margin-top: 10px;">
+                <label for="temporalOption" style="margin-right: 10px;">Inter-frame prediction:</label>
+                <select id="temporalOption" style="padding: 8px; border-radius: 5px; border: 1px solid #ccc; background: white; cursor: pointer;">
+                    <option value="diff" selected>Difference from previous frame (Recommended)</option>
+                    <option value="xor">XOR with previous frame</option>
+                    <option value="motion">Motion-compensated (best for panning footage)</option>
+                    <option value="none">None (code every frame on its own)</option>
+                </select>
+            </div>
+            
             <div id="fileInfo" style="margin-top: 20px; display: none;">
                 <p><strong>Selected file:</strong> <span id="fileName"></span></p>
                 <p><strong>File size:</strong> <span id="fileSize"></span></p>
@@ -1160,12 +1212,43 @@ function handleFile(file) {
     buttons.forEach(id => document.getElementById(id).disabled = false);
 }
 
-async function compressVideo(algorithm) {
-    if (!selectedFile) return;
-    
+// Whole videos take a while, so they are compressed as background jobs
+async function runVideoJob(algorithm, onProgress) {
     const formData = new FormData();
     formData.append('file', selectedFile);
+    formData.append('algorithm', algorithm);
     formData.append('grayscale', document.getElementById('grayscale').checked);
+    formData.append('temporal', document.getElementById('temporalOption').value);
+    
+    const response = await fetch('/api/video/compress', {
+        method: 'POST',
+        body: formData
+    });
+    const submitted = await response.json();
+    if (submitted.error) {
+        return { algorithm: algorithm.toUpperCase(), error: submitted.error };
+    }
+    
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const job = await (await fetch(`/api/jobs/${submitted.job_id}`)).json();
+        if (job.status === 'completed') {
+            return job.result;
+        }
+        if (job.status === 'failed' || job.status === 'cancelled' || job.error) {
+            return { algorithm: algorithm.toUpperCase(), error: job.error || job.status };
+        }
+        onProgress(job.progress);
+    }
+}
+
+function showVideoProgress(algorithm, progress) {
+    document.getElementById('resultsContent').innerHTML = '<div class="loading"></div> Compressing with ' +
+        algorithm.toUpperCase() + '... ' + Math.round(progress * 100) + '%';
+}
+
+async function compressVideo(algorithm) {
+    if (!selectedFile) return;
     
     const resultsArea = document.getElementById('resultsArea');
     const resultsContent = document.getElementById('resultsContent');
@@ -1174,12 +1257,7 @@ async function compressVideo(algorithm) {
     resultsContent.innerHTML = '<div class="loading"></div> Compressing with ' + algorithm.toUpperCase() + '...';
     
     try {
-        const response = await fetch(`/${algorithm}/compress/video`, {
-            method: 'POST',
-            body: formData
-        });
-        
-        const data = await response.json();
+        const data = await runVideoJob(algorithm, progress => showVideoProgress(algorithm, progress));
         
         if (data.error) {
             resultsContent.innerHTML = `<div class="error">Error: ${data.error}</div>`;
@@ -1204,17 +1282,8 @@ async function compressVideoAll() {
     const results = [];
     
     for (const algo of algorithms) {
-        const formData = new FormData();
-        formData.append('file', selectedFile);
-        formData.append('grayscale', document.getElementById('grayscale').checked);
-        
         try {
-            const response = await fetch(`/${algo}/compress/video`, {
-                method: 'POST',
-                body: formData
-            });
-            const data = await response.json();
-            results.push(data);
+            results.push(await runVideoJob(algo, progress => showVideoProgress(algo, progress)));
         } catch (error) {
             results.push({ algorithm: algo, error: error.message });
         }
@@ -1416,6 +1485,11 @@ DOCUMENT_PAGE = COMMON_CSS + """
                 <input type="file" id="fileInput" accept=".txt,.pdf,.docx,.csv">
             </div>
             
+            <div class="checkbox-container">
+                <input type="checkbox" id="columnar" checked>
+                <label for="columnar">Compress CSV files column by column (numbers, categories and text coded separately)</label>
+            </div>
+            
             <div id="fileInfo" style="margin-top: 20px; display: none;">
                 <p><strong>Selected file:</strong> <span id="fileName"></span></p>
                 <p><strong>File size:</strong> <span id="fileSize"></span></p>
@@ -1507,6 +1581,7 @@ async function compressDocument(algorithm) {
     
     const formData = new FormData();
     formData.append('file', selectedFile);
+    formData.append('columnar', document.getElementById('columnar').checked);
     
     const resultsArea = document.getElementById('resultsArea');
     const resultsContent = document.getElementById('resultsContent');
@@ -1547,6 +1622,7 @@ async function compressDocumentAll() {
     for (const algo of algorithms) {
         const formData = new FormData();
         formData.append('file', selectedFile);
+        formData.append('columnar', document.getElementById('columnar').checked);
         
         try {
             const response = await fetch(`/${algo}/compress/document`, {
@@ -2603,6 +2679,443 @@ def api_statistics():
     return jsonify(statistics)
 
 
+def run_archive_job(filepath, filename, level, progress, cancel=None):
+    """Compress a document with a background-only codec and store the result"""
+    import pickle
+    import time
+    from algorithms import codec_registry
+    from handlers import document_handler
+    from utils.database import get_db
+    
+    try:
+        codec_key, params = codec_registry.resolve_level(level)
+        codec = codec_registry.get_codec(codec_key)
+        
+        doc_data = document_handler.prepare_for_compression(filepath)
+        data = doc_data['data']
+        progress(0.1)
+        
+        start_time = time.time()
+        compressed_bytes = codec_registry.compress(codec_key, data, cancel=cancel, **params)
+        compress_time = time.time() - start_time
+        progress(0.9)
+        
+        original_size = len(data)
+        compressed_size = len(compressed_bytes)
+        ratio = compressed_size / original_size if original_size > 0 else 0
+        savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+        
+        db = get_db()
+        with open(filepath, 'rb') as f:
+            original_file_id = db.store_file(f.read(), filename, 'document')
+        
+        compressed_data = {
+            'compressed': compressed_bytes,
+            'codec': codec_key,
+            'level': level,
+            'format': doc_data.get('format'),
+            'length': doc_data.get('length')
+        }
+        compressed_file_id = db.store_compressed_file(pickle.dumps(compressed_data), filename, codec_key)
+        
+        record = {
+            'filename': filename,
+            'file_type': 'document',
+            'algorithm': codec['name'],
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'compression_ratio': ratio,
+            'space_savings': savings,
+            'compression_time': compress_time,
+            'original_file_id': original_file_id,
+            'compressed_file_id': compressed_file_id,
+            'metadata': {
+                'format': doc_data.get('format'),
+                'length': doc_data.get('length'),
+                'level': level
+            }
+        }
+        record_id = db.save_compression_record(record)
+        
+        return {
+            'record_id': record_id,
+            'original_file_id': original_file_id,
+            'compressed_file_id': compressed_file_id,
+            'algorithm': codec['name'],
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'compression_ratio': round(ratio, 4),
+            'space_savings': round(savings, 2),
+            'compression_time': round(compress_time, 6)
+        }
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+
+def run_video_job(filepath, filename, codec_key, level, grayscale, temporal, progress, cancel=None):
+    """Compress a whole video in the background, streaming its frames"""
+    import pickle
+    import time
+    from algorithms import codec_registry
+    from handlers import video_handler, video_pipeline
+    from utils.database import get_db
+    
+    try:
+        codec = codec_registry.get_codec(codec_key)
+        params = codec_registry.level_params(codec_key, level)
+        video_data = video_handler.video_info(filepath)
+        total = video_data['total_frames']
+        
+        def counted(frames, start, span):
+            """Pass frames through, reporting progress over start..start + span"""
+            for number, frame in enumerate(frames, 1):
+                if total:
+                    progress(start + span * min(number / total, 1.0))
+                yield frame
+        
+        # Compression takes most of the time, the verifying decode the rest
+        start_time = time.time()
+        container = video_pipeline.compress_video(
+            counted(video_handler.iter_frames(filepath, grayscale=grayscale, cancel=cancel), 0.0, 0.7),
+            codec_key, params, temporal=temporal, cancel=cancel
+        )
+        compress_time = time.time() - start_time
+        video_data['frame_count'] = container['frame_count']
+        
+        start_time = time.time()
+        is_correct = video_pipeline.verify_video(
+            container,
+            counted(video_handler.iter_frames(filepath, grayscale=grayscale, cancel=cancel), 0.7, 0.25),
+            cancel=cancel
+        )
+        decompress_time = time.time() - start_time
+        
+        original_size = container['raw_size']
+        compressed_size = video_pipeline.compressed_size(container)
+        ratio = compressed_size / original_size if original_size > 0 else 0
+        savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+        
+        db = get_db()
+        with open(filepath, 'rb') as f:
+            original_file_id = db.store_file(f, filename, 'video')
+        
+        compressed_data = dict(
+            container,
+            level=level,
+            fps=video_data.get('fps'),
+            width=video_data.get('width'),
+            height=video_data.get('height'),
+            grayscale=grayscale
+        )
+        compressed_file_id = db.store_compressed_file(pickle.dumps(compressed_data), filename, codec_key)
+        
+        metadata = {
+            'fps': video_data.get('fps'),
+            'width': video_data.get('width'),
+            'height': video_data.get('height'),
+            'frame_count': video_data.get('frame_count'),
+            'grayscale': grayscale,
+            'temporal': temporal
+        }
+        record = {
+            'level': level,
+            'filename': filename,
+            'file_type': 'video',
+            'algorithm': codec['name'],
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'compression_ratio': ratio,
+            'space_savings': savings,
+            'compression_time': compress_time,
+            'decompression_time': decompress_time,
+            'is_correct': is_correct,
+            'original_file_id': original_file_id,
+            'compressed_file_id': compressed_file_id,
+            'metadata': metadata
+        }
+        record_id = db.save_compression_record(record)
+        
+        return {
+            'level': level,
+            'record_id': record_id,
+            'original_file_id': original_file_id,
+            'compressed_file_id': compressed_file_id,
+            'algorithm': codec['name'],
+            'file_type': 'video',
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'compression_ratio': round(ratio, 4),
+            'space_savings': round(savings, 2),
+            'compression_time': round(compress_time, 6),
+            'decompression_time': round(decompress_time, 6),
+            'is_correct': is_correct,
+            'metadata': metadata
+        }
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+
+@app.route('/api/video/compress', methods=['POST'])
+def api_compress_video():
+    """Queue compression of a whole video; poll /api/jobs/<job_id> for the result"""
+    import uuid
+    from algorithms import codec_registry
+    from handlers import video_pipeline
+    from utils.jobs import submit_job
+    from routes.rle_routes import sanitize_filename
+    
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file uploaded'}), 400
+        
+        file = request.files['file']
+        if not file.filename:
+            return jsonify({'error': 'No file selected'}), 400
+        
+        codec_key = request.form.get('algorithm', 'huffman').lower()
+        level = request.form.get('level')
+        grayscale = request.form.get('grayscale', 'false').lower() == 'true'
+        temporal = request.form.get('temporal', 'diff')
+        
+        codec = codec_registry.get_codec(codec_key)
+        if codec['background_only'] or 'video' not in codec['file_types']:
+            raise ValueError(f"{codec['name']} cannot be used for videos")
+        codec_registry.level_params(codec_key, level)
+        if temporal not in video_pipeline.TEMPORAL_MODES:
+            raise ValueError(f"Unknown temporal mode: {temporal}")
+        
+        # Unique name: several jobs for the same upload may be queued at once
+        filepath = os.path.join('uploads', f"video_{uuid.uuid4().hex}_{sanitize_filename(file.filename)}")
+        file.save(filepath)
+        
+        job_id = submit_job('video', run_video_job, filepath, file.filename, codec_key, level,
+                            grayscale, temporal, timeout=app.config.get('JOB_TIMEOUT'))
+        return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/archive/document', methods=['POST'])
+def api_archive_document():
+    """Queue maximum-ratio archival compression of a document"""
+    import uuid
+    from algorithms import codec_registry
+    from utils.jobs import submit_job
+    from routes.rle_routes import sanitize_filename
+    
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file uploaded'}), 400
+        
+        file = request.files['file']
+        level = request.form.get('level', 'archive')
+        
+        if not file.filename:
+            return jsonify({'error': 'No file selected'}), 400
+        
+        codec_key, _ = codec_registry.resolve_level(level)
+        if not codec_registry.get_codec(codec_key)['background_only']:
+            return jsonify({'error': f'Level {level} does not need a background job'}), 400
+        
+        filepath = os.path.join('uploads', f"archive_{uuid.uuid4().hex}_{sanitize_filename(file.filename)}")
+        file.save(filepath)
+        
+        job_id = submit_job('archive', run_archive_job, filepath, file.filename, level,
+                            timeout=app.config.get('JOB_TIMEOUT'))
+        return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    """API endpoint for background job status"""
+    from utils.jobs import get_job
+    
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def api_cancel_job(job_id):
+    """API endpoint to cancel a queued or running background job"""
+    from utils.jobs import get_job, cancel_job
+    
+    if get_job(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not cancel_job(job_id):
+        return jsonify({'error': 'Job has already finished'}), 409
+    return jsonify({'job_id': job_id, 'status': 'cancelling'})
+
+
+@app.route('/api/image/compress', methods=['POST'])
+def api_compress_image_pipeline():
+    """Compress an image through the planar image pipeline"""
+    import pickle
+    import time
+    import numpy as np
+    from algorithms import codec_registry
+    from algorithms.cancellation import CancellationToken, CompressionCancelled
+    from handlers import image_handler, image_pipeline
+    from utils.database import get_db
+    from routes.rle_routes import sanitize_filename
+    
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file uploaded'}), 400
+        
+        file = request.files['file']
+        if not file.filename:
+            return jsonify({'error': 'No file selected'}), 400
+        
+        codec_key = request.form.get('algorithm', 'huffman').lower()
+        mode = request.form.get('mode', 'auto')
+        level = request.form.get('level')
+        color_transform = request.form.get('color_transform', 'none')
+        run_coding = request.form.get('run_coding', 'none')
+        use_palette = request.form.get('palette', 'true').lower() == 'true'
+        grayscale = request.form.get('grayscale', 'false').lower() == 'true'
+        # Comma-separated codec per plane in planar mode, e.g. 'huffman,huffman,huffman,rle'
+        plane_codec_keys = [key.strip().lower() for key in request.form.get('plane_codecs', '').split(',') if key.strip()]
+        try:
+            for key in [codec_key] + plane_codec_keys:
+                codec = codec_registry.get_codec(key)
+                if codec['background_only'] or 'image' not in codec['file_types']:
+                    raise ValueError(f"{codec['name']} cannot be used for images")
+            codec = codec_registry.get_codec(codec_key)
+            params = codec_registry.level_params(codec_key, level)
+            plane_codecs = [(key, codec_registry.level_params(key, level)) for key in plane_codec_keys] or None
+            if mode != 'auto' and mode not in image_pipeline.MODES:
+                raise ValueError(f"Unknown image pipeline mode: {mode}")
+            if color_transform not in image_pipeline.COLOR_TRANSFORMS:
+                raise ValueError(f"Unknown colour transform: {color_transform}")
+            if run_coding not in image_pipeline.RUN_CODINGS:
+                raise ValueError(f"Unknown run coding: {run_coding}")
+            if plane_codecs and mode not in ('auto', 'planar'):
+                raise ValueError("Per-plane codecs are only available in planar mode")
+            resize_param = image_handler.parse_resize_percent(request.form.get('resize'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        cancel = CancellationToken(timeout=app.config.get('COMPRESSION_TIMEOUT'))
+        
+        filepath = os.path.join('uploads', f"pipeline_{sanitize_filename(file.filename)}")
+        file.save(filepath)
+        try:
+            img, _ = image_handler.open_for_compression(filepath, grayscale=grayscale, resize_percent=resize_param)
+            img_array = np.asarray(img)
+            with open(filepath, 'rb') as f:
+                original_bytes = f.read()
+        finally:
+            os.remove(filepath)
+        
+        if mode == 'auto' and plane_codecs:
+            mode = 'planar'
+        if mode == 'auto':
+            options = {'run_coding': run_coding, 'color_transform': color_transform, 'use_palette': use_palette}
+        elif mode == 'bitplane':
+            options = {'run_coding': run_coding}
+        elif mode == 'wavelet':
+            options = {'color_transform': color_transform}
+        else:
+            options = {'color_transform': color_transform, 'use_palette': use_palette}
+            if plane_codecs:
+                options.update(use_palette=False, plane_codecs=plane_codecs)
+        
+        start_time = time.time()
+        try:
+            if mode == 'auto':
+                container = image_pipeline.compress_auto(img_array, codec_key, params, cancel=cancel, **options)
+                mode = container['pipeline']
+                options = {'run_coding': run_coding} if mode == 'bitplane' else \
+                    {'color_transform': color_transform, 'use_palette': use_palette}
+            else:
+                container = image_pipeline.compress_image(img_array, codec_key, params, mode, cancel=cancel, **options)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        compress_time = time.time() - start_time
+        
+        start_time = time.time()
+        is_correct = bool(np.array_equal(image_pipeline.decompress_image(container, cancel=cancel), img_array))
+        decompress_time = time.time() - start_time
+        
+        container.update({'level': level, 'mode': img.mode, 'format': img.format})
+        compressed_bytes = pickle.dumps(container)
+        
+        original_size = img_array.size
+        compressed_size = image_pipeline.compressed_size(container)
+        ratio = compressed_size / original_size if original_size > 0 else 0
+        savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+        actual_compressed_size = len(compressed_bytes)
+        actual_ratio = actual_compressed_size / original_size if original_size > 0 else 0
+        
+        metadata = {
+            'shape': img_array.shape,
+            'mode': img.mode,
+            'grayscale': grayscale,
+            'pipeline': mode,
+            'planes': image_pipeline.plane_summary(container),
+            'palette_colors': len(container['palette']) if container.get('palette') is not None else None,
+            **options
+        }
+        
+        db = get_db()
+        original_file_id = db.store_file(original_bytes, file.filename, 'image')
+        compressed_file_id = db.store_compressed_file(compressed_bytes, file.filename, codec_key)
+        record_id = db.save_compression_record({
+            'level': level,
+            'filename': file.filename,
+            'file_type': 'image',
+            'algorithm': codec['name'],
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'compression_ratio': ratio,
+            'space_savings': savings,
+            'compression_time': compress_time,
+            'decompression_time': decompress_time,
+            'is_correct': is_correct,
+            'original_file_id': original_file_id,
+            'compressed_file_id': compressed_file_id,
+            'actual_file_size': actual_compressed_size,
+            'actual_ratio': round(actual_ratio, 4),
+            'metadata': metadata
+        })
+        
+        return jsonify({
+            'level': level,
+            'algorithm': codec['name'],
+            'file_type': 'image',
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'compression_ratio': round(ratio, 4),
+            'space_savings': round(savings, 2),
+            'actual_file_size': actual_compressed_size,
+            'actual_ratio': round(actual_ratio, 4),
+            'compression_time': round(compress_time, 6),
+            'decompression_time': round(decompress_time, 6),
+            'is_correct': is_correct,
+            'record_id': record_id,
+            'original_file_id': original_file_id,
+            'compressed_file_id': compressed_file_id,
+            'metadata': metadata
+        })
+        
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/download/original/<file_id>')
 def download_original(file_id):
     """Download original file"""
@@ -2656,9 +3169,12 @@ def download_compressed(file_id):
     """Download compressed file"""
     from utils.database import get_db
     import pickle
-    from algorithms import rle, huffman, lzw
+    from algorithms import rle, huffman, lzw, codec_registry
     from PIL import Image
     import numpy as np
+    import mimetypes
+    from flask import Response
+    from handlers import image_handler, image_pipeline, video_handler, csv_pipeline
     
     db = get_db()
     
@@ -2685,12 +3201,25 @@ def download_compressed(file_id):
                 codes = compressed_obj.get('codes', {})
                 decompressed = huffman.decompress(encoded, codes)
             elif algorithm == 'lzw':
-                decompressed = lzw.decompress(compressed_obj.get('compressed', []))
+                dictionary_id = compressed_obj.get('dictionary_id')
+                dictionary = db.get_dictionary(dictionary_id) if dictionary_id else None
+                max_bits = compressed_obj.get('params', {}).get('max_bits')
+                decompressed = lzw.decompress(compressed_obj.get('compressed', []), dictionary, max_bits)
+            elif algorithm in codec_registry.CODECS:
+                decompressed = codec_registry.decompress(algorithm, compressed_obj['compressed'])
             else:
                 decompressed = str(compressed_obj)
             
+            # RLE yields byte values; containers from before the byte
+            # pipeline hold characters or code points instead
+            if isinstance(decompressed, (list, tuple)):
+                if all(isinstance(value, int) and value < 256 for value in decompressed):
+                    decompressed = bytes(decompressed)
+                else:
+                    decompressed = ''.join(value if isinstance(value, str) else chr(value) for value in decompressed)
+            
             # Return as readable text file
-            text_data = decompressed.encode('utf-8') if isinstance(decompressed, str) else bytes(decompressed) if isinstance(decompressed, (list, tuple)) else decompressed
+            text_data = decompressed.encode('utf-8') if isinstance(decompressed, str) else decompressed
             return send_file(
                 io.BytesIO(text_data),
                 as_attachment=True,
@@ -2700,8 +3229,30 @@ def download_compressed(file_id):
         except Exception as e:
             print(f"Error decompressing text: {e}")
     
+    # Columnar CSV containers are decoded and sent one block of rows at a time
+    elif file_extension == '.csv':
+        try:
+            compressed_obj = pickle.loads(file_data)
+            if compressed_obj.get('pipeline') == 'csv':
+                return Response(
+                    (text.encode('utf-8') for text in csv_pipeline.iter_text(compressed_obj)),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename="{original_filename}"'}
+                )
+        except Exception as e:
+            print(f"Error decompressing CSV: {e}")
+    
     # For image files, decompress and return as image
     elif file_extension in ['.png', '.jpg', '.jpeg', '.bmp', '.gif']:
+        # Optional crop (?x=&y=&w=&h=) and preview scale (?scale=percent)
+        region = [request.args.get(key, type=int) for key in ('x', 'y', 'w', 'h')]
+        scale = request.args.get('scale', type=int)
+        if any(v is not None for v in region) and (None in region or region[2] <= 0 or region[3] <= 0):
+            return jsonify({'error': 'Crops need x, y and a positive w and h'}), 400
+        if scale is not None and not 1 <= scale <= 100:
+            return jsonify({'error': 'Scale must be a percentage between 1 and 100'}), 400
+        crop = None not in region
+        
         try:
             compressed_obj = pickle.loads(file_data)
             
@@ -2710,7 +3261,10 @@ def download_compressed(file_id):
             mode = compressed_obj.get('mode', 'L')
             
             # Decompress based on algorithm
-            if algorithm == 'rle':
+            if compressed_obj.get('pipeline'):
+                # Pipeline containers decode straight to pixels
+                data = None
+            elif algorithm == 'rle':
                 compressed_data = compressed_obj.get('compressed', [])
                 decompressed = rle.decompress(compressed_data)
                 # Convert back to image data
@@ -2722,16 +3276,47 @@ def download_compressed(file_id):
                 data = [ord(c) if isinstance(c, str) else c for c in decompressed]
             elif algorithm == 'lzw':
                 compressed_data = compressed_obj.get('compressed', [])
-                decompressed = lzw.decompress(compressed_data)
+                decompressed = lzw.decompress(compressed_data, **compressed_obj.get('params', {}))
                 data = [ord(c) if isinstance(c, str) else c for c in decompressed]
             else:
                 return jsonify({'error': 'Unknown algorithm'}), 400
             
             # Reconstruct image
             if shape:
-                img_array = np.array(data[:np.prod(shape)], dtype=np.uint8).reshape(shape)
+                full_size = None
+                if data is None and crop:
+                    # Tiled containers decode only the tiles under the crop
+                    try:
+                        img_array = image_pipeline.decode_region(compressed_obj, *region)
+                    except ValueError as e:
+                        return jsonify({'error': str(e)}), 400
+                elif data is None and scale and compressed_obj['pipeline'] == 'wavelet':
+                    # Skip the finest wavelet levels; LANCZOS below covers the rest
+                    reduction = (100 // scale).bit_length() - 1
+                    img_array = image_pipeline.decode_preview(compressed_obj, reduction)
+                    full_size = (shape[1], shape[0])
+                elif data is None:
+                    img_array = image_pipeline.decompress_image(compressed_obj)
+                else:
+                    # Containers without a predictor hold 1D delta residuals
+                    img_array = image_handler.decode_image(
+                        data, shape,
+                        compressed_obj.get('predictor') or 'delta',
+                        compressed_obj.get('filters'),
+                        compressed_obj.get('palette')
+                    )
+                    if crop:
+                        x, y, w, h = region
+                        img_array = img_array[max(y, 0):y + h, max(x, 0):x + w]
+                        if not img_array.size:
+                            return jsonify({'error': 'Crop lies outside the image'}), 400
                 img = Image.fromarray(img_array, mode=mode)
                 
+                if scale and scale < 100:
+                    width, height = full_size or img.size
+                    preview_size = (max(1, width * scale // 100), max(1, height * scale // 100))
+                    img = img.resize(preview_size, Image.Resampling.LANCZOS)
+                
                 # Save to buffer
                 img_buffer = io.BytesIO()
                 img_format = file_extension[1:].upper()
@@ -2749,6 +3334,57 @@ def download_compressed(file_id):
         except Exception as e:
             print(f"Error decompressing image: {e}")
     
+    # For videos, ?frame=n previews one frame as a PNG, decoding only its GOP
+    elif file_extension in ['.mp4', '.avi', '.mov', '.mkv'] and 'frame' in request.args:
+        frame_number = request.args.get('frame', type=int)
+        if frame_number is None:
+            return jsonify({'error': 'Frame must be a whole number'}), 400
+        
+        try:
+            compressed_obj = pickle.loads(file_data)
+            if compressed_obj.get('pipeline') != 'video':
+                return jsonify({'error': 'This video was stored without a frame index'}), 400
+            
+            try:
+                frame = video_handler.reconstruct_video(compressed_obj, frame_number, frame_number + 1)[0]
+            except (ValueError, IndexError):
+                return jsonify({'error': f"Frame {frame_number} is out of range"}), 400
+            # OpenCV frames are BGR
+            img = Image.fromarray(frame if frame.ndim == 2 else np.ascontiguousarray(frame[..., ::-1]))
+            
+            img_buffer = io.BytesIO()
+            img.save(img_buffer, format='PNG')
+            img_buffer.seek(0)
+            
+            return send_file(
+                img_buffer,
+                as_attachment=True,
+                download_name=f"{os.path.splitext(original_filename)[0]}_frame{frame_number}.png",
+                mimetype='image/png'
+            )
+        except Exception as e:
+            print(f"Error decompressing video frame: {e}")
+    
+    # Indexed videos are reconstructed and sent while they are being encoded;
+    # ?start=&end= cuts a clip, decoding only the GOPs involved
+    elif file_extension in ['.mp4', '.avi', '.mov', '.mkv']:
+        start = request.args.get('start', 0, type=int)
+        end = request.args.get('end', type=int)
+        if start < 0 or (end is not None and end <= start):
+            return jsonify({'error': 'Clips need 0 <= start < end'}), 400
+        
+        try:
+            compressed_obj = pickle.loads(file_data)
+            if compressed_obj.get('pipeline') == 'video':
+                frames = video_handler.iter_reconstructed(compressed_obj, start, end)
+                return Response(
+                    video_handler.stream_video(frames, compressed_obj.get('fps') or 30, file_extension),
+                    mimetype=mimetypes.guess_type(original_filename)[0] or 'application/octet-stream',
+                    headers={'Content-Disposition': f'attachment; filename="{original_filename}"'}
+                )
+        except Exception as e:
+            print(f"Error decompressing video: {e}")
+    
     # For other files (video, documents), return the raw compressed data with proper extension
     # These will need to be decompressed using a separate tool
     return send_file(
@@ -0,0 +1,56 @@
+"""
+Cooperative Cancellation for Compression
+Codecs poll a token inside their hot loops so abandoned or timed-out jobs stop early
+"""
+
+import threading
+import time
+
+
+# Items (symbols, codes or bits) processed between token checks
+CHECK_INTERVAL = 1 << 16
+
+
+class CompressionCancelled(Exception):
+    """Raised inside a codec when its cancellation token fires."""
+
+
+class CancellationToken:
+    """
+    Cancellation flag with an optional deadline.
+
+    Shared between the thread that owns a job (a request handler, the GUI,
+    a background job) and the codec doing the work. The codec calls check()
+    every CHECK_INTERVAL items.
+    """
+
+    def __init__(self, timeout=None, deadline=None):
+        """
+        Args:
+            timeout: Seconds from now after which the token fires
+            deadline: Absolute time.monotonic() value after which the token fires
+        """
+        if deadline is None and timeout:
+            deadline = time.monotonic() + float(timeout)
+        self.deadline = deadline
+        self.reason = None
+        self._event = threading.Event()
+
+    def cancel(self, reason='cancelled by caller'):
+        """Request cancellation; the codec stops at its next check."""
+        self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.reason = self.reason or 'deadline exceeded'
+            return True
+        return False
+
+    def check(self):
+        """Raise CompressionCancelled if the token has fired."""
+        if self.cancelled:
+            raise CompressionCancelled(self.reason)
@@ -0,0 +1,173 @@
+"""
+Codec Registry
+Maps codec names and named levels to compression modules and parameters
+Lets routes and tools select codecs uniformly instead of hard-coding imports
+"""
+
+from algorithms import rle, huffman, lzw, context_mixing, rice
+
+
+# Every codec module provides compress_to_bytes() / decompress_from_bytes(),
+# taking a bytes-like buffer (text is UTF-8 encoded by the caller) and
+# returning the original bytes
+# Image transforms that need the pixel layout, such as the LeGall 5/3
+# wavelet, are modes of handlers.image_pipeline rather than codecs here;
+# they code their planes or subbands with one of these codecs
+CODECS = {
+    'rle': {
+        'name': 'RLE',
+        'module': rle,
+        'file_types': ['text', 'image', 'video', 'document'],
+        'background_only': False
+    },
+    'huffman': {
+        'name': 'Huffman',
+        'module': huffman,
+        'file_types': ['text', 'image', 'video', 'document'],
+        'background_only': False
+    },
+    'lzw': {
+        'name': 'LZW',
+        'module': lzw,
+        'file_types': ['text', 'image', 'video', 'document'],
+        'background_only': False
+    },
+    'rice': {
+        'name': 'Rice',
+        'module': rice,
+        # Codes bytes as signed prediction residuals; only pays off after a predictor
+        'file_types': ['image'],
+        'background_only': False
+    },
+    'cm': {
+        'name': 'CM',
+        'module': context_mixing,
+        'file_types': ['text', 'document'],
+        # Roughly 10 KB/s: far too slow for a request/response cycle
+        'background_only': True
+    },
+}
+
+# Named levels resolve to a codec plus its parameters
+NAMED_LEVELS = {
+    'archive': ('cm', {'max_order': 4}),
+}
+
+# Numeric levels 1 (fastest) to 9 (smallest output), per codec. Where a
+# codec has fewer settings that actually differ, neighbouring levels share one
+LEVEL_PARAMS = {
+    # Shortest run kept as a pair; shorter runs become literal blocks. Plain
+    # pairs (min_run=1, the level-less default) are both larger and slower on
+    # anything but long runs, so no level uses them
+    'rle': [{'min_run': 2}] * 3 + [{'min_run': 3}] * 3 + [{'min_run': 4}] * 3,
+    # Code length limit in bits. 12-bit codes always decode through a small
+    # lookup table; unrestricted codes on skewed data can reach 20 bits and
+    # decode about twice as slowly, for a few tenths of a percent less output
+    'huffman': [{'max_code_length': 12}] * 4 + [{'max_code_length': None}] * 5,
+    # Dictionary size as 2**max_bits entries. Speed barely changes; a larger
+    # dictionary keeps learning phrases on longer inputs at the cost of memory
+    'lzw': [{'max_bits': 12}] * 3 + [{'max_bits': 16}] * 3 + [{'max_bits': 20}] * 3,
+    # Values per context the Rice parameter is estimated from; short windows
+    # follow local detail more closely (speed is the same at every level)
+    'rice': [{'window': 64}] * 3 + [{'window': 16}] * 3 + [{'window': 8}] * 3,
+    # Highest context order modelled
+    'cm': [{'max_order': 1}] * 3 + [{'max_order': 2}] * 3 + [{'max_order': 3}] * 2 + [{'max_order': 4}],
+}
+
+MIN_LEVEL = 1
+MAX_LEVEL = 9
+
+
+def get_codec(name):
+    """
+    Look up a codec by name.
+
+    Args:
+        name: Codec key (e.g. 'rle', 'huffman', 'lzw', 'rice', 'cm')
+
+    Returns:
+        Codec description dictionary
+    """
+    key = name.lower()
+    if key not in CODECS:
+        raise ValueError(f"Unknown codec: {name}")
+    return CODECS[key]
+
+
+def resolve_level(level):
+    """
+    Resolve a named level to a codec and its parameters.
+
+    Args:
+        level: Level name (e.g. 'archive')
+
+    Returns:
+        Tuple of (codec key, parameter dictionary)
+    """
+    key = str(level).lower()
+    if key not in NAMED_LEVELS:
+        raise ValueError(f"Unknown compression level: {level}")
+    codec_key, params = NAMED_LEVELS[key]
+    return codec_key, dict(params)
+
+
+def level_params(name, level):
+    """
+    Map a compression level to concrete parameters for a codec.
+
+    Args:
+        name: Codec key
+        level: 1-9, a named level for this codec, or None for codec defaults
+
+    Returns:
+        Parameter dictionary to pass to the codec's compress functions
+    """
+    get_codec(name)
+    key = name.lower()
+    if level is None or str(level).strip() == '':
+        return {}
+
+    if str(level).lower() in NAMED_LEVELS:
+        codec_key, params = resolve_level(level)
+        if codec_key != key:
+            raise ValueError(f"Level {level} is not available for {name}")
+        return params
+
+    try:
+        number = int(level)
+    except (TypeError, ValueError):
+        raise ValueError(f"Unknown compression level: {level}")
+    if not MIN_LEVEL <= number <= MAX_LEVEL:
+        raise ValueError(f"Compression level must be between {MIN_LEVEL} and {MAX_LEVEL}")
+    return dict(LEVEL_PARAMS[key][number - 1])
+
+
+def list_codecs(file_type=None, include_background=True):
+    """
+    List registered codec keys.
+
+    Args:
+        file_type: Only include codecs supporting this file type
+        include_background: Include codecs restricted to background jobs
+
+    Returns:
+        List of codec keys
+    """
+    keys = []
+    for key, codec in CODECS.items():
+        if file_type and file_type not in codec['file_types']:
+            continue
+        if not include_background and codec['background_only']:
+            continue
+        keys.append(key)
+    return keys
+
+
+def compress(name, data, **params):
+    """Compress data to bytes with the named codec."""
+    return get_codec(name)['module'].compress_to_bytes(data, **params)
+
+
+def decompress(name, compressed_bytes, cancel=None):
+    """Decompress bytes produced by compress() with the named codec, returning bytes."""
+    return get_codec(name)['module'].decompress_from_bytes(compressed_bytes, cancel=cancel)
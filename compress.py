@@ -5,14 +5,15 @@ Command-line interface for compressing different file types.
 
 import sys
 import os
+import time
 import argparse
 from pathlib import Path
 
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from algorithms import rle, huffman, lzw
-from handlers import image_handler, document_handler, video_handler
+from algorithms import rle, huffman, lzw, codec_registry
+from handlers import image_handler, document_handler, video_handler, video_pipeline
 from utils import performance, visualization
 
 
@@ -34,7 +35,66 @@ def detect_file_type(file_path):
         return 'text'
 
 
-def compress_file(file_path, algorithm='all', grayscale=False, output_dir='output'):
+def compare_video_codecs(file_path, codecs, level=None, grayscale=False):
+    """
+    Compress a whole video with each codec through the video pipeline.
+    
+    Frames are streamed from the file for compression and again for the
+    verifying decode, so only the compressed frames are held in memory.
+    
+    Args:
+        file_path: Path to video file
+        codecs: List of codec keys from the codec registry
+        level: Compression level 1-9 (None for codec defaults)
+        grayscale: Convert frames to grayscale
+        
+    Returns:
+        List of performance dictionaries, as from performance.compare_algorithms()
+    """
+    results = []
+    
+    for codec in codecs:
+        name = codec_registry.get_codec(codec)['name']
+        try:
+            params = codec_registry.level_params(codec, level)
+            
+            start_time = time.time()
+            container = video_pipeline.compress_video(
+                video_handler.iter_frames(file_path, grayscale=grayscale), codec, params, temporal='diff'
+            )
+            compression_time = time.time() - start_time
+            
+            start_time = time.time()
+            is_correct = video_pipeline.verify_video(
+                container, video_handler.iter_frames(file_path, grayscale=grayscale)
+            )
+            decompression_time = time.time() - start_time
+        except Exception as e:
+            print(f"Error with {name}: {str(e)}")
+            results.append({'algorithm': name, 'error': str(e)})
+            continue
+        
+        original_size = container['raw_size']
+        compressed_size = video_pipeline.compressed_size(container)
+        compression_ratio = compressed_size / original_size if original_size > 0 else 1
+        space_saving = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+        results.append({
+            'algorithm': name,
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'compression_ratio': round(compression_ratio, 4),
+            'space_saving_percent': round(space_saving, 2),
+            'compression_time': round(compression_time, 6),
+            'decompression_time': round(decompression_time, 6),
+            'total_time': round(compression_time + decompression_time, 6),
+            'is_correct': is_correct
+        })
+    
+    return results
+
+
+def compress_file(file_path, algorithm='all', grayscale=False, output_dir='output',
+                  level=None, benchmark_levels=False):
     """
     Compress a file using specified algorithm(s).
     
@@ -43,6 +103,8 @@ def compress_file(file_path, algorithm='all', grayscale=False, output_dir='outpu
         algorithm: 'rle', 'huffman', 'lzw', or 'all'
         grayscale: Convert images/videos to grayscale
         output_dir: Directory for output files
+        level: Compression level 1-9 (None for codec defaults)
+        benchmark_levels: Also print the speed/ratio table for levels 1-9
     """
     if not os.path.exists(file_path):
         print(f"Error: File not found: {file_path}")
@@ -62,56 +124,75 @@ def compress_file(file_path, algorithm='all', grayscale=False, output_dir='outpu
         if file_type == 'image':
             print("Loading image...")
             img_data = image_handler.prepare_for_compression(file_path, grayscale)
-            data = img_data['data']
-            data_str = ''.join([chr(min(255, max(0, int(d)))) for d in data])
+            data = img_data['data'].tobytes()
             
         elif file_type == 'video':
-            print("Loading video (first 100 frames)...")
-            vid_data = video_handler.prepare_for_compression(file_path, grayscale, max_frames=100)
-            # Flatten all frames
-            data = [item for frame in vid_data['data'] for item in frame]
-            data_str = ''.join([chr(min(255, max(0, int(d)))) for d in data])
+            # Frames are streamed through the video pipeline per codec below
+            info = video_handler.video_info(file_path)
+            print(f"Streaming video ({info['total_frames']} frames, {info['width']}x{info['height']})...")
+            data = None
             
         elif file_type == 'document':
             print("Loading document...")
             doc_data = document_handler.prepare_for_compression(file_path)
-            data_str = doc_data['data']
-            data = [ord(c) for c in data_str]
+            data = doc_data['data']
             
         else:  # text
             print("Loading text file...")
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                data_str = f.read()
-            data = [ord(c) for c in data_str]
+            with open(file_path, 'rb') as f:
+                data = f.read()
     
     except Exception as e:
         print(f"Error loading file: {str(e)}")
         return
     
-    print(f"Data loaded: {len(data)} elements\n")
+    if data is not None:
+        print(f"Data loaded: {len(data)} bytes\n")
     
     # Setup algorithms to test
     algorithms_to_test = []
     
+    rle_params = codec_registry.level_params('rle', level)
+    huffman_params = codec_registry.level_params('huffman', level)
+    lzw_params = codec_registry.level_params('lzw', level)
+    
     if algorithm in ['rle', 'all']:
-        algorithms_to_test.append(('RLE', rle.compress, rle.decompress, False))
+        algorithms_to_test.append(('RLE',
+                                   lambda d: rle.compress(d, **rle_params),
+                                   rle.decompress,
+                                   False))
     
     if algorithm in ['huffman', 'all']:
         algorithms_to_test.append(('Huffman', 
-                                   lambda d: huffman.compress(data_str),
-                                   lambda c: huffman.decompress(c[0], c[1]),
+                                   lambda d: huffman.compress(d, **huffman_params),
+                                   huffman.decompress,
                                    True))
     
     if algorithm in ['lzw', 'all']:
-        algorithms_to_test.append(('LZW', lzw.compress, lzw.decompress, False))
+        algorithms_to_test.append(('LZW',
+                                   lambda d: lzw.compress(d, **lzw_params),
+                                   lambda c: lzw.decompress(c, **lzw_params),
+                                   False))
     
     # Run comparison
     print("Running compression tests...\n")
-    results = performance.compare_algorithms(data, algorithms_to_test)
+    if data is None:
+        codecs = ['rle', 'huffman', 'lzw'] if algorithm == 'all' else [algorithm]
+        results = compare_video_codecs(file_path, codecs, level, grayscale)
+    else:
+        results = performance.compare_algorithms(data, algorithms_to_test)
     
     # Display results
     performance.print_comparison_table(results)
     
+    if benchmark_levels and data is None:
+        print("Level benchmarks run on data held in memory; skipped for videos")
+    elif benchmark_levels:
+        print("Benchmarking compression levels 1-9...")
+        codecs = ['rle', 'huffman', 'lzw'] if algorithm == 'all' else [algorithm]
+        level_results = performance.benchmark_levels(data, codecs)
+        performance.print_level_table(level_results)
+    
     # Save results
     results_file = os.path.join(output_dir, f"{Path(file_path).stem}_results.json")
     performance.save_results(results, results_file)
@@ -137,6 +218,8 @@ Examples:
   %(prog)s document.pdf --algorithm huffman
   %(prog)s video.mp4 --grayscale
   %(prog)s data.txt --output results/
+  %(prog)s data.txt --algorithm lzw --level 9
+  %(prog)s data.txt --benchmark-levels
         """
     )
     
@@ -152,9 +235,19 @@ Examples:
                        default='output',
                        help='Output directory (default: output/)')
     
+    parser.add_argument('-l', '--level',
+                       type=int,
+                       choices=range(codec_registry.MIN_LEVEL, codec_registry.MAX_LEVEL + 1),
+                       metavar='1-9',
+                       help='Compression level: 1 fastest, 9 smallest (default: codec defaults)')
+    parser.add_argument('--benchmark-levels',
+                       action='store_true',
+                       help='Print a speed/ratio table for levels 1-9')
+    
     args = parser.parse_args()
     
-    compress_file(args.file, args.algorithm, args.grayscale, args.output)
+    compress_file(args.file, args.algorithm, args.grayscale, args.output,
+                  level=args.level, benchmark_levels=args.benchmark_levels)
 
 
 if __name__ == '__main__':
@@ -4,7 +4,9 @@ Demonstration of Lossy vs Lossless vs RLE Compression on Images
 import numpy as np
 from PIL import Image
 import os
-from algorithms import rle, huffman, lzw
+import lzma
+import time
+from algorithms import rle, huffman, lzw, context_mixing
 
 def create_sample_images():
     """Create sample images for testing different compression types."""
@@ -169,6 +171,43 @@ def demonstrate_lossy_compression(image_path):
         print(f"  Lossless: {'✗ NO (lossy)' if max_diff > 0 else '✓ YES'}")
         print()
 
+def demonstrate_archive_compression(text_path):
+    """Compare the archival context-mixing codec against lzma and the classic codecs."""
+    print("=" * 60)
+    print("ARCHIVE Level - Context Mixing vs lzma")
+    print("=" * 60)
+    
+    with open(text_path, 'rb') as f:
+        data = f.read()
+    data_list = list(data)
+    
+    print(f"File: {text_path}")
+    print(f"Original size: {len(data)} bytes")
+    print()
+    
+    codecs = [
+        ('Huffman', huffman.compress_to_bytes, huffman.decompress_from_bytes),
+        ('LZW', lzw.compress_to_bytes, lzw.decompress_from_bytes),
+        ('CM (order 2)', lambda d: context_mixing.compress_to_bytes(d, max_order=2), context_mixing.decompress_from_bytes),
+        ('CM (archive)', context_mixing.compress_to_bytes, context_mixing.decompress_from_bytes),
+        ('lzma -9', lambda d: lzma.compress(bytes(d), preset=9), lambda c: list(lzma.decompress(c))),
+    ]
+    
+    print(f"{'Codec':<15} {'Size':>10} {'Ratio':>8} {'Comp (s)':>10} {'Decomp (s)':>11}  Lossless")
+    for name, compress_func, decompress_func in codecs:
+        start = time.time()
+        compressed = compress_func(data_list)
+        comp_time = time.time() - start
+        
+        start = time.time()
+        decompressed = decompress_func(compressed)
+        decomp_time = time.time() - start
+        
+        verified = list(decompressed) == data_list
+        print(f"{name:<15} {len(compressed):>10} {len(compressed)/len(data):>8.4f} "
+              f"{comp_time:>10.4f} {decomp_time:>11.4f}  {'✓' if verified else '✗'}")
+    print()
+
 def main():
     print()
     print("╔" + "=" * 58 + "╗")
@@ -189,6 +228,10 @@ def main():
     # Demonstrate lossy compression
     demonstrate_lossy_compression(gradient_path)
     
+    # Compare the archival codec against lzma on text
+    if os.path.exists('sample_text.txt'):
+        demonstrate_archive_compression('sample_text.txt')
+    
     print("=" * 60)
     print("SUMMARY")
     print("=" * 60)
@@ -0,0 +1,281 @@
+"""
+Context Mixing (CM) Compression Algorithm
+Best for cold archival of text where ratio matters more than speed
+Adaptive binary arithmetic coding driven by mixed order-0..N context models
+"""
+
+import math
+import pickle
+
+
+# Probabilities are 12-bit (0..4095) in the mixer and coder
+PROB_BITS = 12
+PROB_MAX = 1 << PROB_BITS
+
+# Hashed model size (entries) for orders 2 and above
+HASH_TABLE_BITS = 22
+
+# Model states adapt at rate 1/(n + 1.5) until n reaches this limit
+STATE_LIMIT = 30
+
+# Mixer learning rate
+MIXER_RATE = 6
+
+# Bytes between cancellation checks (CM is far slower per byte than the
+# other codecs, so it polls more often than CHECK_INTERVAL)
+CANCEL_INTERVAL = 1024
+
+
+def _build_stretch_table():
+    """stretch(p) = ln(p / (1 - p)), scaled by 256 and tabulated for 12-bit p."""
+    table = []
+    for p in range(PROB_MAX):
+        q = min(max(p, 1), PROB_MAX - 1) / PROB_MAX
+        table.append(int(round(math.log(q / (1 - q)) * 256)))
+    return table
+
+
+def _build_squash_table():
+    """squash(x) = 4096 / (1 + e^-x), the inverse of stretch, for x in -2047..2047."""
+    table = []
+    for x in range(-2047, 2048):
+        p = int(PROB_MAX / (1 + math.exp(-x / 256)))
+        table.append(min(max(p, 1), PROB_MAX - 1))
+    return table
+
+
+_STRETCH = _build_stretch_table()
+_SQUASH = _build_squash_table()
+
+
+def _squash(x):
+    if x > 2047:
+        x = 2047
+    elif x < -2047:
+        x = -2047
+    return _SQUASH[x + 2047]
+
+
+# Reciprocal table for count-based adaptation: 65536 / (n + 1.5)
+_ADAPT = [int(65536 / (n + 1.5)) for n in range(STATE_LIMIT + 1)]
+
+# Model states pack a 16-bit probability above a 5-bit hit count
+_INITIAL_STATE = (1 << 15) << 5
+
+
+class ContextMixer:
+    """
+    Order-0..N bit predictor with a gated linear mixer.
+
+    Each model maps its byte context plus the bits of the current byte seen
+    so far to an adaptive probability. Orders 0 and 1 are direct tables;
+    higher orders share one hashed table. The mixer combines the stretched
+    predictions with one weight set per partial byte.
+    """
+
+    def __init__(self, max_order=4):
+        self.max_order = max_order
+        self.order0 = [_INITIAL_STATE] * 256
+        self.order1 = [_INITIAL_STATE] * (256 * 256)
+        self.hashed = [_INITIAL_STATE] * (1 << HASH_TABLE_BITS) if max_order >= 2 else None
+
+        inputs = max_order + 2  # one per model plus a bias input
+        self.weights = [[(1 << 16) // inputs] * inputs for _ in range(256)]
+
+        self.c0 = 1          # partial byte with a leading 1 bit
+        self.history = 0     # previous bytes, most recent in the low bits
+        self.hashes = []     # per-order context hashes for the current byte
+        self._states = None
+        self._inputs = None
+        self._pr = PROB_MAX // 2
+        self._update_hashes()
+
+    def _update_hashes(self):
+        """Recompute the order-2+ context hashes at a byte boundary."""
+        self.hashes = []
+        for order in range(2, self.max_order + 1):
+            context = self.history & ((1 << (8 * order)) - 1)
+            self.hashes.append(((context + 1) * 0x9E3779B1 + order * 0x85EBCA77) & 0xFFFFFFFF)
+
+    def predict(self):
+        """Return P(next bit = 1) as a 12-bit probability."""
+        c0 = self.c0
+        mask = (1 << HASH_TABLE_BITS) - 1
+        states = [(self.order0, c0), (self.order1, ((self.history & 0xFF) << 8) | c0)]
+        for h in self.hashes:
+            states.append((self.hashed, ((h ^ (c0 * 0x2F0F1B3)) >> 3) & mask))
+
+        inputs = [_STRETCH[table[i] >> 9] for table, i in states]
+        inputs.append(256)  # bias
+
+        dot = 0
+        for w, s in zip(self.weights[c0], inputs):
+            dot += w * s
+
+        self._states = states
+        self._inputs = inputs
+        self._pr = _squash(dot >> 16)
+        return self._pr
+
+    def update(self, bit):
+        """Train the models and the mixer on the coded bit."""
+        target = bit << 16
+        for table, i in self._states:
+            state = table[i]
+            p, n = state >> 5, state & 31
+            p += ((target - p) * _ADAPT[n]) >> 16
+            if n < STATE_LIMIT:
+                n += 1
+            table[i] = (p << 5) | n
+
+        err = ((bit << PROB_BITS) - self._pr) * MIXER_RATE
+        weights = self.weights[self.c0]
+        for i, s in enumerate(self._inputs):
+            weights[i] += (s * err) >> 13
+
+        self.c0 = (self.c0 << 1) | bit
+        if self.c0 >= 256:
+            self.history = ((self.history << 8) | (self.c0 & 0xFF)) & ((1 << (8 * max(self.max_order, 1))) - 1)
+            self.c0 = 1
+            self._update_hashes()
+
+
+def _to_byte_values(data):
+    """Normalize input to a sequence of byte values."""
+    if isinstance(data, str):
+        return data.encode('utf-8')
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return bytes(data)
+    try:
+        return bytes(int(x) for x in data)
+    except ValueError:
+        raise ValueError("Symbols must be byte values 0-255; encode text as UTF-8 first") from None
+
+
+def compress(data, max_order=4, cancel=None):
+    """
+    Compress data using context mixing and binary arithmetic coding.
+
+    Args:
+        data: Bytes, list of byte values (0-255) or string (UTF-8 encoded)
+        max_order: Highest context order to model (1-4)
+        cancel: Optional CancellationToken checked every CANCEL_INTERVAL bytes
+
+    Returns:
+        Arithmetic-coded bytes
+    """
+    data = _to_byte_values(data)
+    if not data:
+        return b''
+
+    model = ContextMixer(max_order)
+    out = bytearray()
+    x1, x2 = 0, 0xFFFFFFFF
+
+    for i, byte in enumerate(data):
+        if cancel is not None and not i % CANCEL_INTERVAL:
+            cancel.check()
+        for shift in range(7, -1, -1):
+            bit = (byte >> shift) & 1
+            p = model.predict()
+            xmid = x1 + ((x2 - x1) >> PROB_BITS) * p
+            if bit:
+                x2 = xmid
+            else:
+                x1 = xmid + 1
+            model.update(bit)
+
+            # Shift out identical leading bytes
+            while ((x1 ^ x2) & 0xFF000000) == 0:
+                out.append(x2 >> 24)
+                x1 = (x1 << 8) & 0xFFFFFFFF
+                x2 = ((x2 << 8) & 0xFFFFFFFF) | 0xFF
+
+    # Flush enough of x1 to disambiguate the final interval
+    out.extend(x1.to_bytes(4, 'big'))
+    return bytes(out)
+
+
+def decompress(encoded, length, max_order=4, cancel=None):
+    """
+    Decompress context-mixing encoded data.
+
+    Args:
+        encoded: Arithmetic-coded bytes
+        length: Number of bytes to decode
+        max_order: Context order used during compression
+        cancel: Optional CancellationToken checked every CANCEL_INTERVAL bytes
+
+    Returns:
+        Original data as bytes
+    """
+    if not length:
+        return b''
+
+    model = ContextMixer(max_order)
+    out = bytearray()
+    pos = 4
+    x1, x2 = 0, 0xFFFFFFFF
+    x = int.from_bytes(encoded[:4].ljust(4, b'\x00'), 'big')
+
+    for i in range(length):
+        if cancel is not None and not i % CANCEL_INTERVAL:
+            cancel.check()
+        byte = 0
+        for _ in range(8):
+            p = model.predict()
+            xmid = x1 + ((x2 - x1) >> PROB_BITS) * p
+            if x <= xmid:
+                bit = 1
+                x2 = xmid
+            else:
+                bit = 0
+                x1 = xmid + 1
+            model.update(bit)
+            byte = (byte << 1) | bit
+
+            while ((x1 ^ x2) & 0xFF000000) == 0:
+                x1 = (x1 << 8) & 0xFFFFFFFF
+                x2 = ((x2 << 8) & 0xFFFFFFFF) | 0xFF
+                next_byte = encoded[pos] if pos < len(encoded) else 0
+                x = ((x << 8) & 0xFFFFFFFF) | next_byte
+                pos += 1
+        out.append(byte)
+
+    return bytes(out)
+
+
+def compress_to_bytes(data, max_order=4, cancel=None):
+    """
+    Compress data and convert to bytes for storage.
+
+    Args:
+        data: Input data (bytes, list of byte values or string)
+        max_order: Highest context order to model (1-4)
+        cancel: Optional CancellationToken
+
+    Returns:
+        Compressed data as bytes
+    """
+    data = _to_byte_values(data)
+    result = {
+        'length': len(data),
+        'max_order': max_order,
+        'data': compress(data, max_order, cancel)
+    }
+    return pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decompress_from_bytes(compressed_bytes, cancel=None):
+    """
+    Decompress data from bytes.
+
+    Args:
+        compressed_bytes: Compressed data as bytes
+        cancel: Optional CancellationToken
+
+    Returns:
+        Original bytes
+    """
+    result = pickle.loads(compressed_bytes)
+    return decompress(result['data'], result['length'], result['max_order'], cancel)
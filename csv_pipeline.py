@@ -0,0 +1,582 @@
+"""
+Columnar CSV compression pipeline.
+Parses CSV files into blocks of rows, splits every block into columns and
+codes each column by what it holds: numbers as frame-of-reference or delta
+values packed into the fewest bits, low-cardinality columns as a
+dictionary plus packed indices, and free text with the entropy coders.
+Column blocks are coded in parallel worker processes.
+"""
+
+import csv
+import functools
+from collections import Counter
+import pickle
+import re
+
+import numpy as np
+
+from algorithms import codec_registry
+from handlers import document_handler, image_pipeline
+
+
+CSV_VERSION = 1
+
+# Rows parsed and coded together; bounds memory for any file size
+BLOCK_ROWS = 1 << 16
+
+# Blocks with fewer fields than this are coded in the calling thread
+PARALLEL_MIN_VALUES = 1 << 16
+
+# Columns with at most this many distinct values (and at least two rows
+# per value) are dictionary coded
+DICTIONARY_MAX_SIZE = 4096
+
+# Numbers exactly as written by number formatting: no '+', leading zeros
+# or exponents, so the text can be rebuilt from the value and its scale
+NUMBER = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.([0-9]+))?')
+
+# Whole columns of numbers with a given number of decimals, one per line
+NUMBER_LINES = r'(?:-?(?:0|[1-9][0-9]*){}\n)*'
+NEGATIVE_ZERO = re.compile(r'(?:^|\n)-0(?:\.0*)?\n')
+
+# Numeric columns keep at most one field in this many as text
+EXCEPTION_RATIO = 32
+
+# Larger magnitudes stay text, keeping differences inside int64
+MAX_MAGNITUDE = 1 << 61
+
+# Blocks where more than this share of rows must be kept verbatim are
+# coded as plain text instead of columns
+RAW_BLOCK_RATIO = 0.5
+
+# Format used when no dialect is given (RFC 4180)
+DEFAULT_DIALECT = {
+    'delimiter': ',',
+    'quotechar': '"',
+    'doublequote': True,
+    'escapechar': None,
+    'skipinitialspace': False,
+    'lineterminator': '\r\n',
+    'quoting': csv.QUOTE_MINIMAL
+}
+
+
+def pack_bits(values, width):
+    """
+    Pack non-negative integers into `width` bits each, most significant
+    bit first.
+    
+    Args:
+        values: Integer array (every value below 2**width)
+        width: Bits per value (0 stores nothing)
+    
+    Returns:
+        Packed bytes
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if not width or not values.size:
+        return b''
+    bits = np.empty((values.size, width), dtype=np.uint8)
+    for bit in range(width):
+        bits[:, width - 1 - bit] = (values >> np.uint64(bit)) & np.uint64(1)
+    return np.packbits(bits).tobytes()
+
+
+def unpack_bits(data, width, count):
+    """Invert pack_bits() for `count` values."""
+    values = np.zeros(count, dtype=np.uint64)
+    if not width or not count:
+        return values
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=count * width).reshape(count, width)
+    for bit in range(width):
+        values = (values << np.uint64(1)) | bits[:, bit]
+    return values
+
+
+def _bit_width(values):
+    """Bits needed for the largest value of a non-negative array."""
+    return int(values.max()).bit_length() if values.size else 0
+
+
+def encode_integers(values):
+    """
+    Pack an int64 array with frame-of-reference or delta coding.
+    
+    Frame of reference stores every value as its offset from the minimum;
+    delta coding stores the first value and zigzagged differences between
+    neighbours. Whichever needs fewer bits per value is packed.
+    
+    Args:
+        values: int64 array (magnitudes below MAX_MAGNITUDE)
+    
+    Returns:
+        Entry dictionary
+    """
+    if not values.size:
+        return {'method': 'for', 'base': 0, 'width': 0, 'data': b''}
+    
+    low = int(values.min())
+    offsets = (values - low).astype(np.uint64)
+    offset_width = _bit_width(offsets)
+    
+    deltas = np.diff(values)
+    # Small differences of either sign become small unsigned values
+    zigzagged = ((deltas << 1) ^ (deltas >> 63)).astype(np.uint64)
+    delta_width = _bit_width(zigzagged)
+    
+    if delta_width < offset_width:
+        return {'method': 'delta', 'base': int(values[0]), 'width': delta_width,
+                'data': pack_bits(zigzagged, delta_width)}
+    return {'method': 'for', 'base': low, 'width': offset_width, 'data': pack_bits(offsets, offset_width)}
+
+
+def decode_integers(entry, count):
+    """Invert encode_integers() for `count` values."""
+    packed = unpack_bits(entry['data'], entry['width'], count if entry['method'] == 'for' else count - 1)
+    if entry['method'] == 'for':
+        return packed.astype(np.int64) + entry['base']
+    
+    deltas = (packed >> np.uint64(1)).astype(np.int64) ^ -(packed & np.uint64(1)).astype(np.int64)
+    values = np.empty(count, dtype=np.int64)
+    values[0] = entry['base']
+    np.cumsum(deltas, out=values[1:])
+    values[1:] += entry['base']
+    return values
+
+
+@functools.lru_cache(maxsize=None)
+def _number_lines(scale):
+    """Pattern matching a column of numbers with `scale` decimals joined by newlines."""
+    return re.compile(NUMBER_LINES.format(rf'\.[0-9]{{{scale}}}' if scale else ''))
+
+
+def _parse_plain_numbers(values):
+    """
+    Fast path of _parse_numbers() for columns without odd fields.
+    
+    The column is checked with one regex pass over its joined text and
+    converted with int() in C, instead of matching field by field.
+    
+    Returns:
+        Same as _parse_numbers(), or None if the slow path is needed
+    """
+    first = NUMBER.fullmatch(next(filter(None, values), ''))
+    if first is None:
+        return None
+    scale = len(first.group(1) or '')
+    
+    joined = '\n'.join(values) + '\n'
+    if not _number_lines(scale).fullmatch(joined) or NEGATIVE_ZERO.search(joined):
+        return None
+    fields = joined.replace('.', '').split('\n')[:-1]
+    # Quoted line breaks would add fields
+    if len(fields) != len(values):
+        return None
+    
+    present = np.fromiter(map(len, fields), dtype=np.int64, count=len(fields)) > 0
+    empty = np.flatnonzero(~present)
+    if empty.size:
+        fields = [field or '0' for field in fields]
+    try:
+        numbers = np.array(list(map(int, fields)), dtype=np.int64)
+    except OverflowError:
+        return None
+    if (np.abs(numbers) >= MAX_MAGNITUDE).any():
+        return None
+    
+    if empty.size:
+        # Repeat the previous value so deltas stay small
+        previous = np.maximum.accumulate(np.where(present, np.arange(len(fields)), 0))
+        numbers = numbers[previous]
+    return numbers, scale, empty.tolist(), {}
+
+
+def _parse_numbers(values):
+    """
+    Read a column as fixed-point numbers.
+    
+    Fields that are not numbers with the column's number of decimals (or
+    that would not be rebuilt exactly, such as '-0') are kept as text, as
+    long as there are few of them.
+    
+    Args:
+        values: List of field strings
+    
+    Returns:
+        Tuple of (list of ints scaled to whole numbers, digits after the
+        point, positions of empty fields, {position: text} of other
+        fields), or None if the column is not numeric
+    """
+    match = NUMBER.fullmatch
+    limit = len(values) // EXCEPTION_RATIO
+    numbers = []
+    empty = []
+    exceptions = {}
+    scale = None
+    last = 0
+    
+    for position, value in enumerate(values):
+        if not value:
+            empty.append(position)
+        else:
+            found = match(value)
+            fraction = found.group(1) if found else None
+            digits = len(fraction) if fraction else 0
+            if scale is None and found:
+                scale = digits
+            number = int(value.replace('.', '', 1)) if found and digits == scale else None
+            
+            # '-0' would come back without its sign
+            if number is None or (not number and value[0] == '-') or abs(number) >= MAX_MAGNITUDE:
+                exceptions[position] = value
+                if len(exceptions) > limit:
+                    return None
+            else:
+                numbers.append(number)
+                last = number
+                continue
+        
+        # Repeat the previous value so deltas stay small
+        numbers.append(last)
+    
+    if scale is None:
+        return None
+    return numbers, scale, empty, exceptions
+
+
+def _format_numbers(numbers, scale):
+    """Invert the scaling of _parse_numbers()."""
+    if not scale:
+        return [str(number) for number in numbers]
+    
+    formatted = []
+    for number in numbers:
+        digits = str(abs(number)).rjust(scale + 1, '0')
+        sign = '-' if number < 0 else ''
+        formatted.append(f"{sign}{digits[:-scale]}.{digits[-scale:]}")
+    return formatted
+
+
+def _encode_column(values, codec, params, cancel=None):
+    """Code one column of a block by the kind of values it holds."""
+    parsed = _parse_plain_numbers(values) or _parse_numbers(values)
+    if parsed is not None:
+        numbers, scale, empty, exceptions = parsed
+        nulls = None
+        if empty:
+            mask = np.zeros(len(values), dtype=bool)
+            mask[empty] = True
+            nulls = np.packbits(mask).tobytes()
+        return {'kind': 'number', 'scale': scale, 'nulls': nulls, 'exceptions': exceptions,
+                'values': encode_integers(np.array(numbers, dtype=np.int64))}
+    
+    # Keys in order of first appearance
+    distinct = dict.fromkeys(values)
+    if len(distinct) <= DICTIONARY_MAX_SIZE and len(distinct) * 2 <= len(values):
+        lookup = {value: index for index, value in enumerate(distinct)}
+        indices = np.fromiter(map(lookup.__getitem__, values), dtype=np.int64, count=len(values))
+        return {'kind': 'dictionary', 'values': list(distinct), 'indices': encode_integers(indices)}
+    
+    encoded = [value.encode('utf-8') for value in values]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    payload = b''.join(encoded)
+    data = codec_registry.compress(codec, payload, cancel=cancel, **params) if payload else b''
+    return {'kind': 'text', 'lengths': encode_integers(lengths), 'data': data}
+
+
+def _decode_column(entry, codec, count, cancel=None):
+    """Invert _encode_column()."""
+    if entry['kind'] == 'number':
+        values = _format_numbers(decode_integers(entry['values'], count).tolist(), entry['scale'])
+        if entry['nulls'] is not None:
+            mask = np.unpackbits(np.frombuffer(entry['nulls'], dtype=np.uint8), count=count)
+            for position in np.flatnonzero(mask).tolist():
+                values[position] = ''
+        for position, value in entry['exceptions'].items():
+            values[position] = value
+        return values
+    
+    if entry['kind'] == 'dictionary':
+        return list(map(entry['values'].__getitem__, decode_integers(entry['indices'], count).tolist()))
+    
+    payload = codec_registry.decompress(codec, entry['data'], cancel=cancel) if entry['data'] else b''
+    ends = np.cumsum(decode_integers(entry['lengths'], count)).tolist()
+    values = []
+    start = 0
+    for end in ends:
+        values.append(payload[start:end].decode('utf-8'))
+        start = end
+    return values
+
+
+def _quoted_fields(text, dialect):
+    """Flag which fields of one record's source text start with a quote."""
+    quote = dialect['quotechar']
+    delimiter = dialect['delimiter']
+    flags = []
+    position = 0
+    while True:
+        flags.append(text.startswith(quote, position))
+        if flags[-1]:
+            # Skip to the closing quote; doubled quotes are part of the field
+            position = text.find(quote, position + 1)
+            while position != -1 and text.startswith(quote, position + 1):
+                position = text.find(quote, position + 2)
+            if position == -1:
+                return flags
+            position += 1
+        position = text.find(delimiter, position)
+        if position == -1:
+            return flags
+        position += 1
+
+
+def _reproduces(records, dialect, quoted=None):
+    """Check whether writing the records' fields gives back their source text."""
+    return document_handler.format_csv_rows((fields for fields, _ in records), dialect, quoted) \
+        == ''.join(text for _, text in records)
+
+
+def _column_quoting(records, width, dialect):
+    """Flag the columns whose fields are quoted in most rows of a block."""
+    counts = [0] * width
+    for _, text in records:
+        for index, flag in enumerate(_quoted_fields(text, dialect)[:width]):
+            counts[index] += flag
+    return [count * 2 > len(records) for count in counts]
+
+
+def _encode_block(records, codec, params, dialect, cancel=None, parallel=True):
+    """
+    Code a block of parsed records column by column.
+    
+    Columns quoted in most rows are written back quoted. Rows that the CSV
+    writer still would not reproduce exactly (unusual quoting, ragged rows,
+    a missing final line ending) are kept as their source text only, and
+    left out of the columns. Blocks that are mostly such rows are coded as
+    plain text with the codec.
+    """
+    # Rows of another width are never reproduced, so they are kept as text
+    width = Counter(len(fields) for fields, _ in records).most_common(1)[0][0]
+    regular = [record for record in records if len(record[0]) == width]
+    
+    quoted = None
+    exact = _reproduces(regular, dialect)
+    if not exact:
+        quoted = _column_quoting(regular, width, dialect)
+        if not any(quoted):
+            quoted = None
+        exact = quoted is not None and _reproduces(regular, dialect, quoted)
+    
+    raw = {}
+    if exact and len(regular) == len(records):
+        rows = [fields for fields, _ in records]
+    else:
+        rows = []
+        for position, (fields, text) in enumerate(records):
+            if len(fields) == width and document_handler.format_csv_rows([fields], dialect, quoted) == text:
+                rows.append(fields)
+            else:
+                raw[position] = text
+    
+    if len(raw) > len(records) * RAW_BLOCK_RATIO:
+        payload = ''.join(text for _, text in records).encode('utf-8')
+        return {'rows': len(records), 'text': codec_registry.compress(codec, payload, cancel=cancel, **params)}
+    
+    tasks = [(list(column), codec, params) for column in zip(*rows)]
+    parallel = parallel and len(rows) * width >= PARALLEL_MIN_VALUES
+    return {
+        'rows': len(records),
+        'columns': image_pipeline.run_parallel(_encode_column, tasks, cancel, parallel),
+        'quoted': quoted,
+        'raw': raw
+    }
+
+
+def _decode_block(block, codec, dialect, cancel=None, parallel=True):
+    """Invert _encode_block(), returning the block's CSV text."""
+    if 'text' in block:
+        return codec_registry.decompress(codec, block['text'], cancel=cancel).decode('utf-8')
+    
+    quoted = block['quoted']
+    raw = block['raw']
+    count = block['rows'] - len(raw)
+    tasks = [(entry, codec, count) for entry in block['columns']]
+    parallel = parallel and count * len(tasks) >= PARALLEL_MIN_VALUES
+    columns = image_pipeline.run_parallel(_decode_column, tasks, cancel, parallel)
+    rows = list(zip(*columns)) if columns else [()] * count
+    
+    # Coded rows fill the gaps between raw rows
+    parts = []
+    coded = 0
+    previous = 0
+    for position in sorted(raw):
+        gap = position - previous
+        parts.append(document_handler.format_csv_rows(rows[coded:coded + gap], dialect, quoted))
+        parts.append(raw[position])
+        coded += gap
+        previous = position + 1
+    parts.append(document_handler.format_csv_rows(rows[coded:], dialect, quoted))
+    return ''.join(parts)
+
+
+def compress_csv(records, codec, params=None, dialect=None, block_rows=BLOCK_ROWS, cancel=None, parallel=True):
+    """
+    Compress CSV records column by column.
+    
+    Records are consumed one block at a time, so only a block of parsed
+    rows is in memory. The first record (usually a header) is stored as
+    text.
+    
+    Args:
+        records: Iterable of (fields, source text) tuples, as yielded by
+                 document_handler.iter_csv_records()
+        codec: Codec key used for text columns
+        params: Codec parameters (from codec_registry.level_params)
+        dialect: Format parameters from document_handler.sniff_csv_dialect()
+        block_rows: Rows per block
+        cancel: Optional CancellationToken
+        parallel: Code the columns of large blocks in worker processes
+    
+    Returns:
+        Container dictionary (picklable)
+    """
+    params = params or {}
+    dialect = dialect or dict(DEFAULT_DIALECT)
+    records = iter(records)
+    header = next(records, None)
+    
+    blocks = []
+    rows = 0
+    length = len(header[1]) if header else 0
+    block = []
+    
+    def flush():
+        if cancel is not None:
+            cancel.check()
+        blocks.append(_encode_block(block, codec, params, dialect, cancel, parallel))
+    
+    for record in records:
+        block.append(record)
+        length += len(record[1])
+        if len(block) == block_rows:
+            flush()
+            rows += len(block)
+            block = []
+    if block:
+        flush()
+        rows += len(block)
+    
+    return {
+        'pipeline': 'csv',
+        'version': CSV_VERSION,
+        'codec': codec,
+        'params': params,
+        'dialect': dialect,
+        'header': header[1] if header else None,
+        'rows': rows,
+        'length': length,
+        'blocks': blocks
+    }
+
+
+def iter_text(container, cancel=None, parallel=True):
+    """
+    Decompress a container block by block.
+    
+    Args:
+        container: Container dictionary from compress_csv()
+        cancel: Optional CancellationToken
+        parallel: Decode the columns of large blocks in worker processes
+    
+    Yields:
+        CSV text, the header first and then one string per block
+    """
+    if container['header'] is not None:
+        yield container['header']
+    for block in container['blocks']:
+        if cancel is not None:
+            cancel.check()
+        yield _decode_block(block, container['codec'], container['dialect'], cancel, parallel)
+
+
+def decompress_csv(container, cancel=None):
+    """
+    Decompress a container to the original CSV text.
+    
+    Args:
+        container: Container dictionary
+        cancel: Optional CancellationToken
+    
+    Returns:
+        CSV text
+    """
+    return ''.join(iter_text(container, cancel))
+
+
+def verify_csv(container, file_path, encoding='utf-8', cancel=None):
+    """
+    Decode a container and compare it with the file it came from, one
+    block at a time.
+    
+    Args:
+        container: Container dictionary
+        file_path: Path to the original CSV file
+        encoding: File encoding
+        cancel: Optional CancellationToken
+    
+    Returns:
+        True if the decoded text reproduces the file byte for byte
+    """
+    with open(file_path, 'rb') as f:
+        for text in iter_text(container, cancel):
+            data = text.encode(encoding)
+            if f.read(len(data)) != data:
+                return False
+        return not f.read(1)
+
+
+def _entry_size(entry):
+    """Stored bytes of one column entry."""
+    if entry['kind'] == 'number':
+        exceptions = sum(len(value.encode('utf-8')) for value in entry['exceptions'].values())
+        return len(entry['values']['data']) + len(entry['nulls'] or b'') + exceptions
+    if entry['kind'] == 'dictionary':
+        return len(entry['indices']['data']) + sum(len(value.encode('utf-8')) for value in entry['values'])
+    return len(entry['lengths']['data']) + len(entry['data'])
+
+
+def compressed_size(container):
+    """
+    Bytes of the pickled container, including dictionaries and rows kept
+    as text.
+    
+    Args:
+        container: Container dictionary
+    
+    Returns:
+        Size in bytes
+    """
+    return len(pickle.dumps(container, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def column_summary(container):
+    """
+    Describe how each column was stored, summed over blocks.
+    
+    Args:
+        container: Container dictionary
+    
+    Returns:
+        List of dictionaries, one per column
+    """
+    summary = []
+    for block in container['blocks']:
+        # Blocks coded as plain text have no columns
+        for index, entry in enumerate(block.get('columns', [])):
+            if index == len(summary):
+                summary.append({'column': index, 'kinds': {}, 'size': 0})
+            kinds = summary[index]['kinds']
+            kinds[entry['kind']] = kinds.get(entry['kind'], 0) + 1
+            summary[index]['size'] += _entry_size(entry)
+    return summary
@@ -8,6 +8,33 @@ from datetime import datetime
 import gridfs
 import os
 
+
+class BufferReader:
+    """
+    File-like view over a bytes-like object (bytes, memoryview, ndarray).
+    
+    GridFS accepts only bytes or objects with read(); wrapping a buffer
+    lets it copy one chunk at a time instead of the whole payload.
+    """
+    
+    def __init__(self, buffer):
+        self.view = memoryview(buffer).cast('B')
+        self.pos = 0
+    
+    def read(self, size=-1):
+        end = len(self.view) if size is None or size < 0 else min(self.pos + size, len(self.view))
+        chunk = self.view[self.pos:end].tobytes()
+        self.pos = end
+        return chunk
+
+
+def _readable(data):
+    """Return data as something GridFS can write without a full copy."""
+    if isinstance(data, (bytes, str)) or hasattr(data, 'read'):
+        return data
+    return BufferReader(data)
+
+
 class CompressionDB:
     def __init__(self, connection_string="mongodb://localhost:27017/"):
         """Initialize MongoDB connection"""
@@ -17,6 +44,7 @@ class CompressionDB:
         # Collections
         self.compression_history = self.db['compression_history']
         self.files = self.db['files']
+        self.dictionaries = self.db['dictionaries']
         
         # GridFS for large file storage
         self.fs = gridfs.GridFS(self.db)
@@ -27,12 +55,12 @@ class CompressionDB:
         self.compression_history.create_index([('algorithm', 1)])
     
     def store_file(self, file_data, filename, file_type):
-        """Store original file in GridFS"""
+        """Store original file in GridFS (bytes, a buffer or an open file)"""
         # Extract file extension
         file_extension = os.path.splitext(filename)[1] if '.' in filename else ''
         
         file_id = self.fs.put(
-            file_data,
+            _readable(file_data),
             filename=filename,
             file_type=file_type,
             file_extension=file_extension,
@@ -41,13 +69,13 @@ class CompressionDB:
         return str(file_id)
     
     def store_compressed_file(self, compressed_data, filename, algorithm):
-        """Store compressed file in GridFS"""
+        """Store compressed file in GridFS (bytes, a buffer or an open file)"""
         # Extract file extension from original filename
         file_extension = os.path.splitext(filename)[1] if '.' in filename else ''
         compressed_filename = f"{os.path.splitext(filename)[0]}_{algorithm}_compressed{file_extension}"
         
         file_id = self.fs.put(
-            compressed_data,
+            _readable(compressed_data),
             filename=compressed_filename,
             algorithm=algorithm,
             file_extension=file_extension,
@@ -81,6 +109,38 @@ class CompressionDB:
             print(f"Error retrieving file metadata: {e}")
             return None
     
+    def store_dictionary(self, entries, name, algorithm='LZW', sample_count=0):
+        """Store a trained compression dictionary once and return its ID"""
+        result = self.dictionaries.insert_one({
+            'name': name,
+            'algorithm': algorithm,
+            'entries': list(entries),
+            'entry_count': len(entries),
+            'sample_count': sample_count,
+            'created': datetime.now()
+        })
+        return str(result.inserted_id)
+    
+    def get_dictionary(self, dictionary_id):
+        """Retrieve the entries of a trained dictionary by ID"""
+        from bson.objectid import ObjectId
+        try:
+            doc = self.dictionaries.find_one({'_id': ObjectId(dictionary_id)})
+            return doc['entries'] if doc else None
+        except Exception as e:
+            print(f"Error retrieving dictionary: {e}")
+            return None
+    
+    def list_dictionaries(self, algorithm=None):
+        """List trained dictionaries (without their entries)"""
+        query = {'algorithm': algorithm} if algorithm else {}
+        cursor = self.dictionaries.find(query, {'entries': 0}).sort('created', -1)
+        dictionaries = []
+        for doc in cursor:
+            doc['_id'] = str(doc['_id'])
+            dictionaries.append(doc)
+        return dictionaries
+    
     def save_compression_record(self, record):
         """Save compression operation record to history"""
         record['timestamp'] = datetime.now()
@@ -112,7 +172,7 @@ class CompressionDB:
         
         # Count by algorithm
         algorithm_stats = {}
-        for algo in ['RLE', 'Huffman', 'LZW']:
+        for algo in ['RLE', 'Huffman', 'LZW', 'CM']:
             count = self.compression_history.count_documents({'algorithm': algo})
             algorithm_stats[algo] = count
         
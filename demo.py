@@ -45,11 +45,9 @@ def test_algorithm(name, compress_func, decompress_func, data, is_huffman=False,
     ratio = comp_size / orig_size if orig_size > 0 else 1
     space_saving = ((orig_size - comp_size) / orig_size * 100) if orig_size > 0 else 0
     
-    # Verify correctness
-    if isinstance(data, str):
-        is_correct = (decompressed == data) or (''.join(decompressed) == data)
-    else:
-        is_correct = (list(decompressed) == list(data))
+    # Verify correctness; the codecs return UTF-8 bytes for text
+    expected = data.encode('utf-8') if isinstance(data, str) else bytes(data)
+    is_correct = bytes(decompressed) == expected
     
     # Print results
     print(f"Original Size:      {orig_size:,} bytes")
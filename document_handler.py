@@ -3,7 +3,15 @@ Text and document file handler for compression.
 Supports TXT, PDF, DOCX, CSV formats.
 """
 
+import codecs
+import csv
+import io
 import os
+import re
+
+
+# Bytes read to guess a CSV file's delimiter, quoting and line endings
+CSV_SAMPLE_SIZE = 64 * 1024
 
 
 def load_text_file(file_path, encoding='utf-8'):
@@ -22,6 +30,27 @@ def load_text_file(file_path, encoding='utf-8'):
     return content
 
 
+def load_text_bytes(file_path, encoding='utf-8'):
+    """
+    Load text file as UTF-8 bytes.
+    
+    UTF-8 files are returned exactly as stored, line endings included;
+    other encodings are re-encoded as UTF-8.
+    
+    Args:
+        file_path: Path to text file
+        encoding: File encoding
+        
+    Returns:
+        UTF-8 encoded bytes
+    """
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    # Decoding also rejects files that are not text in this encoding
+    text = content.decode(encoding)
+    return content if codecs.lookup(encoding).name == 'utf-8' else text.encode('utf-8')
+
+
 def save_text_file(content, file_path, encoding='utf-8'):
     """
     Save text to file.
@@ -83,30 +112,140 @@ def load_docx(file_path):
         raise ImportError("python-docx is required for DOCX support. Install with: pip install python-docx")
 
 
+def sniff_csv_dialect(file_path, encoding='utf-8'):
+    """
+    Guess how a CSV file is delimited and quoted.
+    
+    Args:
+        file_path: Path to CSV file
+        encoding: File encoding
+        
+    Returns:
+        Dictionary of csv.writer() format parameters
+    """
+    with open(file_path, 'r', encoding=encoding, newline='') as f:
+        sample = f.read(CSV_SAMPLE_SIZE)
+    
+    try:
+        dialect = csv.Sniffer().sniff(sample)
+    except csv.Error:
+        dialect = csv.excel
+    
+    return {
+        'delimiter': dialect.delimiter,
+        'quotechar': dialect.quotechar or '"',
+        # The sniffer reports False when the sample has no doubled quotes;
+        # without an escape character doubling is the only way to write one
+        'doublequote': dialect.doublequote or not dialect.escapechar,
+        'escapechar': dialect.escapechar,
+        'skipinitialspace': dialect.skipinitialspace,
+        # The sniffer always reports \r\n; take the file's own line endings
+        'lineterminator': '\r\n' if '\r\n' in sample else '\n',
+        # Columns quoted throughout are passed to format_csv_rows() instead
+        'quoting': csv.QUOTE_MINIMAL
+    }
+
+
+def iter_csv_records(file_path, dialect, encoding='utf-8'):
+    """
+    Parse a CSV file one record at a time.
+    
+    Every record comes with the exact text it was parsed from (including
+    quoted line breaks and its line ending), so callers can tell whether
+    writing the fields back out reproduces the file.
+    
+    Args:
+        file_path: Path to CSV file
+        dialect: Format parameters from sniff_csv_dialect()
+        encoding: File encoding
+        
+    Yields:
+        Tuples of (list of field strings, source text)
+    """
+    lines = []
+    
+    def read_lines(f):
+        for line in f:
+            lines.append(line)
+            yield line
+    
+    with open(file_path, 'r', encoding=encoding, newline='') as f:
+        for fields in csv.reader(read_lines(f), **dialect):
+            text = ''.join(lines)
+            lines.clear()
+            yield fields, text
+
+
+def format_csv_rows(rows, dialect, quoted=None):
+    """
+    Write rows as CSV text.
+    
+    Exports often quote every field of some columns (QUOTE_ALL, or quoted
+    strings next to bare numbers), which no single csv.writer quoting mode
+    reproduces for string fields. Columns flagged in `quoted` are always
+    quoted; the others are quoted only when needed, as QUOTE_MINIMAL does.
+    
+    Args:
+        rows: Iterable of lists of field strings
+        dialect: Format parameters from sniff_csv_dialect()
+        quoted: Optional list of per-column flags (only honoured for
+                dialects that double quote characters)
+        
+    Returns:
+        CSV text
+    """
+    if not quoted or not any(quoted) or not dialect['doublequote'] or dialect['escapechar']:
+        buffer = io.StringIO()
+        csv.writer(buffer, **dialect).writerows(rows)
+        return buffer.getvalue()
+    
+    quote = dialect['quotechar']
+    delimiter = dialect['delimiter']
+    terminator = dialect['lineterminator']
+    special = re.compile('[' + re.escape(''.join(set(delimiter + quote + terminator + '\r\n'))) + ']').search
+    
+    lines = []
+    for row in rows:
+        fields = []
+        for value, force in zip(row, quoted):
+            if force or special(value):
+                fields.append(quote + value.replace(quote, quote + quote) + quote)
+            else:
+                fields.append(value)
+        # csv.writer quotes a lone empty field so the row is not blank
+        if len(fields) == 1 and not fields[0]:
+            fields[0] = quote + quote
+        lines.append(delimiter.join(fields) + terminator)
+    return ''.join(lines)
+
+
 def prepare_for_compression(file_path):
     """
     Prepare document for compression.
     
+    The text is encoded as UTF-8 once, here, so every codec sees the same
+    256-symbol alphabet whatever characters the document uses.
+    
     Args:
         file_path: Path to file
         
     Returns:
-        Dictionary with text data and metadata
+        Dictionary with UTF-8 bytes ('data', 'length' in bytes) and metadata
     """
     ext = os.path.splitext(file_path)[1].lower()
     
     if ext == '.txt':
-        content = load_text_file(file_path)
+        content = load_text_bytes(file_path)
     elif ext == '.pdf':
-        content = load_pdf(file_path)
+        content = load_pdf(file_path).encode('utf-8')
     elif ext == '.docx':
-        content = load_docx(file_path)
+        content = load_docx(file_path).encode('utf-8')
     elif ext == '.csv':
-        content = load_text_file(file_path)
+        content = load_text_bytes(file_path)
     else:
         # Try to read as text
         try:
-            content = load_text_file(file_path)
+            content = load_text_bytes(file_path)
         except:
             raise ValueError(f"Unsupported file format: {ext}")
     
@@ -128,4 +267,5 @@ def reconstruct_document(doc_data):
     Returns:
         Text content
     """
-    return doc_data['data']
+    data = doc_data['data']
+    return data.decode('utf-8') if isinstance(data, (bytes, bytearray)) else data
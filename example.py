@@ -19,16 +19,16 @@ print(f"Huffman Codes: {huffman_codes}")
 # LZW
 lzw_compressed = lzw.compress(text)
 print(f"LZW: {lzw_compressed}")
-print(f"LZW Decompressed: {lzw.decompress(lzw_compressed)}")
+print(f"LZW Decompressed: {lzw.decompress(lzw_compressed).decode('utf-8')}")
 
 # Example 2: Performance comparison
 from utils import performance
 
-data = [ord(c) for c in text]
+data = text.encode('utf-8')
 algorithms = [
     ('RLE', rle.compress, rle.decompress, False),
-    ('Huffman', lambda d: huffman.compress(text), lambda c: huffman.decompress(c[0], c[1]), True),
-    ('LZW', lambda d: lzw.compress(text), lzw.decompress, False)
+    ('Huffman', huffman.compress, huffman.decompress, True),
+    ('LZW', lzw.compress, lzw.decompress, False)
 ]
 
 results = performance.compare_algorithms(data, algorithms)
@@ -0,0 +1,158 @@
+"""
+Two-Dimensional Run Coding (CCITT G4 style)
+Best for bilevel images such as scanned documents and line art
+Codes each row's colour changes relative to the row above
+"""
+
+import numpy as np
+
+from algorithms.cancellation import CHECK_INTERVAL
+
+
+# Token values in the output byte stream
+VERTICAL_RANGE = 3          # vertical mode covers offsets -3..+3 (tokens 0..6)
+HORIZONTAL = 7              # followed by a varint distance from the previous change
+END_OF_ROW = 8
+PASS_ROW = 9                # row is identical to the row above
+
+
+def changes(row):
+    """
+    Positions where a bilevel row changes colour.
+    
+    The row is treated as preceded by a 0 pixel, so a row starting with 1
+    has a change at position 0.
+    
+    Args:
+        row: 1D array of 0/1 values
+    
+    Returns:
+        int array of change positions, ascending
+    """
+    row = np.asarray(row, dtype=np.int8)
+    return np.flatnonzero(np.diff(row, prepend=np.int8(0)))
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _check_rows(width):
+    """Rows between cancellation checks, so a check falls every CHECK_INTERVAL pixels."""
+    return max(1, CHECK_INTERVAL // max(width, 1))
+
+
+def encode(bits, cancel=None):
+    """
+    Encode a bilevel image as a stream of 2D run tokens.
+    
+    Every colour change a1 is matched against the first change b1 in the
+    reference row (the row above) that lies past the previous change a0.
+    When |a1 - b1| <= 3 a single vertical-mode token is written; otherwise
+    a horizontal-mode token and the gap a1 - a0 - 1 as a varint.
+    
+    Args:
+        bits: (H, W) array of 0/1 values
+        cancel: Optional CancellationToken checked every CHECK_INTERVAL pixels
+    
+    Returns:
+        Token stream as bytes (feed it to RLE, Huffman or LZW)
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    out = bytearray()
+    reference = np.empty(0, dtype=np.int64)
+    check_rows = _check_rows(bits.shape[1])
+    
+    for y in range(bits.shape[0]):
+        if cancel is not None and not y % check_rows:
+            cancel.check()
+        current = changes(bits[y])
+        if np.array_equal(current, reference):
+            out.append(PASS_ROW)
+            continue
+        
+        # Previous change in this row for every change (-1 before the first)
+        a0 = np.concatenate(([-1], current[:-1]))
+        index = np.searchsorted(reference, a0, side='right')
+        has_b1 = index < len(reference)
+        b1 = reference[np.minimum(index, max(len(reference) - 1, 0))] if len(reference) else a0
+        offset = current - b1
+        vertical = has_b1 & (np.abs(offset) <= VERTICAL_RANGE)
+        
+        for a1, prev, is_vertical, d in zip(current.tolist(), a0.tolist(), vertical.tolist(), offset.tolist()):
+            if is_vertical:
+                out.append(d + VERTICAL_RANGE)
+            else:
+                out.append(HORIZONTAL)
+                _write_varint(out, a1 - prev - 1)
+        out.append(END_OF_ROW)
+        reference = current
+    
+    return bytes(out)
+
+
+def decode(tokens, shape, cancel=None):
+    """
+    Decode a token stream produced by encode().
+    
+    Args:
+        tokens: Token stream (bytes or list of ints)
+        shape: Image shape (H, W)
+        cancel: Optional CancellationToken checked every CHECK_INTERVAL pixels
+    
+    Returns:
+        (H, W) uint8 array of 0/1 values
+    """
+    height, width = shape
+    data = bytes(tokens)
+    bits = np.zeros((height, width), dtype=np.uint8)
+    reference = []
+    pos = 0
+    check_rows = _check_rows(width)
+    
+    for y in range(height):
+        if cancel is not None and not y % check_rows:
+            cancel.check()
+        token = data[pos]
+        pos += 1
+        if token == PASS_ROW:
+            current = reference
+        else:
+            current = []
+            ref_index = 0
+            a0 = -1
+            while token != END_OF_ROW:
+                if token == HORIZONTAL:
+                    distance, pos = _read_varint(data, pos)
+                    a1 = a0 + 1 + distance
+                else:
+                    while reference[ref_index] <= a0:
+                        ref_index += 1
+                    a1 = reference[ref_index] + token - VERTICAL_RANGE
+                current.append(a1)
+                a0 = a1
+                token = data[pos]
+                pos += 1
+        
+        if current:
+            toggles = np.zeros(width + 1, dtype=np.uint8)
+            toggles[current] = 1
+            bits[y] = np.bitwise_xor.accumulate(toggles[:width])
+        reference = current
+    
+    return bits
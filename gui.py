@@ -15,6 +15,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from algorithms import rle, huffman, lzw
+from algorithms.cancellation import CancellationToken, CompressionCancelled
 
 
 class CompressionGUI:
@@ -28,6 +29,7 @@ class CompressionGUI:
         self.file_path = tk.StringVar()
         self.selected_algorithm = tk.StringVar(value="all")
         self.results = []
+        self.cancel_token = None
         
         # Create UI
         self.create_widgets()
@@ -139,6 +141,13 @@ class CompressionGUI:
         )
         compress_btn.pack(side=tk.LEFT, padx=5)
         
+        cancel_btn = ttk.Button(
+            button_frame,
+            text="⏹️ Cancel",
+            command=self.cancel_compression
+        )
+        cancel_btn.pack(side=tk.LEFT, padx=5)
+        
         clear_btn = ttk.Button(
             button_frame,
             text="🗑️ Clear Results",
@@ -255,11 +264,22 @@ TIP: Larger files compress better!
             messagebox.showwarning("No Input", "Please select a file or enter text to compress.")
             return
         
+        # A running job keeps its own token; a new one starts fresh
+        if self.cancel_token is not None:
+            self.cancel_token.cancel('superseded by a new run')
+        self.cancel_token = CancellationToken()
+        
         # Start compression in thread to keep GUI responsive
-        thread = threading.Thread(target=self.run_compression, daemon=True)
+        thread = threading.Thread(target=self.run_compression, args=(self.cancel_token,), daemon=True)
         thread.start()
     
-    def run_compression(self):
+    def cancel_compression(self):
+        """Stop the running compression at the codec's next check."""
+        if self.cancel_token is not None:
+            self.cancel_token.cancel('cancelled by user')
+            self.status_label.config(text="Cancelling...")
+    
+    def run_compression(self, cancel=None):
         """Run compression (called in separate thread)."""
         try:
             # Update UI
@@ -271,17 +291,18 @@ TIP: Larger files compress better!
             text_input = self.text_input.get('1.0', tk.END).strip()
             
             if file_path and os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    data_str = f.read()
+                with open(file_path, 'rb') as f:
+                    data = f.read()
                 source = f"File: {os.path.basename(file_path)}"
             else:
-                data_str = text_input
+                # Encode once; every codec works on the UTF-8 bytes
+                data = text_input.encode('utf-8')
                 source = "Direct Text Input"
             
-            if not data_str:
+            if not data:
                 raise ValueError("No data to compress")
             
-            data_list = [ord(c) for c in data_str]
+            data_str = data.decode('utf-8', errors='replace')
             
             # Clear previous results
             self.root.after(0, lambda: self.results_text.delete('1.0', tk.END))
@@ -291,7 +312,7 @@ TIP: Larger files compress better!
             self.print_result(f"  COMPRESSION ANALYSIS\n", 'header')
             self.print_result("=" * 90 + "\n\n", 'header')
             self.print_result(f"Source: {source}\n", 'info')
-            self.print_result(f"Size: {len(data_str):,} characters\n", 'info')
+            self.print_result(f"Size: {len(data):,} bytes\n", 'info')
             self.print_result(f"Preview: {data_str[:100]}...\n\n" if len(data_str) > 100 else f"Content: {data_str}\n\n", 'info')
             
             # Get selected algorithms
@@ -299,15 +320,15 @@ TIP: Larger files compress better!
             results = []
             
             if algo_choice in ['all', 'rle']:
-                result = self.test_algorithm("RLE", rle.compress, rle.decompress, data_list, data_str, is_rle=True)
+                result = self.test_algorithm("RLE", rle.compress, rle.decompress, data, is_rle=True, cancel=cancel)
                 results.append(result)
             
             if algo_choice in ['all', 'huffman']:
-                result = self.test_algorithm("Huffman", huffman.compress, huffman.decompress, data_list, data_str, is_huffman=True)
+                result = self.test_algorithm("Huffman", huffman.compress, huffman.decompress, data, is_huffman=True, cancel=cancel)
                 results.append(result)
             
             if algo_choice in ['all', 'lzw']:
-                result = self.test_algorithm("LZW", lzw.compress, lzw.decompress, data_list, data_str)
+                result = self.test_algorithm("LZW", lzw.compress, lzw.decompress, data, cancel=cancel)
                 results.append(result)
             
             # Print summary
@@ -316,6 +337,10 @@ TIP: Larger files compress better!
             # Update status
             self.root.after(0, lambda: self.status_label.config(text="✅ Compression complete!"))
             
+        except CompressionCancelled as e:
+            self.print_result(f"\n⏹️ Cancelled: {str(e)}\n", 'warning')
+            self.root.after(0, lambda: self.status_label.config(text="Compression cancelled"))
+        
         except Exception as e:
             self.print_result(f"\n❌ Error: {str(e)}\n", 'error')
             self.root.after(0, lambda: self.status_label.config(text=f"Error: {str(e)}"))
@@ -323,21 +348,15 @@ TIP: Larger files compress better!
         finally:
             self.root.after(0, self.progress.stop)
     
-    def test_algorithm(self, name, compress_func, decompress_func, data_list, data_str, is_rle=False, is_huffman=False):
-        """Test a single algorithm."""
+    def test_algorithm(self, name, compress_func, decompress_func, data, is_rle=False, is_huffman=False, cancel=None):
+        """Test a single algorithm on UTF-8 bytes."""
         self.print_result(f"\n{'─' * 90}\n", 'header')
         self.print_result(f"Testing {name}\n", 'header')
         self.print_result(f"{'─' * 90}\n", 'header')
         
-        # Choose data format
-        if is_rle:
-            test_data = data_list
-        else:
-            test_data = data_str
-        
         # Compress
         start = time.time()
-        compressed = compress_func(test_data)
+        compressed = compress_func(data, cancel=cancel)
         comp_time = time.time() - start
         
         # Get size
@@ -352,23 +371,18 @@ TIP: Larger files compress better!
         # Decompress
         start = time.time()
         if is_huffman:
-            decompressed = decompress_func(encoded, codes)
+            decompressed = decompress_func(encoded, codes, cancel=cancel)
         else:
-            decompressed = decompress_func(compressed)
+            decompressed = decompress_func(compressed, cancel=cancel)
         decomp_time = time.time() - start
         
         # Calculate metrics
-        orig_size = len(data_str)
+        orig_size = len(data)
         ratio = comp_size / orig_size if orig_size > 0 else 1
         space_saving = ((orig_size - comp_size) / orig_size * 100) if orig_size > 0 else 0
         
         # Verify
-        if is_huffman:
-            is_correct = ''.join(decompressed) == data_str
-        elif is_rle:
-            is_correct = list(decompressed) == data_list
-        else:
-            is_correct = decompressed == data_str
+        is_correct = bytes(decompressed) == data
         
         # Print results
         self.print_result(f"Original Size:       {orig_size:>10,} bytes\n")
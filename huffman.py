@@ -8,6 +8,15 @@ from collections import defaultdict
 from heapq import heappush, heappop, heapify
 import pickle
 
+import numpy as np
+
+from algorithms.cancellation import CHECK_INTERVAL
+
+
+# Longest code decoded with a lookup table; the table has 2**bits entries,
+# so longer codes fall back to walking the bitstring one bit at a time
+DECODE_TABLE_BITS = 16
+
 
 class HuffmanNode:
     """Node for building Huffman tree."""
@@ -22,26 +31,76 @@ class HuffmanNode:
         return self.freq < other.freq
 
 
-def build_frequency_table(data):
-    """Build frequency table from data."""
-    freq = defaultdict(int)
-    for item in data:
-        freq[item] += 1
+def _to_byte_values(data):
+    """Normalize input to bytes (strings are UTF-8 encoded)."""
+    if isinstance(data, str):
+        return data.encode('utf-8')
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return bytes(data)
+    try:
+        return bytes(int(x) for x in data)
+    except ValueError:
+        raise ValueError("Symbols must be byte values 0-255; encode text as UTF-8 first") from None
+
+
+def build_frequency_table(data, max_code_length=None, cancel=None):
+    """Build frequency table from data, optionally limited to max_code_length bits."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        # Fixed 256-symbol alphabet: count every byte value in one pass
+        if cancel is not None:
+            cancel.check()
+        counts = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+        freq = defaultdict(int, {value: int(counts[value]) for value in np.flatnonzero(counts).tolist()})
+    else:
+        freq = defaultdict(int)
+        for i, item in enumerate(data):
+            if cancel is not None and not i % CHECK_INTERVAL:
+                cancel.check()
+            freq[item] += 1
+    if max_code_length:
+        freq = limit_code_lengths(freq, max_code_length)
     return freq
 
 
-def build_huffman_tree(data):
+def code_depth(node):
+    """Return the longest code length in a Huffman tree."""
+    if node is None or node.char is not None:
+        return 0
+    return 1 + max(code_depth(node.left), code_depth(node.right))
+
+
+def limit_code_lengths(freq, max_code_length):
     """
-    Build Huffman tree from data.
+    Flatten a frequency table until no Huffman code exceeds max_code_length.
+    
+    Halving every count (keeping it non-zero) shrinks the spread between
+    rare and common symbols, so the tree gets shallower each pass.
     
     Args:
-        data: Input data (string, bytes, or list)
+        freq: Frequency table
+        max_code_length: Maximum code length in bits
         
     Returns:
-        Root node of Huffman tree
+        Frequency table producing codes of at most max_code_length bits
+    """
+    if len(freq) > 2 ** max_code_length:
+        raise ValueError(f"{len(freq)} symbols cannot fit in {max_code_length}-bit codes")
+    
+    while code_depth(tree_from_frequencies(freq)) > max_code_length:
+        freq = defaultdict(int, {ch: (fr >> 1) | 1 for ch, fr in freq.items()})
+    return freq
+
+
+def tree_from_frequencies(freq):
     """
-    freq = build_frequency_table(data)
+    Build Huffman tree from a frequency table.
     
+    Args:
+        freq: Dictionary mapping symbols to counts
+        
+    Returns:
+        Root node of Huffman tree
+    """
     if len(freq) == 0:
         return None
     
@@ -67,6 +126,21 @@ def build_huffman_tree(data):
     return heap[0]
 
 
+def build_huffman_tree(data, max_code_length=None, cancel=None):
+    """
+    Build Huffman tree from data.
+    
+    Args:
+        data: Input data (string, bytes, or list)
+        max_code_length: Optional limit on code length in bits
+        cancel: Optional CancellationToken
+        
+    Returns:
+        Root node of Huffman tree
+    """
+    return tree_from_frequencies(build_frequency_table(data, max_code_length, cancel))
+
+
 def build_codes(node, prefix="", code_map=None):
     """
     Build Huffman codes from tree.
@@ -94,47 +168,80 @@ def build_codes(node, prefix="", code_map=None):
     return code_map
 
 
-def compress(data):
+def _encode(data, codes, cancel=None):
+    """Concatenate the code of every byte, looked up in a 256-entry table."""
+    table = [codes.get(value, '') for value in range(256)]
+    if cancel is None:
+        return ''.join([table[value] for value in data])
+    
+    # Encode in blocks so the token is polled between them
+    blocks = []
+    for start in range(0, len(data), CHECK_INTERVAL):
+        cancel.check()
+        blocks.append(''.join([table[value] for value in data[start:start + CHECK_INTERVAL]]))
+    return ''.join(blocks)
+
+
+def compress(data, max_code_length=None, cancel=None):
     """
     Compress data using Huffman coding.
     
     Args:
-        data: Input data (string, bytes, or list)
+        data: Bytes to compress (strings are encoded as UTF-8)
+        max_code_length: Optional limit on code length in bits
+        cancel: Optional CancellationToken checked every CHECK_INTERVAL symbols
         
     Returns:
-        Tuple of (encoded bitstring, code dictionary)
+        Tuple of (encoded bitstring, code dictionary keyed by byte value)
     """
+    data = _to_byte_values(data)
     if not data:
         return ("", {})
     
-    root = build_huffman_tree(data)
+    root = build_huffman_tree(data, max_code_length, cancel)
     codes = build_codes(root)
-    
-    encoded = ''.join([codes[item] for item in data])
-    
-    return (encoded, codes)
+    return (_encode(data, codes, cancel), codes)
 
 
-def decompress(encoded_data, codes):
+def _decode_with_table(encoded_data, codes, width, cancel=None):
     """
-    Decompress Huffman encoded data.
+    Decode one symbol per step by looking up the next `width` bits.
     
-    Args:
-        encoded_data: Encoded bitstring
-        codes: Code dictionary from compression
-        
-    Returns:
-        Original data
+    Every code is expanded to all `width`-bit strings it prefixes, so the
+    table maps any window of the bitstring straight to (symbol, length).
     """
-    if not encoded_data:
-        return ""
-    
+    table = {}
+    for symbol, code in codes.items():
+        fill = width - len(code)
+        if not fill:
+            table[code] = (symbol, len(code))
+            continue
+        for tail in range(1 << fill):
+            table[code + format(tail, f'0{fill}b')] = (symbol, len(code))
+    
+    bits = encoded_data + '0' * width
+    end = len(encoded_data)
+    decoded = []
+    pos = 0
+    while pos < end:
+        if cancel is not None and not len(decoded) % CHECK_INTERVAL:
+            cancel.check()
+        symbol, length = table[bits[pos:pos + width]]
+        decoded.append(symbol)
+        pos += length
+    return decoded
+
+
+def _decode_bitwise(encoded_data, codes, cancel=None):
+    """Decode by growing a buffer one bit at a time until it matches a code."""
     reverse_codes = {v: k for k, v in codes.items()}
     
     decoded = []
     buffer = ""
     
-    for bit in encoded_data:
+    for i, bit in enumerate(encoded_data):
+        if cancel is not None and not i % CHECK_INTERVAL:
+            cancel.check()
         buffer += bit
         if buffer in reverse_codes:
             decoded.append(reverse_codes[buffer])
@@ -143,58 +250,83 @@ def decompress(encoded_data, codes):
     return decoded
 
 
-def compress_to_bytes(data):
+def decompress(encoded_data, codes, cancel=None):
+    """
+    Decompress Huffman encoded data.
+    
+    Args:
+        encoded_data: Encoded bitstring
+        codes: Code dictionary from compression
+        cancel: Optional CancellationToken checked every CHECK_INTERVAL symbols
+        
+    Returns:
+        Original bytes
+    """
+    if not encoded_data:
+        return b""
+    
+    width = max(len(code) for code in codes.values())
+    if width <= DECODE_TABLE_BITS:
+        decoded = _decode_with_table(encoded_data, codes, width, cancel)
+    else:
+        decoded = _decode_bitwise(encoded_data, codes, cancel)
+    
+    if decoded and isinstance(decoded[0], str):
+        # Code tables from before the byte alphabet were keyed by characters
+        return ''.join(decoded).encode('utf-8')
+    return bytes(decoded)
+
+
+def compress_to_bytes(data, max_code_length=None, cancel=None):
     """
     Compress data and convert to bytes for storage.
     Optimized to store frequency table instead of full codebook.
     
     Args:
-        data: Input data
+        data: Bytes-like buffer (strings are encoded as UTF-8)
+        max_code_length: Optional limit on code length in bits
+        cancel: Optional CancellationToken
         
     Returns:
         Compressed data as bytes
     """
+    data = _to_byte_values(data)
     if not data:
         return b''
     
-    encoded, codes = compress(data)
+    freq_table = build_frequency_table(data, max_code_length, cancel)
+    encoded = _encode(data, build_codes(tree_from_frequencies(freq_table)), cancel)
     
     # Convert bitstring to bytes
     padding = 8 - len(encoded) % 8
     if padding != 8:
         encoded += '0' * padding
     
-    byte_array = bytearray()
-    for i in range(0, len(encoded), 8):
-        byte = encoded[i:i+8]
-        byte_array.append(int(byte, 2))
-    
-    # Store only frequency table (much smaller than full codebook)
-    freq_table = build_frequency_table(data)
-    
-    # Store padding info, frequency table, and compressed data
+    # Store padding info, frequency table (much smaller than full codebook)
+    # and compressed data
     result = {
         'padding': padding,
         'freq': dict(freq_table),  # Convert to regular dict for pickle
-        'data': bytes(byte_array)
+        'data': int(encoded, 2).to_bytes(len(encoded) // 8, 'big')
     }
     
     return pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
 
 
-def decompress_from_bytes(compressed_bytes):
+def decompress_from_bytes(compressed_bytes, cancel=None):
     """
     Decompress data from bytes.
     Rebuilds Huffman tree from frequency table.
     
     Args:
         compressed_bytes: Compressed data as bytes
+        cancel: Optional CancellationToken
         
     Returns:
-        Original data
+        Original bytes
     """
     if not compressed_bytes:
-        return []
+        return b''
     
     result = pickle.loads(compressed_bytes)
     
@@ -203,28 +335,13 @@ def decompress_from_bytes(compressed_bytes):
     byte_data = result['data']
     
     # Rebuild Huffman tree from frequency table
-    heap = [HuffmanNode(ch, fr) for ch, fr in freq_table.items()]
-    
-    if len(heap) == 1:
-        # Special case: only one unique character
-        node = heap[0]
-        codes = {node.char: "0"}
-    else:
-        heapify(heap)
-        while len(heap) > 1:
-            node1 = heappop(heap)
-            node2 = heappop(heap)
-            merged = HuffmanNode(None, node1.freq + node2.freq)
-            merged.left = node1
-            merged.right = node2
-            heappush(heap, merged)
-        codes = build_codes(heap[0])
+    codes = build_codes(tree_from_frequencies(freq_table))
     
     # Convert bytes back to bitstring
-    bitstring = ''.join([bin(byte)[2:].zfill(8) for byte in byte_data])
+    bitstring = format(int.from_bytes(byte_data, 'big'), f'0{len(byte_data) * 8}b')
     
     # Remove padding
     if padding != 8:
         bitstring = bitstring[:-padding]
     
-    return decompress(bitstring, codes)
+    return decompress(bitstring, codes, cancel)
@@ -3,7 +3,7 @@ Huffman Coding Algorithm Routes
 Handles all Huffman compression operations
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 import sys
 import os
 import time
@@ -15,8 +15,9 @@ from pathlib import Path
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from algorithms import huffman
-from handlers import image_handler, video_handler, document_handler
+from algorithms import huffman, codec_registry
+from algorithms.cancellation import CancellationToken, CompressionCancelled
+from handlers import image_handler, video_handler, video_pipeline, document_handler, csv_pipeline
 from utils.database import CompressionDB, get_db
 
 huffman_bp = Blueprint('huffman', __name__, url_prefix='/huffman')
@@ -48,36 +49,46 @@ def compress_text():
     try:
         data = request.json
         text = data.get('text', '')
+        level = data.get('level')
+        try:
+            params = codec_registry.level_params('huffman', level)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stop the codec if the request outlives its time budget
+        cancel = CancellationToken(timeout=current_app.config.get('COMPRESSION_TIMEOUT'))
         
         if not text:
             return jsonify({'error': 'No text provided'}), 400
         
+        # Encode once; the codec works on the UTF-8 bytes
+        data = text.encode('utf-8')
+        
         # Store original file in database
         original_file_id = db.store_file(
-            file_data=text.encode(),
+            file_data=data,
             filename='text_input.txt',
             file_type='text/plain'
         )
         
         # Measure compression time
         start_time = time.time()
-        encoded, codes = huffman.compress(text)
+        encoded, codes = huffman.compress(data, **params, cancel=cancel)
         compress_time = time.time() - start_time
         
         # Measure decompression time
         start_time = time.time()
-        decoded_list = huffman.decompress(encoded, codes)
-        decoded = ''.join(decoded_list) if isinstance(decoded_list, list) else decoded_list
+        decoded = huffman.decompress(encoded, codes, cancel=cancel)
         decompress_time = time.time() - start_time
         
         # Calculate metrics
-        original_size = len(text.encode())
+        original_size = len(data)
         compressed_size = len(encoded) // 8 + (1 if len(encoded) % 8 else 0)
         ratio = compressed_size / original_size if original_size > 0 else 0
         savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
         
         # Verify correctness
-        is_correct = text == decoded
+        is_correct = data == decoded
         
         # Store compressed data
         compressed_file_id = db.store_compressed_file(
@@ -88,6 +99,7 @@ def compress_text():
         
         # Save compression record
         record = {
+            'level': level,
             'filename': 'text_input.txt',
             'file_type': 'text',
             'algorithm': 'Huffman',
@@ -103,6 +115,7 @@ def compress_text():
         record_id = db.save_compression_record(record)
         
         return jsonify({
+            'level': level,
             'algorithm': 'Huffman',
             'original_size': original_size,
             'compressed_size': compressed_size,
@@ -111,12 +124,14 @@ def compress_text():
             'compression_time': round(compress_time, 6),
             'decompression_time': round(decompress_time, 6),
             'is_correct': is_correct,
-            'decompressed_text': decoded if is_correct else '',
+            'decompressed_text': text if is_correct else '',
             'record_id': str(record_id),
             'original_file_id': str(original_file_id),
             'compressed_file_id': str(compressed_file_id)
         })
         
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -129,8 +144,19 @@ def compress_image():
             return jsonify({'error': 'No file uploaded'}), 400
         
         file = request.files['file']
+        level = request.form.get('level')
+        try:
+            params = codec_registry.level_params('huffman', level)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stop the codec if the request outlives its time budget
+        cancel = CancellationToken(timeout=current_app.config.get('COMPRESSION_TIMEOUT'))
         grayscale = request.form.get('grayscale', 'false').lower() == 'true'
-        resize_percent = request.form.get('resize')
+        try:
+            resize_param = image_handler.parse_resize_percent(request.form.get('resize'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
@@ -145,7 +171,6 @@ def compress_image():
         file.save(filepath)
         
         # Process image with optional resize
-        resize_param = int(resize_percent) if resize_percent and resize_percent != 'none' else None
         image_data = image_handler.prepare_for_compression(
             filepath, 
             grayscale=grayscale,
@@ -153,21 +178,19 @@ def compress_image():
         )
         data = image_data['data']
         
-        # Convert to text for Huffman
-        text = ''.join(chr(min(d, 255)) for d in data)
-        
-        # Compress
+        # Compress straight from the pixel buffer
         start_time = time.time()
-        encoded, codes = huffman.compress(text)
+        encoded, codes = huffman.compress(data.data, **params, cancel=cancel)
         compress_time = time.time() - start_time
         
         # Decompress
         start_time = time.time()
-        decoded = huffman.decompress(encoded, codes)
+        decoded = huffman.decompress(encoded, codes, cancel=cancel)
         decompress_time = time.time() - start_time
         
         # Calculate metrics - Huffman compressed size estimation
-        original_size = len(data)
+        # Raw pixel bytes; the coded data may be a smaller palette index plane
+        original_size = image_data['raw_size']
         # Huffman: encoded bits + code table
         # Encoded size in bytes + code table size (roughly 256 * 4 bytes for typical case)
         encoded_bytes = len(encoded) // 8 + (1 if len(encoded) % 8 else 0)
@@ -175,26 +198,28 @@ def compress_image():
         compressed_size = encoded_bytes + code_table_bytes
         ratio = compressed_size / original_size if original_size > 0 else 0
         savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
-        
-        # Fix: decompress returns a list, convert to string for comparison
-        decoded_text = ''.join(decoded) if isinstance(decoded, list) else decoded
-        is_correct = text == decoded_text
+        is_correct = data.data == decoded
         
         # Store in database
         db = get_db()
         
         # Store original file
+        # Stream the upload into storage instead of reading it into memory
         with open(filepath, 'rb') as f:
-            original_bytes = f.read()
-        original_file_id = db.store_file(original_bytes, file.filename, 'image')
+            original_file_id = db.store_file(f, file.filename, 'image')
         
         # Store compressed data with metadata for reconstruction
         compressed_data = {
+            'level': level,
+            'params': params,
             'encoded': encoded,
             'codes': codes,
             'shape': image_data.get('shape'),
             'mode': image_data.get('mode'),
-            'format': image_data.get('format')
+            'format': image_data.get('format'),
+            'predictor': image_data.get('predictor'),
+            'filters': image_data.get('filters'),
+            'palette': image_data.get('palette')
         }
         compressed_bytes = pickle.dumps(compressed_data)
         compressed_file_id = db.store_compressed_file(compressed_bytes, file.filename, 'huffman')
@@ -206,6 +231,7 @@ def compress_image():
         
         # Save compression record
         record = {
+            'level': level,
             'filename': file.filename,
             'file_type': 'image',
             'algorithm': 'Huffman',
@@ -228,6 +254,7 @@ def compress_image():
         os.remove(filepath)
         
         return jsonify({
+            'level': level,
             'algorithm': 'Huffman',
             'file_type': 'image',
             'original_size': original_size,
@@ -247,10 +274,15 @@ def compress_image():
                 'shape': image_data.get('shape'),
                 'mode': image_data.get('mode'),
                 'format': image_data.get('format'),
-                'grayscale': grayscale
+                'grayscale': grayscale,
+                'predictor': image_data.get('predictor'),
+                'filters': image_handler.filter_summary(image_data['filters']),
+                'palette_colors': len(image_data['palette']) if image_data['palette'] is not None else None
             }
         })
         
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -263,7 +295,19 @@ def compress_video():
             return jsonify({'error': 'No file uploaded'}), 400
         
         file = request.files['file']
+        level = request.form.get('level')
+        try:
+            params = codec_registry.level_params('huffman', level)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stop the codec if the request outlives its time budget
+        cancel = CancellationToken(timeout=current_app.config.get('COMPRESSION_TIMEOUT'))
         grayscale = request.form.get('grayscale', 'false').lower() == 'true'
+        # Frames after the first are coded as differences from the one before
+        temporal = request.form.get('temporal', 'diff')
+        if temporal not in video_pipeline.TEMPORAL_MODES:
+            return jsonify({'error': f"Unknown temporal mode: {temporal}"}), 400
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
@@ -277,52 +321,56 @@ def compress_video():
         filepath = os.path.join(upload_folder, safe_filename)
         file.save(filepath)
         
-        # Process video (first frame only for demo)
-        video_data = video_handler.prepare_for_compression(filepath, grayscale=grayscale, max_frames=1)
-        data = video_data['data'][0] if video_data['data'] else []
-        
-        # Convert to text for Huffman
-        text = ''.join(chr(min(d, 255)) for d in data)
-        
-        # Compress
+        # Stream frames through the codec; only compressed frames are held
+        # in memory. The request codes at most VIDEO_FRAME_LIMIT frames so it
+        # finishes in time; /api/video/compress codes whole clips as a job
+        max_frames = current_app.config.get('VIDEO_FRAME_LIMIT')
+        video_data = video_handler.video_info(filepath)
         start_time = time.time()
-        encoded, codes = huffman.compress(text)
+        container = video_pipeline.compress_video(
+            video_handler.iter_frames(filepath, grayscale=grayscale, max_frames=max_frames, cancel=cancel),
+            'huffman', params, temporal=temporal, cancel=cancel
+        )
         compress_time = time.time() - start_time
+        video_data['frame_count'] = container['frame_count']
         
-        # Decompress
+        # Decompress, comparing against a second pass over the file
         start_time = time.time()
-        decoded = huffman.decompress(encoded, codes)
+        is_correct = video_pipeline.verify_video(
+            container, video_handler.iter_frames(filepath, grayscale=grayscale, max_frames=max_frames, cancel=cancel),
+            cancel=cancel
+        )
         decompress_time = time.time() - start_time
         
         # Calculate metrics
-        original_size = len(data)
-        compressed_size = len(encoded) // 8 + (1 if len(encoded) % 8 else 0)
+        original_size = container['raw_size']
+        compressed_size = video_pipeline.compressed_size(container)
         ratio = compressed_size / original_size if original_size > 0 else 0
         savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
-        is_correct = text == decoded
         
         # Store in database
         db = get_db()
         
         # Store original file
+        # Stream the upload into storage instead of reading it into memory
         with open(filepath, 'rb') as f:
-            original_bytes = f.read()
-        original_file_id = db.store_file(original_bytes, file.filename, 'video')
+            original_file_id = db.store_file(f, file.filename, 'video')
         
         # Store compressed data with metadata for reconstruction
-        compressed_data = {
-            'encoded': encoded,
-            'codes': codes,
-            'fps': video_data.get('fps'),
-            'width': video_data.get('width'),
-            'height': video_data.get('height'),
-            'frame_count': video_data.get('frame_count')
-        }
+        compressed_data = dict(
+            container,
+            level=level,
+            fps=video_data.get('fps'),
+            width=video_data.get('width'),
+            height=video_data.get('height'),
+            grayscale=grayscale
+        )
         compressed_bytes = pickle.dumps(compressed_data)
         compressed_file_id = db.store_compressed_file(compressed_bytes, file.filename, 'huffman')
         
         # Save compression record
         record = {
+            'level': level,
             'filename': file.filename,
             'file_type': 'video',
             'algorithm': 'Huffman',
@@ -340,7 +388,9 @@ def compress_video():
                 'width': video_data.get('width'),
                 'height': video_data.get('height'),
                 'frame_count': video_data.get('frame_count'),
-                'grayscale': grayscale
+                'total_frames': video_data.get('total_frames'),
+                'grayscale': grayscale,
+                'temporal': temporal
             }
         }
         record_id = db.save_compression_record(record)
@@ -349,6 +399,7 @@ def compress_video():
         os.remove(filepath)
         
         return jsonify({
+            'level': level,
             'record_id': record_id,
             'original_file_id': original_file_id,
             'compressed_file_id': compressed_file_id,
@@ -366,10 +417,14 @@ def compress_video():
                 'width': video_data.get('width'),
                 'height': video_data.get('height'),
                 'frame_count': video_data.get('frame_count'),
-                'grayscale': grayscale
+                'total_frames': video_data.get('total_frames'),
+                'grayscale': grayscale,
+                'temporal': temporal
             }
         })
         
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -382,6 +437,14 @@ def compress_document():
             return jsonify({'error': 'No file uploaded'}), 400
         
         file = request.files['file']
+        level = request.form.get('level')
+        try:
+            params = codec_registry.level_params('huffman', level)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stop the codec if the request outlives its time budget
+        cancel = CancellationToken(timeout=current_app.config.get('COMPRESSION_TIMEOUT'))
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
@@ -395,30 +458,56 @@ def compress_document():
         filepath = os.path.join(upload_folder, safe_filename)
         file.save(filepath)
         
-        # Process document
-        doc_data = document_handler.prepare_for_compression(filepath)
-        content = doc_data['data']
-        data = [ord(c) for c in content]
-        
-        # Convert to text for Huffman
-        text = ''.join(chr(min(d, 255)) for d in data)
-        
-        # Compress
-        start_time = time.time()
-        encoded, codes = huffman.compress(text)
-        compress_time = time.time() - start_time
-        
-        # Decompress
-        start_time = time.time()
-        decoded = huffman.decompress(encoded, codes)
-        decompress_time = time.time() - start_time
-        
-        # Calculate metrics
-        original_size = len(data)
-        compressed_size = len(encoded) // 8 + (1 if len(encoded) % 8 else 0)
-        ratio = compressed_size / original_size if original_size > 0 else 0
-        savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
-        is_correct = text == decoded
+        # CSV files are parsed into columns and coded by column type, one
+        # block of rows at a time; 'columnar=false' codes the raw text instead
+        columnar = (os.path.splitext(filepath)[1].lower() == '.csv'
+                    and request.form.get('columnar', 'true').lower() == 'true')
+        
+        if columnar:
+            dialect = document_handler.sniff_csv_dialect(filepath)
+            start_time = time.time()
+            container = csv_pipeline.compress_csv(
+                document_handler.iter_csv_records(filepath, dialect), 'huffman', params, dialect, cancel=cancel
+            )
+            compress_time = time.time() - start_time
+            
+            # Decompress, comparing block by block against the file
+            start_time = time.time()
+            is_correct = csv_pipeline.verify_csv(container, filepath, cancel=cancel)
+            decompress_time = time.time() - start_time
+            
+            # Calculate metrics
+            original_size = os.path.getsize(filepath)
+            compressed_size = csv_pipeline.compressed_size(container)
+            ratio = compressed_size / original_size if original_size > 0 else 0
+            savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+            doc_data = {'format': '.csv', 'length': container['length']}
+            
+            # Small files, or columns the codec expands, can come out larger
+            # than the upload; code those as plain text instead
+            columnar = compressed_size < original_size
+        
+        if not columnar:
+            # Process document
+            doc_data = document_handler.prepare_for_compression(filepath)
+            data = doc_data['data']
+            
+            # Compress
+            start_time = time.time()
+            encoded, codes = huffman.compress(data, **params, cancel=cancel)
+            compress_time = time.time() - start_time
+            
+            # Decompress
+            start_time = time.time()
+            decoded = huffman.decompress(encoded, codes, cancel=cancel)
+            decompress_time = time.time() - start_time
+            
+            # Calculate metrics
+            original_size = len(data)
+            compressed_size = len(encoded) // 8 + (1 if len(encoded) % 8 else 0)
+            ratio = compressed_size / original_size if original_size > 0 else 0
+            savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+            is_correct = data == decoded
         
         # Store in database
         db = get_db()
@@ -429,17 +518,23 @@ def compress_document():
         original_file_id = db.store_file(original_bytes, file.filename, 'document')
         
         # Store compressed data with metadata
-        compressed_data = {
-            'encoded': encoded,
-            'codes': codes,
-            'format': doc_data.get('format'),
-            'length': doc_data.get('length')
-        }
+        if columnar:
+            compressed_data = dict(container, level=level, format=doc_data['format'], length=doc_data['length'])
+        else:
+            compressed_data = {
+                'level': level,
+                'params': params,
+                'encoded': encoded,
+                'codes': codes,
+                'format': doc_data.get('format'),
+                'length': doc_data.get('length')
+            }
         compressed_bytes = pickle.dumps(compressed_data)
         compressed_file_id = db.store_compressed_file(compressed_bytes, file.filename, 'huffman')
         
         # Save compression record
         record = {
+            'level': level,
             'filename': file.filename,
             'file_type': 'document',
             'algorithm': 'Huffman',
@@ -454,7 +549,8 @@ def compress_document():
             'compressed_file_id': compressed_file_id,
             'metadata': {
                 'format': doc_data.get('format'),
-                'length': doc_data.get('length')
+                'length': doc_data.get('length'),
+                'columnar': columnar
             }
         }
         record_id = db.save_compression_record(record)
@@ -463,6 +559,7 @@ def compress_document():
         os.remove(filepath)
         
         return jsonify({
+            'level': level,
             'record_id': record_id,
             'original_file_id': original_file_id,
             'compressed_file_id': compressed_file_id,
@@ -477,9 +574,12 @@ def compress_document():
             'is_correct': is_correct,
             'metadata': {
                 'format': doc_data.get('format'),
-                'length': doc_data.get('length')
+                'length': doc_data.get('length'),
+                'columnar': columnar
             }
         })
         
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -9,6 +9,22 @@ import io
 import os
 
 
+# PNG-style row filter types, stored one byte per image row
+FILTER_NONE = 0
+FILTER_SUB = 1
+FILTER_UP = 2
+FILTER_AVERAGE = 3
+FILTER_PAETH = 4
+FILTER_NAMES = ['none', 'sub', 'up', 'average', 'paeth']
+
+# Colour images with at most this many colours are stored as a palette plus
+# a one-byte index per pixel
+PALETTE_MAX_COLORS = 256
+
+# Modes Image.reduce() can box-average
+REDUCE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'YCbCr', 'I', 'F')
+
+
 def load_image(file_path):
     """
     Load image from file.
@@ -68,9 +84,416 @@ def data_to_image(data, shape, dtype='uint8'):
     return np.array(data, dtype=dtype).reshape(shape)
 
 
-def prepare_for_compression(file_path, grayscale=False, resize=None, resize_percent=None):
+def delta_encode(values):
     """
-    Prepare image for compression.
+    Delta-encode pixel values with byte wraparound.
+    
+    The first value is kept as-is; every following value becomes
+    (value - previous + 128) % 256.
+    
+    Args:
+        values: Array or list of pixel values (0-255), any shape
+        
+    Returns:
+        Flat uint8 numpy array
+    """
+    flat = np.asarray(values, dtype=np.uint8).ravel()
+    encoded = np.empty_like(flat)
+    if flat.size:
+        encoded[0] = flat[0]
+        # uint8 arithmetic wraps modulo 256
+        encoded[1:] = np.diff(flat) + np.uint8(128)
+    return encoded
+
+
+def delta_decode(delta_encoded):
+    """
+    Invert delta_encode().
+    
+    Args:
+        delta_encoded: Array or list of delta-encoded values
+        
+    Returns:
+        Flat uint8 numpy array of original values
+    """
+    deltas = np.asarray(delta_encoded, dtype=np.uint8).ravel().copy()
+    if deltas.size:
+        deltas[1:] -= np.uint8(128)
+    # Accumulating in uint8 keeps the running sum modulo 256
+    return np.cumsum(deltas, dtype=np.uint8)
+
+
+def _as_channels(img_array):
+    """View an (H, W) or (H, W, C) array as (H, W, C)."""
+    img_array = np.asarray(img_array)
+    return img_array[:, :, np.newaxis] if img_array.ndim == 2 else img_array
+
+
+def _paeth(a, b, c):
+    """Paeth predictor on int16 arrays: whichever of a, b, c is closest to a + b - c."""
+    p = a + b - c
+    pa = np.abs(p - a)
+    pb = np.abs(p - b)
+    pc = np.abs(p - c)
+    return np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+
+
+def _predict(filter_type, a, b, c):
+    """Prediction for one filter type from left (a), up (b) and up-left (c) neighbours."""
+    if filter_type == FILTER_NONE:
+        return np.zeros_like(a)
+    if filter_type == FILTER_SUB:
+        return a
+    if filter_type == FILTER_UP:
+        return b
+    if filter_type == FILTER_AVERAGE:
+        return (a + b) >> 1
+    return _paeth(a, b, c)
+
+
+def filter_image(img_array):
+    """
+    Apply PNG-style predictive filters, choosing the best filter per row.
+    
+    Each channel is predicted from the same channel of its left, upper and
+    upper-left neighbours. For every row the filter with the smallest sum of
+    absolute (signed byte) residuals is kept.
+    
+    Args:
+        img_array: uint8 array of shape (H, W) or (H, W, C)
+        
+    Returns:
+        Tuple of (residuals with the input's shape as uint8, filter type per
+        row as bytes)
+    """
+    img_array = np.asarray(img_array, dtype=np.uint8)
+    pixels = _as_channels(img_array)
+    height, width, channels = pixels.shape
+    
+    padded = np.zeros((height + 1, width + 1, channels), dtype=np.int16)
+    padded[1:, 1:] = pixels
+    x = padded[1:, 1:]
+    a = padded[1:, :-1]   # left
+    b = padded[:-1, 1:]   # up
+    c = padded[:-1, :-1]  # up-left
+    
+    best = None
+    best_cost = None
+    filters = np.zeros(height, dtype=np.uint8)
+    
+    for filter_type in range(len(FILTER_NAMES)):
+        residual = ((x - _predict(filter_type, a, b, c)) & 0xFF).astype(np.uint8)
+        cost = np.abs(residual.view(np.int8).astype(np.int32)).sum(axis=(1, 2))
+        if best is None:
+            best, best_cost = residual, cost
+            continue
+        better = cost < best_cost
+        best[better] = residual[better]
+        best_cost = np.where(better, cost, best_cost)
+        filters[better] = filter_type
+    
+    return best.reshape(img_array.shape), filters.tobytes()
+
+
+def unfilter_image(residuals, filters, shape):
+    """
+    Invert filter_image().
+    
+    Pixels on one anti-diagonal (y + x constant) depend only on the previous
+    two diagonals, so decoding runs H + W - 1 vectorized steps instead of a
+    loop over every pixel.
+    
+    Args:
+        residuals: Filtered values (array or list), any layout of the image size
+        filters: Filter type per row (bytes or sequence of ints)
+        shape: Image shape, (H, W) or (H, W, C)
+        
+    Returns:
+        uint8 array with the given shape
+    """
+    res = _as_channels(np.asarray(residuals, dtype=np.uint8).reshape(shape)).astype(np.int16)
+    height, width, channels = res.shape
+    row_filters = np.frombuffer(bytes(filters), dtype=np.uint8)
+    
+    padded = np.zeros((height + 1, width + 1, channels), dtype=np.int16)
+    
+    for d in range(height + width - 1):
+        ys = np.arange(max(0, d - width + 1), min(height - 1, d) + 1)
+        xs = d - ys
+        a = padded[ys + 1, xs]
+        b = padded[ys, xs + 1]
+        c = padded[ys, xs]
+        row_filter = row_filters[ys][:, np.newaxis]
+        prediction = np.select(
+            [row_filter == FILTER_SUB, row_filter == FILTER_UP,
+             row_filter == FILTER_AVERAGE, row_filter == FILTER_PAETH],
+            [a, b, (a + b) >> 1, _paeth(a, b, c)],
+            default=0
+        )
+        padded[ys + 1, xs + 1] = (res[ys, xs] + prediction) & 0xFF
+    
+    return padded[1:, 1:].astype(np.uint8).reshape(shape)
+
+
+def filter_summary(filters):
+    """
+    Count how often each filter type was chosen.
+    
+    Args:
+        filters: Filter type per row (bytes)
+        
+    Returns:
+        Dictionary mapping filter name to row count
+    """
+    counts = np.bincount(np.frombuffer(bytes(filters), dtype=np.uint8), minlength=len(FILTER_NAMES))
+    return {name: int(count) for name, count in zip(FILTER_NAMES, counts)}
+
+
+def _signed_half(values):
+    """Arithmetic half of uint8 values read as signed bytes, as int16."""
+    return values.view(np.int8).astype(np.int16) >> 1
+
+
+def rgb_to_ycocg_r(rgb):
+    """
+    Reversible YCoCg-R colour transform with byte wraparound.
+    
+    Built from lifting steps, so every step can be undone exactly even
+    though the chroma differences are stored modulo 256.
+    
+    Args:
+        rgb: uint8 array of shape (..., 3)
+        
+    Returns:
+        uint8 array of shape (..., 3) holding Y, Co, Cg
+    """
+    rgb = np.asarray(rgb, dtype=np.uint8)
+    r, g, b = (rgb[..., i].astype(np.int16) for i in range(3))
+    co = ((r - b) & 0xFF).astype(np.uint8)
+    t = (b + _signed_half(co)) & 0xFF
+    cg = ((g - t) & 0xFF).astype(np.uint8)
+    y = ((t + _signed_half(cg)) & 0xFF).astype(np.uint8)
+    return np.stack([y, co, cg], axis=-1)
+
+
+def ycocg_r_to_rgb(ycocg):
+    """
+    Invert rgb_to_ycocg_r().
+    
+    Args:
+        ycocg: uint8 array of shape (..., 3) holding Y, Co, Cg
+        
+    Returns:
+        uint8 array of shape (..., 3) holding R, G, B
+    """
+    ycocg = np.asarray(ycocg, dtype=np.uint8)
+    y = ycocg[..., 0].astype(np.int16)
+    co, cg = ycocg[..., 1], ycocg[..., 2]
+    t = (y - _signed_half(cg)) & 0xFF
+    g = (cg.astype(np.int16) + t) & 0xFF
+    b = (t - _signed_half(co)) & 0xFF
+    r = (b + co.astype(np.int16)) & 0xFF
+    return np.stack([r, g, b], axis=-1).astype(np.uint8)
+
+
+def pack_pixels(img_array):
+    """
+    Pack the channels of every pixel into one integer.
+    
+    Args:
+        img_array: uint8 array of shape (H, W) or (H, W, C) with C <= 4
+        
+    Returns:
+        uint32 array of shape (H, W)
+    """
+    pixels = _as_channels(np.asarray(img_array, dtype=np.uint8))
+    packed = np.zeros(pixels.shape[:2], dtype=np.uint32)
+    for channel in range(pixels.shape[2]):
+        packed = (packed << np.uint32(8)) | pixels[:, :, channel]
+    return packed
+
+
+def unpack_pixels(packed, channels):
+    """
+    Invert pack_pixels().
+    
+    Args:
+        packed: uint32 array
+        channels: Number of channels (0 for an (H, W) result)
+        
+    Returns:
+        uint8 array of shape packed.shape or packed.shape + (channels,)
+    """
+    packed = np.asarray(packed, dtype=np.uint32)
+    count = max(channels, 1)
+    shifts = np.arange(count - 1, -1, -1, dtype=np.uint32) * np.uint32(8)
+    pixels = ((packed[..., np.newaxis] >> shifts) & np.uint32(0xFF)).astype(np.uint8)
+    return pixels if channels else pixels[..., 0]
+
+
+def unique_colors(img_array):
+    """
+    Find the distinct colours of an image.
+    
+    Args:
+        img_array: uint8 array of shape (H, W) or (H, W, C) with C <= 4
+        
+    Returns:
+        Tuple of (colours as uint8 array of shape (N,) or (N, C) in ascending
+        packed order, per-pixel colour index as an (H, W) int array)
+    """
+    img_array = np.asarray(img_array, dtype=np.uint8)
+    colors, inverse = np.unique(pack_pixels(img_array), return_inverse=True)
+    channels = img_array.shape[2] if img_array.ndim == 3 else 0
+    return unpack_pixels(colors, channels), inverse.reshape(img_array.shape[:2])
+
+
+def to_palette(img_array, max_colors=PALETTE_MAX_COLORS):
+    """
+    Replace the pixels of a few-colour image with palette indices.
+    
+    The palette is sorted by brightness so that neighbouring indices hold
+    similar colours, which keeps prediction residuals of the index plane
+    small.
+    
+    Args:
+        img_array: uint8 array of shape (H, W, C)
+        max_colors: Largest palette to build (at most 256)
+        
+    Returns:
+        Tuple of (palette as uint8 array of shape (N, C), uint8 index plane
+        of shape (H, W)), or None if the image is single-channel or has
+        more than max_colors colours
+    """
+    img_array = np.asarray(img_array, dtype=np.uint8)
+    if img_array.ndim != 3:
+        return None
+    
+    colors, inverse = unique_colors(img_array)
+    if len(colors) > min(max_colors, PALETTE_MAX_COLORS):
+        return None
+    
+    if colors.shape[1] >= 3:
+        brightness = colors[:, :3].astype(np.int32) @ np.array([299, 587, 114])
+    else:
+        brightness = colors[:, 0].astype(np.int32)
+    order = np.argsort(brightness, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return colors[order], rank[inverse].astype(np.uint8)
+
+
+def from_palette(palette, indices):
+    """
+    Invert to_palette().
+    
+    Args:
+        palette: uint8 array of shape (N, C)
+        indices: Index plane of shape (H, W)
+        
+    Returns:
+        uint8 array of shape (H, W, C)
+    """
+    return np.asarray(palette, dtype=np.uint8)[np.asarray(indices, dtype=np.uint8)]
+
+
+def encode_pixels(img_array, predictor='png'):
+    """
+    Turn pixels into residuals for the entropy coders.
+    
+    Args:
+        img_array: uint8 image array
+        predictor: 'png' for per-row 2D filters, 'delta' for the 1D delta
+        
+    Returns:
+        Tuple of (flat uint8 residuals, filters bytes or None)
+    """
+    if predictor == 'png':
+        residuals, filters = filter_image(img_array)
+        return residuals.ravel(), filters
+    if predictor == 'delta':
+        return delta_encode(img_array), None
+    raise ValueError(f"Unknown predictor: {predictor}")
+
+
+def decode_pixels(data, shape, predictor='delta', filters=None):
+    """
+    Invert encode_pixels().
+    
+    Args:
+        data: Residuals (array or list)
+        shape: Image shape
+        predictor: Predictor recorded with the data ('delta' for old containers)
+        filters: Filter type per row for the 'png' predictor
+        
+    Returns:
+        uint8 array with the given shape
+    """
+    if predictor == 'png':
+        return unfilter_image(data, filters, shape)
+    if predictor == 'delta':
+        return delta_decode(data).reshape(shape)
+    raise ValueError(f"Unknown predictor: {predictor}")
+
+
+def downscale(img, size, grayscale=False):
+    """
+    Shrink an unloaded image to size, doing as little decode work as possible.
+    
+    JPEGs are first decoded at 1/2, 1/4 or 1/8 scale in the DCT domain
+    (Image.draft), straight to luma when grayscale is requested. Any
+    remaining whole factor is removed with a box reduce(), and only the
+    residual scale (under 2x) is resampled with LANCZOS.
+    
+    Args:
+        img: PIL Image as returned by Image.open(), not yet loaded
+        size: Target (width, height)
+        grayscale: Image will be converted to grayscale afterwards
+        
+    Returns:
+        PIL Image of the given size
+    """
+    width, height = size
+    if width < 1 or height < 1:
+        raise ValueError(f"Cannot resize to {width}x{height}; both sides must be at least 1 pixel")
+    if img.format == 'JPEG':
+        # draft() never goes below the requested size
+        img.draft('L' if grayscale else img.mode, (width, height))
+    
+    # Palette indices and bits can't be averaged; resize() picks nearest for them
+    factor = min(img.size[0] // width, img.size[1] // height)
+    if factor >= 2 and img.mode in REDUCE_MODES:
+        img = img.reduce(factor)
+    
+    if img.size != (width, height):
+        img = img.resize((width, height), Image.Resampling.LANCZOS)
+    return img
+
+
+def parse_resize_percent(value):
+    """
+    Parse the 'resize' form field of the image routes.
+    
+    Args:
+        value: Percentage string, or None, '' or 'none' to keep the size
+        
+    Returns:
+        Integer percentage from 1 to 100, or None
+    """
+    if not value or value == 'none':
+        return None
+    try:
+        percent = int(value)
+    except ValueError:
+        raise ValueError(f"Resize must be a percentage, got {value!r}") from None
+    if not 1 <= percent <= 100:
+        raise ValueError("Resize must be a percentage between 1 and 100")
+    return percent
+
+
+def open_for_compression(file_path, grayscale=False, resize=None, resize_percent=None):
+    """
+    Open an image and apply the optional resize and grayscale conversion.
     
     Args:
         file_path: Path to image
@@ -79,36 +502,89 @@ def prepare_for_compression(file_path, grayscale=False, resize=None, resize_perc
         resize_percent: Integer percentage (25, 50, 75) to resize by percentage
         
     Returns:
-        Dictionary with image data and metadata
+        Tuple of (PIL Image, original (width, height))
     """
     img = Image.open(file_path)
     original_size = img.size
     
     # Resize if requested
     if resize_percent:
-        new_width = int(img.size[0] * resize_percent / 100)
-        new_height = int(img.size[1] * resize_percent / 100)
-        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        # Tiny images still keep one pixel per side
+        new_width = max(1, int(img.size[0] * resize_percent / 100))
+        new_height = max(1, int(img.size[1] * resize_percent / 100))
+        img = downscale(img, (new_width, new_height), grayscale)
     elif resize:
-        img = img.resize(resize, Image.Resampling.LANCZOS)
+        img = downscale(img, tuple(resize), grayscale)
     
-    if grayscale:
+    if grayscale or img.mode == '1':
+        # 1-bit images load as bool arrays; widen them to 0/255 bytes
         img = img.convert('L')
     
+    return img, original_size
+
+
+def decode_image(data, shape, predictor='delta', filters=None, palette=None):
+    """
+    Rebuild an image from the residuals stored by prepare_for_compression().
+    
+    Args:
+        data: Residuals (array or list)
+        shape: Image shape
+        predictor: Predictor recorded with the data
+        filters: Filter type per row for the 'png' predictor
+        palette: Palette if the residuals code an index plane
+        
+    Returns:
+        uint8 array with the given shape
+    """
+    if palette is None:
+        return decode_pixels(data[:int(np.prod(shape))], shape, predictor, filters)
+    indices = decode_pixels(data[:int(np.prod(shape[:2]))], tuple(shape[:2]), predictor, filters)
+    return from_palette(palette, indices)
+
+
+def prepare_for_compression(file_path, grayscale=False, resize=None, resize_percent=None, as_list=False,
+                            predictor='png', palette=False):
+    """
+    Prepare image for compression.
+    
+    Args:
+        file_path: Path to image
+        grayscale: Convert to grayscale
+        resize: Tuple (width, height) to resize image, or None to keep original
+        resize_percent: Integer percentage (25, 50, 75) to resize by percentage
+        as_list: Return the old format: 'data' as a list of ints of 1D delta
+                 residuals with no palette, whatever predictor and palette
+                 say, instead of a flat uint8 numpy array
+        predictor: 'png' (per-row Sub/Up/Average/Paeth filters) or 'delta'
+        palette: Code colour images with at most PALETTE_MAX_COLORS colours
+                 as a palette plus an index plane. Off by default: whether
+                 the index plane codes smaller depends on the codec, so
+                 callers that enable it should compare against the direct
+                 coding
+        
+    Returns:
+        Dictionary with image data and metadata
+    """
+    img, original_size = open_for_compression(file_path, grayscale, resize, resize_percent)
     img_array = np.array(img)
+    if as_list:
+        # Old readers only know 1D deltas of the raw pixels
+        predictor, palette = 'delta', False
+    
+    indexed = to_palette(img_array) if palette else None
+    colors, coded = indexed if indexed is not None else (None, img_array)
     
-    # Use delta encoding for better compression
-    # Store differences between adjacent pixels instead of absolute values
-    flattened = img_array.flatten()
-    delta_encoded = [flattened[0]]  # Keep first value as-is
-    for i in range(1, len(flattened)):
-        delta = int(flattened[i]) - int(flattened[i-1])
-        # Wrap around for byte range (-128 to 127 becomes 0 to 255)
-        delta_encoded.append((delta + 128) % 256)
+    # Store prediction residuals instead of absolute values
+    residuals, filters = encode_pixels(coded, predictor)
     
     return {
-        'data': delta_encoded,
+        'data': residuals.tolist() if as_list else residuals,
+        'predictor': predictor,
+        'filters': filters,
+        'palette': colors,
         'shape': img_array.shape,
+        'raw_size': img_array.nbytes,
         'mode': img.mode,
         'format': img.format,
         'original_size': os.path.getsize(file_path),
@@ -131,40 +607,23 @@ def reconstruct_image(image_data):
     shape = image_data['shape']
     mode = image_data.get('mode', 'RGB')
     
-    # Decode delta encoding if needed
-    if isinstance(data[0], int) and len(data) > 1:
-        # This might be delta encoded, try to decode
-        decoded = [data[0]]
-        for i in range(1, len(data)):
-            # Reverse the delta encoding
-            delta = (data[i] - 128) % 256
-            value = (decoded[-1] + delta) % 256
-            decoded.append(value)
-        data = decoded
-    
-    img_array = np.array(data, dtype='uint8').reshape(shape)
+    img_array = decode_image(data, shape, image_data.get('predictor', 'delta'), image_data.get('filters'),
+                             image_data.get('palette'))
     img = Image.fromarray(img_array, mode=mode)
     
     return img
 
 
-def decode_delta(delta_encoded):
+def decode_delta(delta_encoded, as_list=False):
     """
     Decode delta-encoded data back to original values.
     
     Args:
-        delta_encoded: List of delta-encoded values
+        delta_encoded: Array or list of delta-encoded values
+        as_list: Return a list of ints instead of a uint8 numpy array
         
     Returns:
-        List of original values
+        Original values
     """
-    if not delta_encoded:
-        return []
-    
-    decoded = [delta_encoded[0]]
-    for i in range(1, len(delta_encoded)):
-        delta = (delta_encoded[i] - 128)
-        value = (decoded[-1] + delta) % 256
-        decoded.append(value)
-    
-    return decoded
+    decoded = delta_decode(delta_encoded)
+    return decoded.tolist() if as_list else decoded
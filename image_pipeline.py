@@ -0,0 +1,838 @@
+"""
+Image compression pipeline.
+Splits images into independently coded parts (colour planes, tiles, bit
+planes, wavelet subbands) and runs the entropy coders on them in parallel
+worker processes.
+"""
+
+import os
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from algorithms import codec_registry, g4, wavelet
+from handlers import image_handler
+
+
+PIPELINE_VERSION = 1
+
+# Images smaller than this are coded in the calling thread; starting
+# worker processes costs more than it saves
+PARALLEL_MIN_PIXELS = 1 << 18
+
+# Seconds between cancellation checks while waiting on workers
+WAIT_INTERVAL = 0.1
+
+COLOR_TRANSFORMS = ['none', 'ycocg']
+
+# Edge length of tiles in tiled mode
+TILE_SIZE = 256
+
+# Images with at most this many colours can use bit-plane mode
+BITPLANE_MAX_COLORS = 16
+
+# How bit planes are coded before the entropy coder: packed bytes or
+# G4-style 2D run tokens
+RUN_CODINGS = ['none', 'g4']
+
+# Wavelet coefficients that don't fit a signed byte are coded as this
+# value and stored in full in a separate stream
+ESCAPE = -128
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Shared worker pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded web server can copy held locks
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def run_parallel(func, tasks, cancel=None, parallel=True):
+    """
+    Run func(*task) for every task, in worker processes when worthwhile.
+    
+    Codecs in worker processes cannot see a CancellationToken, so the token
+    is checked here while waiting; pending tasks are dropped when it fires.
+    
+    Args:
+        func: Module-level function (must be picklable)
+        tasks: List of argument tuples
+        cancel: Optional CancellationToken
+        parallel: False runs everything in the calling thread
+    
+    Returns:
+        List of results in task order
+    """
+    if not parallel or len(tasks) < 2 or (os.cpu_count() or 1) < 2:
+        return [func(*task, cancel=cancel) for task in tasks]
+    
+    pool = get_pool()
+    futures = [pool.submit(func, *task) for task in tasks]
+    pending = set(futures)
+    try:
+        while pending:
+            if cancel is not None:
+                cancel.check()
+            _, pending = wait(pending, timeout=WAIT_INTERVAL, return_when=FIRST_COMPLETED)
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return [future.result() for future in futures]
+
+
+def _encode_plane(plane, codec, params, predictor, cancel=None):
+    """Filter and entropy-code one (H, W) plane."""
+    first = plane.flat[0] if plane.size else 0
+    if not plane.size or (plane == first).all():
+        # Constant planes (typically opaque alpha) need no coding at all
+        return {'constant': int(first)}
+    
+    residuals, filters = image_handler.encode_pixels(plane, predictor)
+    # Hand the codec the residual buffer itself; a list costs ~36 bytes a pixel
+    compressed = codec_registry.compress(codec, np.ascontiguousarray(residuals).data, cancel=cancel, **params)
+    return {'filters': filters, 'data': compressed}
+
+
+def _decode_plane(entry, codec, shape, predictor, cancel=None):
+    """Invert _encode_plane()."""
+    if 'constant' in entry:
+        return np.full(shape, entry['constant'], dtype=np.uint8)
+    
+    residuals = np.frombuffer(codec_registry.decompress(codec, entry['data'], cancel=cancel), dtype=np.uint8)
+    return image_handler.decode_pixels(residuals, shape, predictor, entry['filters'])
+
+
+def split_planes(img_array, color_transform='none'):
+    """
+    Split an image into separate uint8 planes.
+    
+    Args:
+        img_array: uint8 array of shape (H, W) or (H, W, C)
+        color_transform: 'ycocg' decorrelates the first three channels of
+                         RGB/RGBA images; 'none' keeps them as they are
+    
+    Returns:
+        List of (H, W) uint8 arrays
+    """
+    img_array = np.asarray(img_array, dtype=np.uint8)
+    if img_array.ndim == 2:
+        return [img_array]
+    
+    channels = img_array
+    if color_transform == 'ycocg':
+        if img_array.shape[2] not in (3, 4):
+            raise ValueError("YCoCg needs an RGB or RGBA image")
+        channels = img_array.copy()
+        channels[..., :3] = image_handler.rgb_to_ycocg_r(img_array[..., :3])
+    elif color_transform != 'none':
+        raise ValueError(f"Unknown colour transform: {color_transform}")
+    
+    return [np.ascontiguousarray(channels[..., i]) for i in range(channels.shape[2])]
+
+
+def merge_planes(planes, shape, color_transform='none'):
+    """
+    Invert split_planes().
+    
+    Args:
+        planes: List of (H, W) uint8 arrays
+        shape: Original image shape
+        color_transform: Transform applied by split_planes()
+    
+    Returns:
+        uint8 array with the given shape
+    """
+    if len(shape) == 2:
+        return planes[0]
+    
+    img_array = np.stack(planes, axis=-1)
+    if color_transform == 'ycocg':
+        img_array[..., :3] = image_handler.ycocg_r_to_rgb(img_array[..., :3])
+    return img_array
+
+
+def _apply_palette(img_array, color_transform, use_palette):
+    """
+    Index a few-colour image before it is split into planes.
+    
+    Returns:
+        Tuple of (array to code, palette or None, colour transform to use)
+    """
+    indexed = image_handler.to_palette(img_array) if use_palette else None
+    if indexed is None:
+        return img_array, None, color_transform
+    palette, indices = indexed
+    # A single index plane has no colour channels left to decorrelate
+    return indices, palette, 'none'
+
+
+def _smaller(indexed, direct):
+    """
+    Keep a palette-indexed container only if it beats coding the colours directly.
+    
+    An index plane is not always smaller: sorting a palette by brightness
+    can scatter the indices of a smooth gradient, so both codings are made
+    and the direct one (palette None) wins ties.
+    """
+    return indexed if compressed_size(indexed) < compressed_size(direct) else direct
+
+
+def _coded_shape(container):
+    """Shape of the array that was split into planes."""
+    shape = tuple(container['shape'])
+    return shape[:2] if container.get('palette') is not None else shape
+
+
+def _remove_palette(container, pixels):
+    """Map decoded palette indices back to colours."""
+    palette = container.get('palette')
+    return pixels if palette is None else image_handler.from_palette(palette, pixels)
+
+
+def compress_planar(img_array, codec, params=None, color_transform='none', predictor='png',
+                    use_palette=True, cancel=None, parallel=True, plane_codecs=None):
+    """
+    Compress each colour plane independently.
+    
+    Every plane gets its own predictor choices and its own codec tables, so
+    RLE sees unbroken runs and Huffman codes one distribution at a time.
+    
+    Args:
+        img_array: uint8 image array
+        codec: Codec key from the codec registry
+        params: Codec parameters (from codec_registry.level_params)
+        color_transform: 'none' or 'ycocg'
+        predictor: 'png' or 'delta'
+        use_palette: Also try colour images with at most 256 colours as a
+                     palette plus one index plane, keeping the smaller coding
+        cancel: Optional CancellationToken
+        parallel: Code planes in worker processes
+        plane_codecs: Optional (codec key, params) per plane, in place of
+                      codec and params (e.g. RLE for a mostly flat alpha
+                      plane, Huffman for the colour planes). The planes are
+                      then the image's channels; no palette is used
+    
+    Returns:
+        Container dictionary (picklable)
+    """
+    img_array = np.asarray(img_array, dtype=np.uint8)
+    params = params or {}
+    if plane_codecs is not None:
+        use_palette = False
+    coded, palette, coded_transform = _apply_palette(img_array, color_transform, use_palette)
+    planes = split_planes(coded, coded_transform)
+    
+    if plane_codecs is None:
+        plane_codecs = [(codec, params)] * len(planes)
+        per_plane = False
+    elif len(plane_codecs) != len(planes):
+        raise ValueError(f"Got {len(plane_codecs)} plane codecs for an image with {len(planes)} planes")
+    else:
+        per_plane = True
+    
+    parallel = parallel and img_array.size >= PARALLEL_MIN_PIXELS
+    tasks = [(plane, plane_codec, plane_params or {}, predictor)
+             for plane, (plane_codec, plane_params) in zip(planes, plane_codecs)]
+    entries = run_parallel(_encode_plane, tasks, cancel, parallel)
+    if per_plane:
+        for entry, (plane_codec, _) in zip(entries, plane_codecs):
+            entry['codec'] = plane_codec
+    
+    container = {
+        'pipeline': 'planar',
+        'version': PIPELINE_VERSION,
+        'codec': codec,
+        'params': params,
+        'shape': img_array.shape,
+        'color_transform': coded_transform,
+        'palette': palette,
+        'predictor': predictor,
+        'planes': entries
+    }
+    if palette is None:
+        return container
+    direct = compress_planar(img_array, codec, params, color_transform, predictor,
+                             use_palette=False, cancel=cancel, parallel=parallel)
+    return _smaller(container, direct)
+
+
+def decompress_planar(container, cancel=None, parallel=True):
+    """
+    Decompress a container produced by compress_planar().
+    
+    Args:
+        container: Container dictionary
+        cancel: Optional CancellationToken
+        parallel: Decode planes in worker processes
+    
+    Returns:
+        uint8 image array
+    """
+    shape = _coded_shape(container)
+    parallel = parallel and int(np.prod(shape)) >= PARALLEL_MIN_PIXELS
+    # Planes coded with their own codec record it in their entry
+    tasks = [(entry, entry.get('codec', container['codec']), shape[:2], container['predictor'])
+             for entry in container['planes']]
+    planes = run_parallel(_decode_plane, tasks, cancel, parallel)
+    return _remove_palette(container, merge_planes(planes, shape, container['color_transform']))
+
+
+def _encode_tile(tile, codec, params, color_transform, predictor, cancel=None):
+    """Code every plane of one tile."""
+    return [_encode_plane(plane, codec, params, predictor, cancel=cancel)
+            for plane in split_planes(tile, color_transform)]
+
+
+def _decode_tile(planes, codec, shape, color_transform, predictor, cancel=None):
+    """Invert _encode_tile()."""
+    decoded = [_decode_plane(entry, codec, shape[:2], predictor, cancel=cancel) for entry in planes]
+    return merge_planes(decoded, shape, color_transform)
+
+
+def compress_tiled(img_array, codec, params=None, color_transform='none', predictor='png',
+                   use_palette=True, tile_size=TILE_SIZE, cancel=None, parallel=True):
+    """
+    Compress an image as independently coded square tiles.
+    
+    Tiles are coded planar (see compress_planar) and listed in row-major
+    order with their position, so any region can be decoded without
+    touching the rest of the image.
+    
+    Args:
+        img_array: uint8 image array
+        codec: Codec key from the codec registry
+        params: Codec parameters
+        color_transform: 'none' or 'ycocg'
+        predictor: 'png' or 'delta'
+        use_palette: Also try indexing few-colour images with one palette
+                     for all tiles, keeping the smaller coding
+        tile_size: Tile edge length in pixels
+        cancel: Optional CancellationToken
+        parallel: Code tiles in worker processes
+    
+    Returns:
+        Container dictionary
+    """
+    img_array = np.asarray(img_array, dtype=np.uint8)
+    params = params or {}
+    coded, palette, coded_transform = _apply_palette(img_array, color_transform, use_palette)
+    height, width = img_array.shape[:2]
+    
+    index = []
+    tasks = []
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            tile = np.ascontiguousarray(coded[y:y + tile_size, x:x + tile_size])
+            index.append({'x': x, 'y': y, 'w': tile.shape[1], 'h': tile.shape[0]})
+            tasks.append((tile, codec, params, coded_transform, predictor))
+    
+    parallel = parallel and img_array.size >= PARALLEL_MIN_PIXELS
+    for entry, planes in zip(index, run_parallel(_encode_tile, tasks, cancel, parallel)):
+        entry['planes'] = planes
+    
+    container = {
+        'pipeline': 'tiled',
+        'version': PIPELINE_VERSION,
+        'codec': codec,
+        'params': params,
+        'shape': img_array.shape,
+        'color_transform': coded_transform,
+        'palette': palette,
+        'predictor': predictor,
+        'tile_size': tile_size,
+        'tiles': index
+    }
+    if palette is None:
+        return container
+    direct = compress_tiled(img_array, codec, params, color_transform, predictor, use_palette=False,
+                            tile_size=tile_size, cancel=cancel, parallel=parallel)
+    return _smaller(container, direct)
+
+
+def decode_region(container, x, y, w, h, cancel=None, parallel=True):
+    """
+    Decode a rectangle of an image.
+    
+    Tiled containers decode only the tiles overlapping the rectangle; other
+    containers are decoded in full and cropped.
+    
+    Args:
+        container: Container dictionary
+        x, y: Top-left corner in pixels
+        w, h: Width and height in pixels (clipped to the image)
+        cancel: Optional CancellationToken
+        parallel: Decode tiles in worker processes
+    
+    Returns:
+        uint8 array of shape (h, w) or (h, w, C)
+    """
+    shape = tuple(container['shape'])
+    height, width = shape[:2]
+    x0, y0 = max(int(x), 0), max(int(y), 0)
+    x1, y1 = min(int(x) + int(w), width), min(int(y) + int(h), height)
+    if x0 >= x1 or y0 >= y1:
+        raise ValueError(f"Region {x},{y} {w}x{h} lies outside the {width}x{height} image")
+    
+    if container['pipeline'] != 'tiled':
+        return decompress_image(container, cancel=cancel)[y0:y1, x0:x1]
+    
+    coded_shape = _coded_shape(container)
+    tiles = [tile for tile in container['tiles']
+             if tile['x'] < x1 and tile['x'] + tile['w'] > x0 and tile['y'] < y1 and tile['y'] + tile['h'] > y0]
+    tasks = [(tile['planes'], container['codec'], (tile['h'], tile['w']) + coded_shape[2:],
+              container['color_transform'], container['predictor']) for tile in tiles]
+    parallel = parallel and (y1 - y0) * (x1 - x0) * len(tiles[0]['planes']) >= PARALLEL_MIN_PIXELS
+    decoded = run_parallel(_decode_tile, tasks, cancel, parallel)
+    
+    region = np.empty((y1 - y0, x1 - x0) + coded_shape[2:], dtype=np.uint8)
+    for tile, pixels in zip(tiles, decoded):
+        # Overlap of this tile with the requested rectangle
+        tx0, ty0 = max(x0, tile['x']), max(y0, tile['y'])
+        tx1, ty1 = min(x1, tile['x'] + tile['w']), min(y1, tile['y'] + tile['h'])
+        region[ty0 - y0:ty1 - y0, tx0 - x0:tx1 - x0] = \
+            pixels[ty0 - tile['y']:ty1 - tile['y'], tx0 - tile['x']:tx1 - tile['x']]
+    return _remove_palette(container, region)
+
+
+def decompress_tiled(container, cancel=None, parallel=True):
+    """
+    Decompress a container produced by compress_tiled().
+    
+    Args:
+        container: Container dictionary
+        cancel: Optional CancellationToken
+        parallel: Decode tiles in worker processes
+    
+    Returns:
+        uint8 image array
+    """
+    height, width = tuple(container['shape'])[:2]
+    return decode_region(container, 0, 0, width, height, cancel=cancel, parallel=parallel)
+
+
+def _encode_bitplane(bits, codec, params, run_coding, cancel=None):
+    """Pack or run-code one 0/1 plane, then entropy-code it."""
+    if (bits == bits.flat[0]).all():
+        return {'constant': int(bits.flat[0])}
+    
+    if run_coding == 'g4':
+        payload = g4.encode(bits, cancel=cancel)
+    else:
+        # Eight pixels per byte; rows are padded to a whole byte
+        payload = np.packbits(bits, axis=1).tobytes()
+    return {'data': codec_registry.compress(codec, payload, cancel=cancel, **params)}
+
+
+def _decode_bitplane(entry, codec, shape, run_coding, cancel=None):
+    """Invert _encode_bitplane()."""
+    if 'constant' in entry:
+        return np.full(shape, entry['constant'], dtype=np.uint8)
+    
+    payload = codec_registry.decompress(codec, entry['data'], cancel=cancel)
+    if run_coding == 'g4':
+        return g4.decode(payload, shape, cancel=cancel)
+    packed = np.frombuffer(payload, dtype=np.uint8).reshape(shape[0], -1)
+    return np.unpackbits(packed, axis=1, count=shape[1])
+
+
+def choose_mode(img_array):
+    """
+    Pick a pipeline mode from the image content.
+    
+    Args:
+        img_array: uint8 image array
+    
+    Returns:
+        'bitplane' for images with few colours, otherwise 'planar'
+    """
+    colors, _ = image_handler.unique_colors(img_array)
+    return 'bitplane' if len(colors) <= BITPLANE_MAX_COLORS else 'planar'
+
+
+def compress_auto(img_array, codec, params=None, run_coding='none', color_transform='none',
+                  use_palette=True, cancel=None, parallel=True):
+    """
+    Compress an image with the mode that suits it best.
+    
+    Few-colour images are coded both as bit planes and planar and the
+    smaller container is kept, since bit planes lose to a palette-indexed
+    planar image once the colours form smooth areas. Other images are
+    coded planar.
+    
+    Args:
+        img_array: uint8 image array
+        codec: Codec key from the codec registry
+        params: Codec parameters
+        run_coding: Bit-plane run coding ('none' or 'g4')
+        color_transform: Planar colour transform ('none' or 'ycocg')
+        use_palette: Let planar mode index few-colour images
+        cancel: Optional CancellationToken
+        parallel: Code planes in worker processes
+    
+    Returns:
+        Container dictionary ('pipeline' names the mode that was kept)
+    """
+    planar = compress_planar(img_array, codec, params, color_transform=color_transform,
+                             use_palette=use_palette, cancel=cancel, parallel=parallel)
+    if choose_mode(img_array) != 'bitplane':
+        return planar
+    bitplane = compress_bitplane(img_array, codec, params, run_coding=run_coding,
+                                 cancel=cancel, parallel=parallel)
+    return bitplane if compressed_size(bitplane) < compressed_size(planar) else planar
+
+
+def compress_bitplane(img_array, codec, params=None, run_coding='none', cancel=None, parallel=True):
+    """
+    Compress a bilevel or few-colour image as bit planes.
+    
+    Pixels are replaced by indices into the image's colour list and each
+    index bit becomes a 1-bit plane, packed eight pixels to a byte (or
+    G4-style run coded) before the entropy coder runs. A two-colour image
+    becomes a single plane one eighth the size of its 8-bit form.
+    
+    Args:
+        img_array: uint8 image array with at most BITPLANE_MAX_COLORS colours
+        codec: Codec key from the codec registry
+        params: Codec parameters
+        run_coding: 'none' (np.packbits) or 'g4'
+        cancel: Optional CancellationToken
+        parallel: Code planes in worker processes
+    
+    Returns:
+        Container dictionary
+    """
+    img_array = np.asarray(img_array, dtype=np.uint8)
+    params = params or {}
+    if run_coding not in RUN_CODINGS:
+        raise ValueError(f"Unknown run coding: {run_coding}")
+    
+    colors, indices = image_handler.unique_colors(img_array)
+    if len(colors) > BITPLANE_MAX_COLORS:
+        raise ValueError(f"Bit-plane mode needs at most {BITPLANE_MAX_COLORS} colours, "
+                         f"image has {len(colors)}")
+    
+    depth = max(1, int(len(colors) - 1).bit_length())
+    planes = [((indices >> bit) & 1).astype(np.uint8) for bit in range(depth)]
+    
+    parallel = parallel and img_array.size >= PARALLEL_MIN_PIXELS
+    tasks = [(plane, codec, params, run_coding) for plane in planes]
+    entries = run_parallel(_encode_bitplane, tasks, cancel, parallel)
+    
+    return {
+        'pipeline': 'bitplane',
+        'version': PIPELINE_VERSION,
+        'codec': codec,
+        'params': params,
+        'shape': img_array.shape,
+        'palette': colors,
+        'run_coding': run_coding,
+        'planes': entries
+    }
+
+
+def decompress_bitplane(container, cancel=None, parallel=True):
+    """
+    Decompress a container produced by compress_bitplane().
+    
+    Args:
+        container: Container dictionary
+        cancel: Optional CancellationToken
+        parallel: Decode planes in worker processes
+    
+    Returns:
+        uint8 image array
+    """
+    shape = tuple(container['shape'])
+    parallel = parallel and int(np.prod(shape)) >= PARALLEL_MIN_PIXELS
+    tasks = [(entry, container['codec'], shape[:2], container['run_coding']) for entry in container['planes']]
+    planes = run_parallel(_decode_bitplane, tasks, cancel, parallel)
+    
+    indices = np.zeros(shape[:2], dtype=np.uint8)
+    for bit, plane in enumerate(planes):
+        indices |= plane << bit
+    return np.asarray(container['palette'], dtype=np.uint8)[indices]
+
+
+def _signed_plane(color_transform, index):
+    """YCoCg chroma planes hold signed bytes."""
+    return color_transform == 'ycocg' and index in (1, 2)
+
+
+def _wavelet_planes(img_array, color_transform):
+    """
+    Split an image into int32 planes centred on zero.
+    
+    Signed chroma planes are read as signed bytes; every other plane is
+    shifted down by 128 so its low-pass band stays small.
+    """
+    planes = split_planes(img_array, color_transform)
+    return [plane.view(np.int8).astype(np.int32) if _signed_plane(color_transform, index)
+            else plane.astype(np.int32) - 128
+            for index, plane in enumerate(planes)]
+
+
+def _unwavelet_planes(planes, color_transform):
+    """Invert _wavelet_planes(), clamping the approximate values of previews."""
+    return [np.clip(plane, -128, 127).astype(np.int8).view(np.uint8) if _signed_plane(color_transform, index)
+            else np.clip(plane + 128, 0, 255).astype(np.uint8)
+            for index, plane in enumerate(planes)]
+
+
+def _encode_band(band, codec, params, cancel=None):
+    """
+    Entropy-code one subband with its own codec tables.
+    
+    Coefficients are stored as signed bytes, the same form as filter
+    residuals; the rare ones outside -127..127 are written as ESCAPE and
+    listed separately as little-endian int32.
+    """
+    first = band.flat[0] if band.size else 0
+    if not band.size or (band == first).all():
+        return {'shape': band.shape, 'constant': int(first)}
+    
+    values = band.ravel()
+    large = np.abs(values) > 127
+    symbols = np.where(large, ESCAPE, values).astype(np.int8).view(np.uint8)
+    escaped = values[large].astype('<i4')
+    return {
+        'shape': band.shape,
+        'data': codec_registry.compress(codec, symbols.data, cancel=cancel, **params),
+        'escaped': codec_registry.compress(codec, escaped.view(np.uint8).data, cancel=cancel, **params) if escaped.size else b''
+    }
+
+
+def _decode_band(entry, codec, cancel=None):
+    """Invert _encode_band()."""
+    shape = tuple(entry['shape'])
+    if 'constant' in entry:
+        return np.full(shape, entry['constant'], dtype=np.int32)
+    
+    symbols = np.frombuffer(codec_registry.decompress(codec, entry['data'], cancel=cancel), dtype=np.uint8)
+    values = symbols[:int(np.prod(shape))].view(np.int8).astype(np.int32)
+    if entry['escaped']:
+        escaped = np.frombuffer(codec_registry.decompress(codec, entry['escaped'], cancel=cancel), dtype=np.uint8)
+        values[values == ESCAPE] = escaped.view('<i4')
+    return values.reshape(shape)
+
+
+def compress_wavelet(img_array, codec, params=None, color_transform='none', levels=wavelet.DEFAULT_LEVELS,
+                     cancel=None, parallel=True):
+    """
+    Compress an image with a reversible integer wavelet transform.
+    
+    Each plane goes through a multi-level LeGall 5/3 transform; every
+    subband is then coded on its own, so the codec builds separate tables
+    for the smooth low-pass band and each sparse detail band. The coarse
+    bands come first, which is what decode_preview() relies on.
+    
+    Args:
+        img_array: uint8 image array
+        codec: Codec key from the codec registry
+        params: Codec parameters
+        color_transform: 'none' or 'ycocg'
+        levels: Decomposition levels (fewer on small images)
+        cancel: Optional CancellationToken
+        parallel: Code subbands in worker processes
+    
+    Returns:
+        Container dictionary
+    """
+    img_array = np.asarray(img_array, dtype=np.uint8)
+    params = params or {}
+    planes = _wavelet_planes(img_array, color_transform)
+    
+    bands = []
+    for plane in planes:
+        if cancel is not None:
+            cancel.check()
+        ll, details = wavelet.forward(plane, levels)
+        bands.append([ll] + [band for level in details for band in level])
+    
+    parallel = parallel and img_array.size >= PARALLEL_MIN_PIXELS
+    tasks = [(band, codec, params) for plane_bands in bands for band in plane_bands]
+    entries = iter(run_parallel(_encode_band, tasks, cancel, parallel))
+    
+    return {
+        'pipeline': 'wavelet',
+        'version': PIPELINE_VERSION,
+        'codec': codec,
+        'params': params,
+        'shape': img_array.shape,
+        'color_transform': color_transform,
+        'palette': None,
+        'levels': (len(bands[0]) - 1) // 3,
+        'planes': [{'bands': [next(entries) for _ in plane_bands]} for plane_bands in bands]
+    }
+
+
+def decode_preview(container, reduction, cancel=None, parallel=True):
+    """
+    Decode a wavelet container at reduced resolution.
+    
+    The finest `reduction` levels of detail bands are never entropy-decoded,
+    so small previews of large images cost a fraction of a full decode.
+    
+    Args:
+        container: Container from compress_wavelet()
+        reduction: Halvings of the image size (0 decodes in full)
+        cancel: Optional CancellationToken
+        parallel: Decode subbands in worker processes
+    
+    Returns:
+        uint8 array about 1/2**reduction of the image size per side
+    """
+    shape = tuple(container['shape'])
+    keep = container['levels'] - min(max(int(reduction), 0), container['levels'])
+    count = 1 + 3 * keep
+    
+    tasks = [(entry, container['codec']) for plane in container['planes'] for entry in plane['bands'][:count]]
+    parallel = parallel and sum(int(np.prod(entry['shape'])) for entry, _ in tasks) >= PARALLEL_MIN_PIXELS
+    decoded = run_parallel(_decode_band, tasks, cancel, parallel)
+    
+    planes = []
+    for index in range(len(container['planes'])):
+        bands = decoded[index * count:(index + 1) * count]
+        details = [tuple(bands[1 + 3 * level:4 + 3 * level]) for level in range(keep)]
+        planes.append(wavelet.inverse(bands[0], details))
+    
+    planes = _unwavelet_planes(planes, container['color_transform'])
+    return merge_planes(planes, planes[0].shape + shape[2:], container['color_transform'])
+
+
+def decompress_wavelet(container, cancel=None, parallel=True):
+    """
+    Decompress a container produced by compress_wavelet().
+    
+    Args:
+        container: Container dictionary
+        cancel: Optional CancellationToken
+        parallel: Decode subbands in worker processes
+    
+    Returns:
+        uint8 image array
+    """
+    return decode_preview(container, 0, cancel=cancel, parallel=parallel)
+
+
+def compress_image(img_array, codec, params=None, mode='planar', cancel=None, **options):
+    """
+    Compress an image with one of the pipeline modes.
+    
+    Args:
+        img_array: uint8 image array
+        codec: Codec key from the codec registry
+        params: Codec parameters
+        mode: Pipeline mode (see MODES)
+        cancel: Optional CancellationToken
+        **options: Mode-specific options (e.g. color_transform)
+    
+    Returns:
+        Container dictionary
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown image pipeline mode: {mode}")
+    return MODES[mode][0](img_array, codec, params, cancel=cancel, **options)
+
+
+def decompress_image(container, cancel=None):
+    """
+    Decompress any container produced by compress_image().
+    
+    Args:
+        container: Container dictionary
+        cancel: Optional CancellationToken
+    
+    Returns:
+        uint8 image array
+    """
+    return MODES[container['pipeline']][1](container, cancel=cancel)
+
+
+def _plane_groups(container):
+    """Lists of plane entries: one for planar containers, one per tile otherwise."""
+    if container['pipeline'] == 'tiled':
+        return [tile['planes'] for tile in container['tiles']]
+    return [container['planes']]
+
+
+def _entry_size(entry):
+    """Stored bytes of one plane entry."""
+    if 'bands' in entry:
+        return sum(_entry_size(band) for band in entry['bands'])
+    if 'constant' in entry:
+        return 1
+    return len(entry['data']) + len(entry.get('filters', b'')) + len(entry.get('escaped', b''))
+
+
+def compressed_size(container):
+    """
+    Bytes of coded payload in a container (excluding pickle framing).
+    
+    Args:
+        container: Container dictionary
+    
+    Returns:
+        Size in bytes
+    """
+    palette = container.get('palette')
+    size = palette.nbytes if palette is not None else 0
+    for planes in _plane_groups(container):
+        size += sum(_entry_size(entry) for entry in planes)
+    return size
+
+
+def plane_summary(container):
+    """
+    Describe how each plane was stored, summed over tiles.
+    
+    Args:
+        container: Container dictionary
+    
+    Returns:
+        List of dictionaries, one per plane
+    """
+    groups = _plane_groups(container)
+    summary = []
+    for index in range(len(groups[0])):
+        entries = [planes[index] for planes in groups]
+        constant = [entry for entry in entries if 'constant' in entry]
+        coded = [entry for entry in entries if 'constant' not in entry]
+        
+        if not coded and len({entry['constant'] for entry in constant}) == 1:
+            summary.append({'plane': index, 'constant': constant[0]['constant'], 'size': len(constant)})
+            continue
+        
+        plane = {
+            'plane': index,
+            'size': sum(_entry_size(entry) for entry in entries),
+            'constant_parts': len(constant)
+        }
+        if coded and 'codec' in coded[0]:
+            plane['codec'] = coded[0]['codec']
+        if any('filters' in entry for entry in coded):
+            filters = {}
+            for entry in coded:
+                for name, count in image_handler.filter_summary(entry['filters']).items():
+                    filters[name] = filters.get(name, 0) + count
+            plane['filters'] = filters
+        summary.append(plane)
+    return summary
+
+
+# mode -> (compress function, decompress function)
+MODES = {
+    'planar': (compress_planar, decompress_planar),
+    'tiled': (compress_tiled, decompress_tiled),
+    'bitplane': (compress_bitplane, decompress_bitplane),
+    'wavelet': (compress_wavelet, decompress_wavelet),
+}
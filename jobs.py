@@ -0,0 +1,116 @@
+"""
+Background Job Runner
+Runs long compression jobs off the request thread and tracks their status
+"""
+
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from algorithms.cancellation import CancellationToken, CompressionCancelled
+
+
+# Finished jobs (and their results) are kept this long for polling
+JOB_TTL = timedelta(hours=1)
+
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='compression-job')
+_jobs = {}
+_tokens = {}
+_lock = threading.Lock()
+
+
+def _update(job_id, **fields):
+    with _lock:
+        _jobs[job_id].update(fields)
+
+
+def _prune():
+    """Forget jobs that finished more than JOB_TTL ago (call with _lock held)."""
+    cutoff = datetime.now() - JOB_TTL
+    expired = [job_id for job_id, job in _jobs.items()
+               if job['status'] in FINISHED_STATUSES and job.get('finished', cutoff) < cutoff]
+    for job_id in expired:
+        del _jobs[job_id]
+        _tokens.pop(job_id, None)
+
+
+def _run(job_id, func, args, kwargs):
+    _update(job_id, status='running', started=datetime.now())
+
+    def report_progress(fraction):
+        _update(job_id, progress=round(min(max(fraction, 0.0), 1.0), 4))
+
+    try:
+        result = func(*args, progress=report_progress, cancel=_tokens[job_id], **kwargs)
+        _update(job_id, status='completed', progress=1.0, result=result, finished=datetime.now())
+    except CompressionCancelled as e:
+        _update(job_id, status='cancelled', error=str(e), finished=datetime.now())
+    except Exception as e:
+        _update(job_id, status='failed', error=str(e), finished=datetime.now())
+
+
+def submit_job(kind, func, *args, **kwargs):
+    """
+    Queue a function to run in the background.
+
+    The function is called as func(*args, progress=callback, cancel=token,
+    **kwargs). It may call callback(fraction) to report progress between 0
+    and 1, and should pass the CancellationToken down to its codecs.
+
+    Args:
+        kind: Short job description (e.g. 'archive')
+        func: Function to run
+        timeout: Optional keyword; seconds before the job is cancelled
+
+    Returns:
+        Job ID string
+    """
+    timeout = kwargs.pop('timeout', None)
+    job_id = uuid.uuid4().hex
+    with _lock:
+        _prune()
+        _tokens[job_id] = CancellationToken(timeout=timeout)
+        _jobs[job_id] = {
+            'job_id': job_id,
+            'kind': kind,
+            'status': 'queued',
+            'progress': 0.0,
+            'result': None,
+            'error': None,
+            'submitted': datetime.now()
+        }
+    _executor.submit(_run, job_id, func, args, kwargs)
+    return job_id
+
+
+def cancel_job(job_id):
+    """
+    Request cancellation of a queued or running job.
+
+    Returns:
+        True if the job exists and had not finished yet
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job['status'] in FINISHED_STATUSES:
+            return False
+        _tokens[job_id].cancel('cancelled by user')
+    return True
+
+
+def get_job(job_id):
+    """Return a snapshot of a job's status, or None if unknown."""
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def list_jobs(kind=None):
+    """Return snapshots of all jobs, newest first."""
+    with _lock:
+        _prune()
+        jobs = [dict(job) for job in _jobs.values() if kind is None or job['kind'] == kind]
+    return sorted(jobs, key=lambda job: job['submitted'], reverse=True)
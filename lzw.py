@@ -5,14 +5,113 @@ Dictionary-based compression that builds patterns dynamically
 """
 
 import pickle
+from collections import defaultdict
 
+from algorithms.cancellation import CHECK_INTERVAL
 
-def compress(data):
+
+def _to_symbols(data):
+    """
+    View input as a string of byte symbols, one character per byte.
+    
+    Phrases are kept as latin-1 strings, whose characters map 1:1 onto
+    bytes 0-255, so the alphabet is always 256 symbols. Text is encoded
+    as UTF-8 first, so characters outside latin-1 survive the round trip.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    elif isinstance(data, list):
+        try:
+            data = bytes(int(x) for x in data)
+        except ValueError:
+            raise ValueError("Symbols must be byte values 0-255; encode text as UTF-8 first") from None
+    return str(data, 'latin-1')
+
+
+def train_dictionary(samples, max_entries=4096):
+    """
+    Train a shared LZW dictionary from a set of sample documents.
+    
+    The samples are parsed back to back with one growing dictionary so
+    that phrases common to many documents grow long, and the phrases that
+    save the most output codes are kept. The result is prefix-closed,
+    because LZW can only reach a phrase by extending its prefix.
+    
+    Args:
+        samples: List of bytes or strings (similar small documents)
+        max_entries: Maximum number of phrases in the trained dictionary
+        
+    Returns:
+        List of phrases (latin-1 strings of length >= 2, one character
+        per byte), ordered by length
+    """
+    dict_size = 256
+    dictionary = {chr(i): i for i in range(dict_size)}
+    usage = defaultdict(int)
+    
+    for sample in samples:
+        sample = _to_symbols(sample)
+        w = ""
+        for c in sample:
+            wc = w + c
+            if wc in dictionary:
+                w = wc
+            else:
+                usage[w] += 1
+                dictionary[wc] = dict_size
+                dict_size += 1
+                w = c
+        if w:
+            usage[w] += 1
+    
+    # A phrase of length n saves n - 1 codes each time it is emitted
+    ranked = sorted(
+        (phrase for phrase in usage if len(phrase) > 1),
+        key=lambda phrase: usage[phrase] * (len(phrase) - 1),
+        reverse=True
+    )
+    
+    selected = set()
+    for phrase in ranked:
+        missing = [phrase[:n] for n in range(2, len(phrase) + 1) if phrase[:n] not in selected]
+        if len(selected) + len(missing) > max_entries:
+            continue
+        selected.update(missing)
+        if len(selected) >= max_entries:
+            break
+    
+    return sorted(selected, key=lambda phrase: (len(phrase), phrase))
+
+
+def _initial_dictionary(dictionary=None):
+    """Build the encoder dictionary, optionally primed with trained phrases."""
+    table = {chr(i): i for i in range(256)}
+    if dictionary:
+        for phrase in dictionary:
+            if phrase not in table:
+                table[phrase] = len(table)
+    return table
+
+
+def _dictionary_limit(max_bits, initial_size):
+    """Number of entries allowed in the dictionary (None = unbounded)."""
+    if max_bits is None:
+        return None
+    limit = 1 << max_bits
+    if initial_size > limit:
+        raise ValueError(f"Initial dictionary of {initial_size} entries exceeds {max_bits} bits")
+    return limit
+
+
+def compress(data, dictionary=None, max_bits=None, cancel=None):
     """
     Compress data using LZW algorithm.
     
     Args:
-        data: String or bytes to compress
+        data: Bytes to compress (strings are encoded as UTF-8)
+        dictionary: Optional trained phrase list from train_dictionary()
+        max_bits: Freeze the dictionary at 2**max_bits entries (None = unbounded)
+        cancel: Optional CancellationToken checked every CHECK_INTERVAL symbols
         
     Returns:
         List of integers representing compressed data
@@ -20,21 +119,27 @@ def compress(data):
     if not data:
         return []
     
-    # Initialize dictionary with single characters
-    dict_size = 256
-    dictionary = {chr(i): i for i in range(dict_size)}
+    data = _to_symbols(data)
+    
+    # Initialize dictionary with single bytes (and trained phrases)
+    dictionary = _initial_dictionary(dictionary)
+    dict_size = len(dictionary)
+    limit = _dictionary_limit(max_bits, dict_size)
     
     w = ""
     result = []
     
-    for c in data:
+    for i, c in enumerate(data):
+        if cancel is not None and not i % CHECK_INTERVAL:
+            cancel.check()
         wc = w + c
         if wc in dictionary:
             w = wc
         else:
             result.append(dictionary[w])
-            dictionary[wc] = dict_size
-            dict_size += 1
+            if limit is None or dict_size < limit:
+                dictionary[wc] = dict_size
+                dict_size += 1
             w = c
     
     if w:
@@ -43,30 +148,36 @@ def compress(data):
     return result
 
 
-def decompress(compressed_data):
+def decompress(compressed_data, dictionary=None, max_bits=None, cancel=None):
     """
     Decompress LZW compressed data.
     
     Args:
         compressed_data: List of integers from compression
+        dictionary: Trained phrase list used during compression, if any
+        max_bits: Dictionary size limit used during compression, if any
+        cancel: Optional CancellationToken checked every CHECK_INTERVAL codes
         
     Returns:
-        Original string
+        Original bytes
     """
     if not compressed_data:
-        return ""
+        return b""
     
-    # Initialize dictionary
-    dict_size = 256
-    dictionary = {i: chr(i) for i in range(dict_size)}
+    # Initialize dictionary (must match the encoder's initial state)
+    dictionary = {code: phrase for phrase, code in _initial_dictionary(dictionary).items()}
+    dict_size = len(dictionary)
+    limit = _dictionary_limit(max_bits, dict_size)
     
     # Make a copy to avoid modifying the input
     compressed = list(compressed_data)
     
-    w = chr(compressed.pop(0))
-    result = w
+    w = dictionary[compressed.pop(0)]
+    result = [w]
     
-    for k in compressed:
+    for i, k in enumerate(compressed):
+        if cancel is not None and not i % CHECK_INTERVAL:
+            cancel.check()
         if k in dictionary:
             entry = dictionary[k]
         elif k == dict_size:
@@ -74,78 +185,190 @@ def decompress(compressed_data):
         else:
             raise ValueError(f"Bad compressed key: {k}")
         
-        result += entry
-        dictionary[dict_size] = w + entry[0]
-        dict_size += 1
+        result.append(entry)
+        if limit is None or dict_size < limit:
+            dictionary[dict_size] = w + entry[0]
+            dict_size += 1
         w = entry
     
-    return result
+    return ''.join(result).encode('latin-1')
 
 
-def compress_to_bytes(data):
+def _code_width(index, initial_size, limit):
+    """Bits needed for the index-th code: it is below the dictionary size at that point."""
+    size = min(initial_size + index, limit)
+    return max(1, (size - 1).bit_length())
+
+
+def pack_codes(codes, initial_size, max_bits):
+    """
+    Pack integer codes into bytes, GIF-style.
+    
+    Each code is written with just enough bits for the dictionary size at
+    the moment it was emitted, growing up to max_bits.
+    
+    Args:
+        codes: List of integers from compress()
+        initial_size: Initial dictionary size (256 plus trained phrases)
+        max_bits: Dictionary limit used during compression
+        
+    Returns:
+        Packed bytes (last byte zero-padded)
+    """
+    limit = 1 << max_bits
+    out = bytearray()
+    acc = 0
+    nbits = 0
+    for index, code in enumerate(codes):
+        width = _code_width(index, initial_size, limit)
+        acc = (acc << width) | code
+        nbits += width
+        while nbits >= 8:
+            nbits -= 8
+            out.append((acc >> nbits) & 0xFF)
+        acc &= (1 << nbits) - 1
+    if nbits:
+        out.append((acc << (8 - nbits)) & 0xFF)
+    return bytes(out)
+
+
+def unpack_codes(packed, initial_size, max_bits, count):
+    """
+    Unpack codes produced by pack_codes().
+    
+    Args:
+        packed: Packed bytes
+        initial_size: Initial dictionary size used during packing
+        max_bits: Dictionary limit used during packing
+        count: Number of codes
+        
+    Returns:
+        List of integers
+    """
+    limit = 1 << max_bits
+    codes = []
+    acc = 0
+    nbits = 0
+    width = _code_width(0, initial_size, limit)
+    for byte in packed:
+        acc = (acc << 8) | byte
+        nbits += 8
+        while nbits >= width and len(codes) < count:
+            nbits -= width
+            codes.append((acc >> nbits) & ((1 << width) - 1))
+            acc &= (1 << nbits) - 1
+            width = _code_width(len(codes), initial_size, limit)
+        if len(codes) == count:
+            break
+    return codes
+
+
+def estimate_size(compressed_data, dictionary=None, max_bits=None):
+    """
+    Estimate the stored size of LZW output in bytes.
+    
+    With max_bits the codes are bit-packed by pack_codes(), so the size is
+    the sum of their widths; unbounded output is counted at 2 bytes per code.
+    
+    Args:
+        compressed_data: List of integers from compress()
+        dictionary: Trained phrase list used during compression, if any
+        max_bits: Dictionary limit used during compression
+        
+    Returns:
+        Estimated size in bytes
+    """
+    count = len(compressed_data)
+    if max_bits is None:
+        return count * 2
+    
+    initial_size = len(_initial_dictionary(dictionary))
+    limit = 1 << max_bits
+    bits = 0
+    index = 0
+    # Widths only change when the dictionary crosses a power of two,
+    # so count whole bands of equal-width codes at once
+    while index < count:
+        width = _code_width(index, initial_size, limit)
+        if (1 << width) >= limit:
+            end = count
+        else:
+            end = min(count, (1 << width) - initial_size + 1)
+        bits += (end - index) * width
+        index = end
+    return (bits + 7) // 8
+
+
+def compress_to_bytes(data, dictionary=None, max_bits=None, cancel=None):
     """
     Compress data and convert to bytes for storage.
     
+    With max_bits the dictionary is bounded, so codes are bit-packed
+    (at most max_bits each) instead of pickled as Python integers.
+    
     Args:
-        data: Input data (list of integers or string)
+        data: Bytes-like buffer (strings are encoded as UTF-8)
+        dictionary: Optional trained phrase list from train_dictionary()
+        max_bits: Freeze the dictionary at 2**max_bits entries (None = unbounded)
+        cancel: Optional CancellationToken
         
     Returns:
         Compressed data as bytes
     """
-    # Convert list of integers to string if needed
-    if isinstance(data, list):
-        # Ensure all values are valid bytes (0-255)
-        try:
-            text = ''.join([chr(x % 256) for x in data])
-        except Exception as e:
-            # Fallback: convert to string representation
-            text = str(data)
-    else:
-        text = str(data) if not isinstance(data, str) else data
-    
-    compressed = compress(text)
+    compressed = compress(data, dictionary, max_bits, cancel)
+    if max_bits is not None:
+        compressed = {
+            'max_bits': max_bits,
+            'count': len(compressed),
+            'data': pack_codes(compressed, len(_initial_dictionary(dictionary)), max_bits)
+        }
     return pickle.dumps(compressed, protocol=pickle.HIGHEST_PROTOCOL)
 
 
-def decompress_from_bytes(compressed_bytes):
+def decompress_from_bytes(compressed_bytes, dictionary=None, cancel=None):
     """
     Decompress data from bytes.
     
     Args:
         compressed_bytes: Compressed data as bytes
+        dictionary: Trained phrase list used during compression, if any
+        cancel: Optional CancellationToken
         
     Returns:
-        Original data as list of integers
+        Original bytes
     """
     compressed_data = pickle.loads(compressed_bytes)
-    text = decompress(compressed_data)
-    return [ord(c) for c in text]
+    max_bits = None
+    if isinstance(compressed_data, dict):
+        max_bits = compressed_data['max_bits']
+        initial_size = len(_initial_dictionary(dictionary))
+        compressed_data = unpack_codes(compressed_data['data'], initial_size, max_bits, compressed_data['count'])
+    return decompress(compressed_data, dictionary, max_bits, cancel)
 
 
-def compress_bytes(data):
+def compress_bytes(data, dictionary=None):
     """
     Compress bytes data using LZW.
     
     Args:
         data: Bytes to compress
+        dictionary: Optional trained phrase list from train_dictionary()
         
     Returns:
         List of integers
     """
-    # Convert bytes to string for LZW processing
-    text = ''.join([chr(b) for b in data])
-    return compress(text)
+    return compress(data, dictionary)
 
 
-def decompress_to_bytes(compressed_data):
+def decompress_to_bytes(compressed_data, dictionary=None):
     """
     Decompress LZW data back to bytes.
     
     Args:
         compressed_data: List of integers
+        dictionary: Trained phrase list used during compression, if any
         
     Returns:
         Original bytes
     """
-    text = decompress(compressed_data)
-    return bytes([ord(c) for c in text])
+    return decompress(compressed_data, dictionary)
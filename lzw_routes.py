@@ -3,20 +3,22 @@ LZW (Lempel-Ziv-Welch) Algorithm Routes
 Handles all LZW compression operations
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 import sys
 import os
 import time
 import pickle
 import re
+import tempfile
 import unicodedata
 from pathlib import Path
 
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from algorithms import lzw
-from handlers import image_handler, video_handler, document_handler
+from algorithms import lzw, codec_registry
+from algorithms.cancellation import CancellationToken, CompressionCancelled
+from handlers import image_handler, video_handler, video_pipeline, document_handler, csv_pipeline
 from utils.database import CompressionDB, get_db
 
 lzw_bp = Blueprint('lzw', __name__, url_prefix='/lzw')
@@ -42,41 +44,138 @@ def sanitize_filename(filename):
     return filename
 
 
+# Trained dictionaries are immutable once stored, so cache them by ID
+_dictionary_cache = {}
+
+def get_dictionary(dictionary_id):
+    """Load a trained LZW dictionary from the database (cached)"""
+    if dictionary_id not in _dictionary_cache:
+        entries = get_db().get_dictionary(dictionary_id)
+        if entries is None:
+            return None
+        _dictionary_cache[dictionary_id] = entries
+    return _dictionary_cache[dictionary_id]
+
+
+def _sample_text(data, filename):
+    """Extract the bytes a document upload is compressed as (its text, for PDF and DOCX)"""
+    handle, path = tempfile.mkstemp(suffix=os.path.splitext(filename or '')[1].lower())
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(data)
+        return document_handler.prepare_for_compression(path)['data']
+    finally:
+        os.remove(path)
+
+
+@lzw_bp.route('/dictionary/train', methods=['POST'])
+def train_dictionary():
+    """Train a shared LZW dictionary from sample documents"""
+    try:
+        name = request.form.get('name', 'shared_dictionary')
+        max_entries = int(request.form.get('max_entries', 4096))
+        sample_limit = int(request.form.get('sample_limit', 100))
+        
+        db = get_db()
+        samples = []
+        
+        # Use uploaded samples, or fall back to recent document uploads;
+        # train on the extracted text the document routes actually compress
+        uploads = request.files.getlist('files')
+        if uploads:
+            for upload in uploads:
+                samples.append(_sample_text(upload.read(), upload.filename))
+        else:
+            history = db.get_compression_history(limit=sample_limit, file_type='document')
+            for record in history:
+                original = db.get_file(record.get('original_file_id'))
+                if not original:
+                    continue
+                try:
+                    samples.append(_sample_text(original, record.get('filename')))
+                except ValueError:
+                    # Skip past uploads whose text can no longer be extracted
+                    continue
+        
+        if not samples:
+            return jsonify({'error': 'No sample documents available'}), 400
+        
+        start_time = time.time()
+        entries = lzw.train_dictionary(samples, max_entries=max_entries)
+        train_time = time.time() - start_time
+        
+        dictionary_id = db.store_dictionary(entries, name, algorithm='LZW', sample_count=len(samples))
+        
+        return jsonify({
+            'dictionary_id': dictionary_id,
+            'name': name,
+            'entry_count': len(entries),
+            'sample_count': len(samples),
+            'training_time': round(train_time, 6)
+        })
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@lzw_bp.route('/dictionaries', methods=['GET'])
+def list_dictionaries():
+    """List trained LZW dictionaries"""
+    try:
+        return jsonify({'dictionaries': get_db().list_dictionaries(algorithm='LZW')})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @lzw_bp.route('/compress/text', methods=['POST'])
 def compress_text():
     """Compress text using LZW algorithm"""
     try:
         data = request.json
         text = data.get('text', '')
+        level = data.get('level')
+        try:
+            params = codec_registry.level_params('lzw', level)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stop the codec if the request outlives its time budget
+        cancel = CancellationToken(timeout=current_app.config.get('COMPRESSION_TIMEOUT'))
         
         if not text:
             return jsonify({'error': 'No text provided'}), 400
         
+        # Encode once; the codec works on the UTF-8 bytes
+        data = text.encode('utf-8')
+        
         # Store original file in database
         original_file_id = db.store_file(
-            file_data=text.encode(),
+            file_data=data,
             filename='text_input.txt',
             file_type='text/plain'
         )
         
         # Measure compression time
         start_time = time.time()
-        compressed = lzw.compress(text)
+        compressed = lzw.compress(data, **params, cancel=cancel)
         compress_time = time.time() - start_time
         
         # Measure decompression time
         start_time = time.time()
-        decompressed = lzw.decompress(compressed)
+        decompressed = lzw.decompress(compressed, **params, cancel=cancel)
         decompress_time = time.time() - start_time
         
         # Calculate metrics
-        original_size = len(text.encode())
-        compressed_size = len(compressed) * 2  # Approximate size in bytes
+        original_size = len(data)
+        # Bit-packed size when a level bounds the dictionary, else 2 bytes per code
+        compressed_size = lzw.estimate_size(compressed, **params)
         ratio = compressed_size / original_size if original_size > 0 else 0
         savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
         
         # Verify correctness
-        is_correct = text == decompressed
+        is_correct = data == decompressed
         
         # Store compressed data
         compressed_bytes = str(compressed).encode()
@@ -88,6 +187,7 @@ def compress_text():
         
         # Save compression record
         record = {
+            'level': level,
             'filename': 'text_input.txt',
             'file_type': 'text',
             'algorithm': 'LZW',
@@ -103,6 +203,7 @@ def compress_text():
         record_id = db.save_compression_record(record)
         
         return jsonify({
+            'level': level,
             'algorithm': 'LZW',
             'original_size': original_size,
             'compressed_size': compressed_size,
@@ -111,12 +212,14 @@ def compress_text():
             'compression_time': round(compress_time, 6),
             'decompression_time': round(decompress_time, 6),
             'is_correct': is_correct,
-            'decompressed_text': decompressed if is_correct else '',
+            'decompressed_text': text if is_correct else '',
             'record_id': str(record_id),
             'original_file_id': str(original_file_id),
             'compressed_file_id': str(compressed_file_id)
         })
         
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -129,8 +232,19 @@ def compress_image():
             return jsonify({'error': 'No file uploaded'}), 400
         
         file = request.files['file']
+        level = request.form.get('level')
+        try:
+            params = codec_registry.level_params('lzw', level)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stop the codec if the request outlives its time budget
+        cancel = CancellationToken(timeout=current_app.config.get('COMPRESSION_TIMEOUT'))
         grayscale = request.form.get('grayscale', 'false').lower() == 'true'
-        resize_percent = request.form.get('resize')
+        try:
+            resize_param = image_handler.parse_resize_percent(request.form.get('resize'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
@@ -145,7 +259,6 @@ def compress_image():
         file.save(filepath)
         
         # Process image with optional resize
-        resize_param = int(resize_percent) if resize_percent and resize_percent != 'none' else None
         image_data = image_handler.prepare_for_compression(
             filepath, 
             grayscale=grayscale,
@@ -153,42 +266,45 @@ def compress_image():
         )
         data = image_data['data']
         
-        # Convert to text for LZW
-        text = ''.join(chr(min(d, 255)) for d in data)
-        
-        # Compress
+        # Compress straight from the pixel buffer
         start_time = time.time()
-        compressed = lzw.compress(text)
+        compressed = lzw.compress(data.data, **params, cancel=cancel)
         compress_time = time.time() - start_time
         
         # Decompress
         start_time = time.time()
-        decompressed = lzw.decompress(compressed)
+        decompressed = lzw.decompress(compressed, **params, cancel=cancel)
         decompress_time = time.time() - start_time
         
         # Calculate metrics - LZW compressed size estimation
-        original_size = len(data)
-        # LZW outputs integers, typically 12-16 bits per code
-        # Using 2 bytes (16 bits) per code as standard
-        compressed_size = len(compressed) * 2
+        # Raw pixel bytes; the coded data may be a smaller palette index plane
+        original_size = image_data['raw_size']
+        # LZW outputs integers, typically 12-16 bits per code; levels bound
+        # the dictionary so codes are bit-packed, otherwise 2 bytes per code
+        compressed_size = lzw.estimate_size(compressed, **params)
         ratio = compressed_size / original_size if original_size > 0 else 0
         savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
-        is_correct = text == decompressed
+        is_correct = data.data == decompressed
         
         # Store in database
         db = get_db()
         
         # Store original file
+        # Stream the upload into storage instead of reading it into memory
         with open(filepath, 'rb') as f:
-            original_bytes = f.read()
-        original_file_id = db.store_file(original_bytes, file.filename, 'image')
+            original_file_id = db.store_file(f, file.filename, 'image')
         
         # Store compressed data with metadata for reconstruction
         compressed_data = {
+            'level': level,
+            'params': params,
             'compressed': compressed,
             'shape': image_data.get('shape'),
             'mode': image_data.get('mode'),
-            'format': image_data.get('format')
+            'format': image_data.get('format'),
+            'predictor': image_data.get('predictor'),
+            'filters': image_data.get('filters'),
+            'palette': image_data.get('palette')
         }
         compressed_bytes = pickle.dumps(compressed_data)
         compressed_file_id = db.store_compressed_file(compressed_bytes, file.filename, 'lzw')
@@ -200,6 +316,7 @@ def compress_image():
         
         # Save compression record
         record = {
+            'level': level,
             'algorithm': 'LZW',
             'file_type': 'image',
             'file_name': file.filename,
@@ -219,7 +336,10 @@ def compress_image():
                 'shape': image_data.get('shape'),
                 'mode': image_data.get('mode'),
                 'format': image_data.get('format'),
-                'grayscale': grayscale
+                'grayscale': grayscale,
+                'predictor': image_data.get('predictor'),
+                'filters': image_handler.filter_summary(image_data['filters']),
+                'palette_colors': len(image_data['palette']) if image_data['palette'] is not None else None
             }
         }
         record_id = db.save_compression_record(record)
@@ -228,6 +348,7 @@ def compress_image():
         os.remove(filepath)
         
         return jsonify({
+            'level': level,
             'record_id': record_id,
             'original_file_id': original_file_id,
             'compressed_file_id': compressed_file_id,
@@ -247,10 +368,15 @@ def compress_image():
                 'shape': image_data.get('shape'),
                 'mode': image_data.get('mode'),
                 'format': image_data.get('format'),
-                'grayscale': grayscale
+                'grayscale': grayscale,
+                'predictor': image_data.get('predictor'),
+                'filters': image_handler.filter_summary(image_data['filters']),
+                'palette_colors': len(image_data['palette']) if image_data['palette'] is not None else None
             }
         })
         
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -263,7 +389,19 @@ def compress_video():
             return jsonify({'error': 'No file uploaded'}), 400
         
         file = request.files['file']
+        level = request.form.get('level')
+        try:
+            params = codec_registry.level_params('lzw', level)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stop the codec if the request outlives its time budget
+        cancel = CancellationToken(timeout=current_app.config.get('COMPRESSION_TIMEOUT'))
         grayscale = request.form.get('grayscale', 'false').lower() == 'true'
+        # Frames after the first are coded as differences from the one before
+        temporal = request.form.get('temporal', 'diff')
+        if temporal not in video_pipeline.TEMPORAL_MODES:
+            return jsonify({'error': f"Unknown temporal mode: {temporal}"}), 400
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
@@ -277,51 +415,56 @@ def compress_video():
         filepath = os.path.join(upload_folder, safe_filename)
         file.save(filepath)
         
-        # Process video (first frame only for demo)
-        video_data = video_handler.prepare_for_compression(filepath, grayscale=grayscale, max_frames=1)
-        data = video_data['data'][0] if video_data['data'] else []
-        
-        # Convert to text for LZW
-        text = ''.join(chr(min(d, 255)) for d in data)
-        
-        # Compress
+        # Stream frames through the codec; only compressed frames are held
+        # in memory. The request codes at most VIDEO_FRAME_LIMIT frames so it
+        # finishes in time; /api/video/compress codes whole clips as a job
+        max_frames = current_app.config.get('VIDEO_FRAME_LIMIT')
+        video_data = video_handler.video_info(filepath)
         start_time = time.time()
-        compressed = lzw.compress(text)
+        container = video_pipeline.compress_video(
+            video_handler.iter_frames(filepath, grayscale=grayscale, max_frames=max_frames, cancel=cancel),
+            'lzw', params, temporal=temporal, cancel=cancel
+        )
         compress_time = time.time() - start_time
+        video_data['frame_count'] = container['frame_count']
         
-        # Decompress
+        # Decompress, comparing against a second pass over the file
         start_time = time.time()
-        decompressed = lzw.decompress(compressed)
+        is_correct = video_pipeline.verify_video(
+            container, video_handler.iter_frames(filepath, grayscale=grayscale, max_frames=max_frames, cancel=cancel),
+            cancel=cancel
+        )
         decompress_time = time.time() - start_time
         
         # Calculate metrics
-        original_size = len(data)
-        compressed_size = len(compressed) * 2
+        original_size = container['raw_size']
+        compressed_size = video_pipeline.compressed_size(container)
         ratio = compressed_size / original_size if original_size > 0 else 0
         savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
-        is_correct = text == decompressed
         
         # Store in database
         db = get_db()
         
         # Store original file
+        # Stream the upload into storage instead of reading it into memory
         with open(filepath, 'rb') as f:
-            original_bytes = f.read()
-        original_file_id = db.store_file(original_bytes, file.filename, 'video')
+            original_file_id = db.store_file(f, file.filename, 'video')
         
         # Store compressed data with metadata for reconstruction
-        compressed_data = {
-            'compressed': compressed,
-            'fps': video_data.get('fps'),
-            'width': video_data.get('width'),
-            'height': video_data.get('height'),
-            'frame_count': video_data.get('frame_count')
-        }
+        compressed_data = dict(
+            container,
+            level=level,
+            fps=video_data.get('fps'),
+            width=video_data.get('width'),
+            height=video_data.get('height'),
+            grayscale=grayscale
+        )
         compressed_bytes = pickle.dumps(compressed_data)
         compressed_file_id = db.store_compressed_file(compressed_bytes, file.filename, 'lzw')
         
         # Save compression record
         record = {
+            'level': level,
             'filename': file.filename,
             'file_type': 'video',
             'algorithm': 'LZW',
@@ -339,7 +482,9 @@ def compress_video():
                 'width': video_data.get('width'),
                 'height': video_data.get('height'),
                 'frame_count': video_data.get('frame_count'),
-                'grayscale': grayscale
+                'total_frames': video_data.get('total_frames'),
+                'grayscale': grayscale,
+                'temporal': temporal
             }
         }
         record_id = db.save_compression_record(record)
@@ -348,6 +493,7 @@ def compress_video():
         os.remove(filepath)
         
         return jsonify({
+            'level': level,
             'record_id': record_id,
             'original_file_id': original_file_id,
             'compressed_file_id': compressed_file_id,
@@ -365,10 +511,14 @@ def compress_video():
                 'width': video_data.get('width'),
                 'height': video_data.get('height'),
                 'frame_count': video_data.get('frame_count'),
-                'grayscale': grayscale
+                'total_frames': video_data.get('total_frames'),
+                'grayscale': grayscale,
+                'temporal': temporal
             }
         })
         
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -381,10 +531,30 @@ def compress_document():
             return jsonify({'error': 'No file uploaded'}), 400
         
         file = request.files['file']
+        level = request.form.get('level')
+        try:
+            params = codec_registry.level_params('lzw', level)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stop the codec if the request outlives its time budget
+        cancel = CancellationToken(timeout=current_app.config.get('COMPRESSION_TIMEOUT'))
+        dictionary_id = request.form.get('dictionary_id') or None
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
+        # Load the shared dictionary, if one was requested
+        dictionary = None
+        if dictionary_id:
+            dictionary = get_dictionary(dictionary_id)
+            if dictionary is None:
+                return jsonify({'error': f'Dictionary not found: {dictionary_id}'}), 404
+            # Trained phrases follow the 256 byte codes and must fit the level's code width
+            if 'max_bits' in params and 256 + len(dictionary) > 1 << params['max_bits']:
+                return jsonify({'error': f'Dictionary of {len(dictionary)} phrases does not fit '
+                                         f'{params["max_bits"]}-bit codes; use a higher level'}), 400
+        
         # Sanitize filename
         safe_filename = sanitize_filename(file.filename)
         
@@ -394,30 +564,57 @@ def compress_document():
         filepath = os.path.join(upload_folder, safe_filename)
         file.save(filepath)
         
-        # Process document
-        doc_data = document_handler.prepare_for_compression(filepath)
-        content = doc_data['data']
-        data = [ord(c) for c in content]
-        
-        # Convert to text for LZW
-        text = ''.join(chr(min(d, 255)) for d in data)
-        
-        # Compress
-        start_time = time.time()
-        compressed = lzw.compress(text)
-        compress_time = time.time() - start_time
-        
-        # Decompress
-        start_time = time.time()
-        decompressed = lzw.decompress(compressed)
-        decompress_time = time.time() - start_time
-        
-        # Calculate metrics
-        original_size = len(data)
-        compressed_size = len(compressed) * 2
-        ratio = compressed_size / original_size if original_size > 0 else 0
-        savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
-        is_correct = text == decompressed
+        # CSV files are parsed into columns and coded by column type, one
+        # block of rows at a time; 'columnar=false' (or a shared dictionary)
+        # codes the raw text instead
+        columnar = (os.path.splitext(filepath)[1].lower() == '.csv'
+                    and request.form.get('columnar', 'true').lower() == 'true' and not dictionary)
+        
+        if columnar:
+            dialect = document_handler.sniff_csv_dialect(filepath)
+            start_time = time.time()
+            container = csv_pipeline.compress_csv(
+                document_handler.iter_csv_records(filepath, dialect), 'lzw', params, dialect, cancel=cancel
+            )
+            compress_time = time.time() - start_time
+            
+            # Decompress, comparing block by block against the file
+            start_time = time.time()
+            is_correct = csv_pipeline.verify_csv(container, filepath, cancel=cancel)
+            decompress_time = time.time() - start_time
+            
+            # Calculate metrics
+            original_size = os.path.getsize(filepath)
+            compressed_size = csv_pipeline.compressed_size(container)
+            ratio = compressed_size / original_size if original_size > 0 else 0
+            savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+            doc_data = {'format': '.csv', 'length': container['length']}
+            
+            # Small files, or columns the codec expands, can come out larger
+            # than the upload; code those as plain text instead
+            columnar = compressed_size < original_size
+        
+        if not columnar:
+            # Process document
+            doc_data = document_handler.prepare_for_compression(filepath)
+            data = doc_data['data']
+            
+            # Compress
+            start_time = time.time()
+            compressed = lzw.compress(data, dictionary, **params, cancel=cancel)
+            compress_time = time.time() - start_time
+            
+            # Decompress
+            start_time = time.time()
+            decompressed = lzw.decompress(compressed, dictionary, **params, cancel=cancel)
+            decompress_time = time.time() - start_time
+            
+            # Calculate metrics
+            original_size = len(data)
+            compressed_size = lzw.estimate_size(compressed, dictionary, **params)
+            ratio = compressed_size / original_size if original_size > 0 else 0
+            savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+            is_correct = data == decompressed
         
         # Store in database
         db = get_db()
@@ -428,16 +625,23 @@ def compress_document():
         original_file_id = db.store_file(original_bytes, file.filename, 'document')
         
         # Store compressed data with metadata
-        compressed_data = {
-            'compressed': compressed,
-            'format': doc_data.get('format'),
-            'length': doc_data.get('length')
-        }
+        if columnar:
+            compressed_data = dict(container, level=level, format=doc_data['format'], length=doc_data['length'])
+        else:
+            compressed_data = {
+                'level': level,
+                'params': params,
+                'compressed': compressed,
+                'format': doc_data.get('format'),
+                'length': doc_data.get('length'),
+                'dictionary_id': dictionary_id
+            }
         compressed_bytes = pickle.dumps(compressed_data)
         compressed_file_id = db.store_compressed_file(compressed_bytes, file.filename, 'lzw')
         
         # Save compression record
         record = {
+            'level': level,
             'filename': file.filename,
             'file_type': 'document',
             'algorithm': 'LZW',
@@ -452,7 +656,9 @@ def compress_document():
             'compressed_file_id': compressed_file_id,
             'metadata': {
                 'format': doc_data.get('format'),
-                'length': doc_data.get('length')
+                'length': doc_data.get('length'),
+                'dictionary_id': dictionary_id,
+                'columnar': columnar
             }
         }
         record_id = db.save_compression_record(record)
@@ -461,6 +667,7 @@ def compress_document():
         os.remove(filepath)
         
         return jsonify({
+            'level': level,
             'record_id': record_id,
             'original_file_id': original_file_id,
             'compressed_file_id': compressed_file_id,
@@ -475,9 +682,13 @@ def compress_document():
             'is_correct': is_correct,
             'metadata': {
                 'format': doc_data.get('format'),
-                'length': doc_data.get('length')
+                'length': doc_data.get('length'),
+                'dictionary_id': dictionary_id,
+                'columnar': columnar
             }
         })
         
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,133 @@
+"""
+Block-Matching Motion Estimation
+Best for video with camera motion (pans, tilts, tracking shots)
+Predicts each block of a frame from a displaced block of the previous frame
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# Edge length of the blocks that share one motion vector
+BLOCK_SIZE = 16
+
+# Largest displacement searched, in pixels along each axis
+SEARCH_RANGE = 16
+
+
+def _as_channels(frame):
+    """View a frame as (H, W, C), adding a channel axis to grayscale frames."""
+    frame = np.asarray(frame)
+    return frame[..., np.newaxis] if frame.ndim == 2 else frame
+
+
+def _pad(frame, height, width, margin):
+    """
+    Extend a (H, W, C) frame by repeating its edges.
+    
+    The result covers `height` x `width` pixels plus `margin` on every side,
+    so displaced blocks never read outside the array. Edge values do not
+    depend on the margin, so encoder and decoder see the same pixels.
+    """
+    h, w = frame.shape[:2]
+    return np.pad(frame, ((margin, height - h + margin), (margin, width - w + margin), (0, 0)), mode='edge')
+
+
+def _block_grid(shape, block_size):
+    """Number of block rows and columns covering a frame."""
+    return -(-shape[0] // block_size), -(-shape[1] // block_size)
+
+
+def _first_step(search_range):
+    """Largest power of two p with p + p/2 + ... + 1 <= search_range."""
+    return 1 << ((search_range + 1).bit_length() - 2) if search_range > 0 else 0
+
+
+def estimate(frame, reference, block_size=BLOCK_SIZE, search_range=SEARCH_RANGE):
+    """
+    Find a motion vector for every block with a three-step search.
+    
+    Each step compares every block against the reference at its current
+    best displacement and the eight displacements `step` pixels around it,
+    then halves the step. All blocks are searched at once: the reference
+    is exposed as a sliding-window view of every block-sized window, so a
+    candidate displacement is one fancy-indexing gather and the sums of
+    absolute differences (SAD) are one reduction.
+    
+    Args:
+        frame: uint8 frame array (H, W) or (H, W, C)
+        reference: Previous frame with the same shape
+        block_size: Block edge length
+        search_range: Largest displacement searched along each axis
+    
+    Returns:
+        int8 array (block rows, block columns, 2) of (dy, dx) displacements
+    """
+    frame = _as_channels(frame)
+    reference = _as_channels(reference)
+    if frame.shape != reference.shape:
+        raise ValueError(f"Frame shape {frame.shape} does not match reference shape {reference.shape}")
+    if search_range > 127:
+        raise ValueError("Search range must fit a signed byte")
+    
+    rows, cols = _block_grid(frame.shape, block_size)
+    channels = frame.shape[2]
+    current = _pad(frame, rows * block_size, cols * block_size, 0).astype(np.int16)
+    # (rows, cols, C, block, block), matching the window layout below
+    blocks = current.reshape(rows, block_size, cols, block_size, channels).transpose(0, 2, 4, 1, 3)
+    
+    padded = _pad(reference, rows * block_size, cols * block_size, search_range).astype(np.int16)
+    windows = sliding_window_view(padded, (block_size, block_size), axis=(0, 1))
+    origin_y = np.arange(rows)[:, np.newaxis] * block_size + search_range
+    origin_x = np.arange(cols)[np.newaxis, :] * block_size + search_range
+    
+    def sad(vectors):
+        candidates = windows[origin_y + vectors[..., 0], origin_x + vectors[..., 1]]
+        return np.abs(blocks - candidates).sum(axis=(2, 3, 4))
+    
+    vectors = np.zeros((rows, cols, 2), dtype=np.int64)
+    best = sad(vectors)
+    step = _first_step(search_range)
+    while step:
+        center = vectors.copy()
+        for dy in (-step, 0, step):
+            for dx in (-step, 0, step):
+                if not dy and not dx:
+                    continue
+                candidate = np.clip(center + (dy, dx), -search_range, search_range)
+                cost = sad(candidate)
+                # Strictly better only, so ties keep the smaller displacement
+                better = cost < best
+                best[better] = cost[better]
+                vectors[better] = candidate[better]
+        step >>= 1
+    
+    return vectors.astype(np.int8)
+
+
+def compensate(reference, vectors, block_size=BLOCK_SIZE):
+    """
+    Build the motion-compensated prediction of a frame.
+    
+    Args:
+        reference: Previous frame (H, W) or (H, W, C)
+        vectors: Motion vectors from estimate()
+        block_size: Block edge length used by estimate()
+    
+    Returns:
+        uint8 array with the reference's shape
+    """
+    shape = np.shape(reference)
+    reference = _as_channels(reference)
+    rows, cols = vectors.shape[:2]
+    vectors = vectors.astype(np.int64)
+    margin = int(np.abs(vectors).max()) if vectors.size else 0
+    
+    padded = _pad(reference, rows * block_size, cols * block_size, margin)
+    windows = sliding_window_view(padded, (block_size, block_size), axis=(0, 1))
+    ys = np.arange(rows)[:, np.newaxis] * block_size + margin + vectors[..., 0]
+    xs = np.arange(cols)[np.newaxis, :] * block_size + margin + vectors[..., 1]
+    
+    # (rows, cols, C, block, block) back to (H, W, C)
+    predicted = windows[ys, xs].transpose(0, 3, 1, 4, 2).reshape(rows * block_size, cols * block_size, -1)
+    return predicted[:shape[0], :shape[1]].reshape(shape)
@@ -5,6 +5,8 @@ Utility functions for compression analysis and performance measurement.
 import time
 import os
 import json
+import tracemalloc
+from contextlib import contextmanager
 from typing import Callable, Any, Dict
 
 
@@ -17,7 +19,7 @@ def measure_compression(compress_func: Callable, decompress_func: Callable,
     Args:
         compress_func: Compression function
         decompress_func: Decompression function
-        data: Data to compress
+        data: Data to compress (bytes, or a list or string for older callers)
         algorithm_name: Name of algorithm
         is_huffman: Whether using Huffman coding
         
@@ -42,12 +44,14 @@ def measure_compression(compress_func: Callable, decompress_func: Callable,
     decompression_time = time.time() - start_time
     
     # Calculate metrics
-    original_size = len(str(data))
+    original_size = len(data) if isinstance(data, (bytes, bytearray)) else len(str(data))
     compression_ratio = compressed_size / original_size if original_size > 0 else 1
     space_saving = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
     
     # Verify correctness
-    if isinstance(data, str):
+    if isinstance(data, (bytes, bytearray)):
+        is_correct = bytes(decompressed) == data
+    elif isinstance(data, str):
         is_correct = decompressed == data or ''.join(decompressed) == data
     elif isinstance(data, list):
         is_correct = list(decompressed) == data
@@ -67,6 +71,34 @@ def measure_compression(compress_func: Callable, decompress_func: Callable,
     }
 
 
+@contextmanager
+def trace_peak_memory():
+    """
+    Measure the peak Python heap allocation inside a with block.
+    
+    Yields a dictionary whose 'peak' key holds the peak in bytes once the
+    block exits. Nested uses share the running trace and report the peak
+    since their own start.
+    
+    Example:
+        with trace_peak_memory() as usage:
+            compress(data)
+        print(format_size(usage['peak']))
+    """
+    usage = {'peak': 0}
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    try:
+        yield usage
+    finally:
+        usage['peak'] = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+        if started:
+            tracemalloc.stop()
+
+
 def compare_algorithms(data: Any, algorithms: list) -> list:
     """
     Compare multiple compression algorithms.
@@ -96,6 +128,86 @@ def compare_algorithms(data: Any, algorithms: list) -> list:
     return results
 
 
+def benchmark_levels(data: Any, codecs: list, levels=range(1, 10)) -> list:
+    """
+    Measure the speed/ratio trade-off of each compression level.
+    
+    Args:
+        data: Data to compress (bytes or list of byte values)
+        codecs: List of codec keys from the codec registry
+        levels: Levels to measure
+        
+    Returns:
+        List of dictionaries, one per (codec, level)
+    """
+    from algorithms import codec_registry
+    
+    original_size = len(data)
+    results = []
+    
+    for codec in codecs:
+        name = codec_registry.get_codec(codec)['name']
+        for level in levels:
+            params = codec_registry.level_params(codec, level)
+            try:
+                start_time = time.time()
+                compressed = codec_registry.compress(codec, data, **params)
+                compression_time = time.time() - start_time
+                
+                start_time = time.time()
+                decompressed = codec_registry.decompress(codec, compressed)
+                decompression_time = time.time() - start_time
+                
+                results.append({
+                    'algorithm': name,
+                    'level': level,
+                    'params': params,
+                    'original_size': original_size,
+                    'compressed_size': len(compressed),
+                    'compression_ratio': round(len(compressed) / original_size, 4) if original_size > 0 else 1,
+                    'compression_time': round(compression_time, 6),
+                    'decompression_time': round(decompression_time, 6),
+                    'is_correct': decompressed == bytes(data)
+                })
+            except Exception as e:
+                results.append({'algorithm': name, 'level': level, 'params': params, 'error': str(e)})
+    
+    return results
+
+
+def print_level_table(results: list):
+    """
+    Print the speed/ratio curve produced by benchmark_levels().
+    
+    Args:
+        results: List of result dictionaries
+    """
+    if not results:
+        print("No results to display")
+        return
+    
+    print("\n" + "="*100)
+    print(f"{'Algorithm':<12} {'Level':<7} {'Parameters':<24} {'Comp Size':<12} {'Ratio':<10} "
+          f"{'Comp Time':<12} {'Decomp Time':<12} {'OK':<4}")
+    print("="*100)
+    
+    for result in results:
+        params = ', '.join(f"{k}={v}" for k, v in result['params'].items())
+        if 'error' in result:
+            print(f"{result['algorithm']:<12} {result['level']:<7} {params:<24} ERROR: {result['error']}")
+        else:
+            print(f"{result['algorithm']:<12} "
+                  f"{result['level']:<7} "
+                  f"{params:<24} "
+                  f"{result['compressed_size']:<12} "
+                  f"{result['compression_ratio']:<10.4f} "
+                  f"{result['compression_time']:<12.6f} "
+                  f"{result['decompression_time']:<12.6f} "
+                  f"{'✓' if result['is_correct'] else '✗':<4}")
+    
+    print("="*100)
+
+
 def format_size(size_bytes: int) -> str:
     """
     Format byte size to human-readable string.
@@ -0,0 +1,268 @@
+"""
+Adaptive Golomb-Rice Coding
+Best for prediction residuals of images (PNG filters, wavelet subbands)
+Codes zigzagged signed bytes with a Rice parameter adapted per context
+"""
+
+import pickle
+
+import numpy as np
+
+from algorithms.cancellation import CHECK_INTERVAL
+
+
+# Contexts are the bit length of the sum of the two previous values (0..510)
+CONTEXTS = 10
+
+# Starting sum of magnitudes per context (JPEG-LS uses 4 for 8-bit samples)
+INITIAL_SUM = 4
+
+# Each context estimates its parameter from this many of its latest values,
+# so the parameter follows local changes in the image
+DEFAULT_WINDOW = 16
+
+# Quotients this large are written as QUOTIENT_LIMIT zeros, a one and the
+# raw 8-bit value instead of a longer unary code
+QUOTIENT_LIMIT = 16
+RAW_BITS = 8
+
+
+def zigzag(values):
+    """
+    Map signed bytes to small unsigned ones: 0, -1, 1, -2 -> 0, 1, 2, 3.
+    
+    Args:
+        values: uint8 array read as two's complement (residuals mod 256)
+    
+    Returns:
+        uint8 array
+    """
+    signed = np.asarray(values, dtype=np.uint8).view(np.int8).astype(np.int16)
+    return ((signed << 1) ^ (signed >> 7)).astype(np.uint8)
+
+
+def unzigzag(values):
+    """Invert zigzag()."""
+    values = np.asarray(values, dtype=np.uint8).astype(np.int16)
+    return ((values >> 1) ^ -(values & 1)).astype(np.uint8)
+
+
+def _to_byte_values(data):
+    """Normalize input to a uint8 array without copying buffers."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return np.frombuffer(data, dtype=np.uint8)
+    try:
+        return np.frombuffer(bytes(int(x) for x in data), dtype=np.uint8)
+    except ValueError:
+        raise ValueError("Symbols must be byte values 0-255; encode text as UTF-8 first") from None
+
+
+def contexts(values):
+    """
+    Context of every value: the bit length of the sum of the two values
+    before it (0 to CONTEXTS - 1).
+    
+    Args:
+        values: Zigzagged uint8 array
+    
+    Returns:
+        int64 array
+    """
+    activity = np.zeros(len(values), dtype=np.int64)
+    activity[1:] += values[:-1]
+    activity[2:] += values[:-2]
+    # bit_length() without a Python loop
+    return np.searchsorted(1 << np.arange(CONTEXTS, dtype=np.int64), activity, side='right')
+
+
+def parameters(values, window=DEFAULT_WINDOW):
+    """
+    Rice parameter k for every value, as the decoder will see it.
+    
+    Each context sums the last `window` values coded in it (plus
+    INITIAL_SUM); k is the smallest value with count * 2**k >= sum, i.e.
+    about log2 of the context's recent mean. Values are grouped by context
+    with a stable sort so the windowed sums come from one cumulative sum.
+    
+    Args:
+        values: Zigzagged uint8 array
+        window: Values per context the estimate is based on
+    
+    Returns:
+        int64 array of parameters
+    """
+    context = contexts(values)
+    order = np.argsort(context, kind='stable')
+    grouped = values[order].astype(np.int64)
+    sorted_contexts = context[order]
+    
+    position = np.arange(len(values))
+    group_start = np.flatnonzero(np.diff(sorted_contexts, prepend=-1))
+    first = group_start[np.searchsorted(group_start, position, side='right') - 1]
+    low = np.maximum(first, position - window)
+    
+    cumulative = np.concatenate(([0], np.cumsum(grouped)))
+    total = INITIAL_SUM + cumulative[position] - cumulative[low]
+    count = position - low + 1
+    
+    ks = np.zeros(len(values), dtype=np.int64)
+    for k in range(RAW_BITS + 1):
+        ks += (count << k) < total
+    
+    result = np.empty_like(ks)
+    result[order] = ks
+    return result
+
+
+def pack(values, ks):
+    """
+    Write Rice codes for all values at once.
+    
+    Each value is q = value >> k zero bits, a one bit and the low k bits of
+    the value; quotients of QUOTIENT_LIMIT or more are written as
+    QUOTIENT_LIMIT zeros, a one and the raw value instead. Code lengths are
+    summed to find where every code ends, then the bits after each run of
+    zeros are scattered into place one bit position at a time.
+    
+    Args:
+        values: Zigzagged uint8 array
+        ks: Rice parameter per value
+    
+    Returns:
+        Packed bitstream as bytes (padded with zeros to a whole byte)
+    """
+    values = values.astype(np.int64)
+    ks = ks.astype(np.int64)
+    quotients = values >> ks
+    raw = quotients >= QUOTIENT_LIMIT
+    
+    zeros = np.where(raw, QUOTIENT_LIMIT, quotients)
+    tail_bits = np.where(raw, RAW_BITS + 1, ks + 1)
+    # The leading one of every tail terminates the unary quotient
+    tails = np.where(raw, (1 << RAW_BITS) | values, (1 << ks) | (values & ((1 << ks) - 1)))
+    ends = np.cumsum(zeros + tail_bits)
+    
+    bits = np.zeros(int(ends[-1]), dtype=np.uint8)
+    for bit in range(int(tail_bits.max())):
+        present = tail_bits > bit
+        bits[ends[present] - 1 - bit] = (tails[present] >> bit) & 1
+    return np.packbits(bits).tobytes()
+
+
+def compress(data, window=DEFAULT_WINDOW, cancel=None):
+    """
+    Compress byte residuals with adaptive Golomb-Rice codes.
+    
+    Args:
+        data: Bytes, buffer or list of byte values (read as signed residuals)
+        window: Values per context the Rice parameter is estimated from
+        cancel: Optional CancellationToken (checked once; encoding is vectorized)
+    
+    Returns:
+        Rice-coded bytes
+    """
+    if cancel is not None:
+        cancel.check()
+    values = zigzag(_to_byte_values(data))
+    if not values.size:
+        return b''
+    return pack(values, parameters(values, window))
+
+
+def decompress(encoded, length, window=DEFAULT_WINDOW, cancel=None):
+    """
+    Decompress Rice-coded data.
+    
+    Args:
+        encoded: Rice-coded bytes
+        length: Number of values to decode
+        window: Value used during compression
+        cancel: Optional CancellationToken checked every CHECK_INTERVAL values
+    
+    Returns:
+        Original data as bytes
+    """
+    if not length:
+        return b''
+    
+    # A '0'/'1' string lets str.index() find the end of each unary run in C
+    bits = (np.unpackbits(np.frombuffer(encoded, dtype=np.uint8)) + ord('0')).tobytes().decode('ascii')
+    find_one = bits.index
+    # Latest values per context as ring buffers, with their running sums
+    recent = [[0] * window for _ in range(CONTEXTS)]
+    seen = [0] * CONTEXTS
+    totals = [INITIAL_SUM] * CONTEXTS
+    out = bytearray(length)
+    prev1 = prev2 = 0
+    pos = 0
+    
+    for i in range(length):
+        if cancel is not None and not i % CHECK_INTERVAL:
+            cancel.check()
+        context = min((prev1 + prev2).bit_length(), CONTEXTS - 1)
+        n = seen[context]
+        total = totals[context]
+        count = (n if n < window else window) + 1
+        k = 0
+        while count << k < total:
+            k += 1
+        
+        one = find_one('1', pos)
+        quotient = one - pos
+        pos = one + 1
+        if quotient == QUOTIENT_LIMIT:
+            value = int(bits[pos:pos + RAW_BITS], 2)
+            pos += RAW_BITS
+        elif k:
+            value = (quotient << k) | int(bits[pos:pos + k], 2)
+            pos += k
+        else:
+            value = quotient
+        out[i] = value
+        
+        slot = n % window
+        history = recent[context]
+        totals[context] = total + value - history[slot]
+        history[slot] = value
+        seen[context] = n + 1
+        prev2, prev1 = prev1, value
+    
+    return unzigzag(np.frombuffer(bytes(out), dtype=np.uint8)).tobytes()
+
+
+def compress_to_bytes(data, window=DEFAULT_WINDOW, cancel=None):
+    """
+    Compress data and convert to bytes for storage.
+    
+    Args:
+        data: Input data (bytes, buffer or list of byte values)
+        window: Values per context the Rice parameter is estimated from
+        cancel: Optional CancellationToken
+    
+    Returns:
+        Compressed data as bytes
+    """
+    values = _to_byte_values(data)
+    result = {
+        'length': len(values),
+        'window': window,
+        'data': compress(values.data, window, cancel)
+    }
+    return pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decompress_from_bytes(compressed_bytes, cancel=None):
+    """
+    Decompress data from bytes.
+    
+    Args:
+        compressed_bytes: Compressed data as bytes
+        cancel: Optional CancellationToken
+    
+    Returns:
+        Original bytes
+    """
+    result = pickle.loads(compressed_bytes)
+    return decompress(result['data'], result['length'], result['window'], cancel)
@@ -5,25 +5,65 @@ Best for data with long runs of repeated values (e.g., binary images, simple gra
 
 import pickle
 
+import numpy as np
 
-def compress(data):
+from algorithms.cancellation import CHECK_INTERVAL
+
+
+def compress(data, min_run=1, cancel=None):
     """
     Compress data using Run Length Encoding.
     
     Args:
-        data: List or bytes to compress
+        data: Bytes or list to compress (strings are encoded as UTF-8)
+        min_run: Runs shorter than this are grouped into literal blocks,
+                 stored as (tuple_of_values, 0). 1 keeps plain pairs.
+        cancel: Optional CancellationToken checked every CHECK_INTERVAL items
         
     Returns:
         List of tuples (value, count)
     """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
     if not data:
         return []
     
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        compressed = _byte_runs(data, cancel)
+    else:
+        compressed = _item_runs(data, cancel)
+    
+    if min_run > 1:
+        compressed = pack_literals(compressed, min_run, cancel)
+    
+    return compressed
+
+
+def _byte_runs(data, cancel=None):
+    """Find (value, count) runs in a byte buffer with vectorized comparisons."""
+    values = np.frombuffer(data, dtype=np.uint8)
+    starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+    counts = np.diff(np.append(starts, values.size))
+    run_values = values[starts]
+    
+    # Build the tuples a chunk of runs at a time so the token is still polled
+    runs = []
+    for i in range(0, starts.size, CHECK_INTERVAL):
+        if cancel is not None:
+            cancel.check()
+        runs.extend(zip(run_values[i:i + CHECK_INTERVAL].tolist(), counts[i:i + CHECK_INTERVAL].tolist()))
+    return runs
+
+
+def _item_runs(data, cancel=None):
+    """Find (value, count) runs in any indexable sequence."""
     compressed = []
     prev = data[0]
     count = 1
     
     for i in range(1, len(data)):
+        if cancel is not None and not i % CHECK_INTERVAL:
+            cancel.check()
         if data[i] == prev:
             count += 1
         else:
@@ -35,12 +75,64 @@ def compress(data):
     return compressed
 
 
-def decompress(compressed_data):
+def pack_literals(runs, min_run, cancel=None):
+    """
+    Merge consecutive short runs into literal blocks.
+    
+    Args:
+        runs: List of (value, count) tuples
+        min_run: Shortest run kept as a (value, count) pair
+        cancel: Optional CancellationToken checked every CHECK_INTERVAL runs
+        
+    Returns:
+        List of (value, count) pairs and (tuple_of_values, 0) literal blocks
+    """
+    packed = []
+    literals = []
+    
+    for i, (value, count) in enumerate(runs):
+        if cancel is not None and not i % CHECK_INTERVAL:
+            cancel.check()
+        if count < min_run:
+            literals.extend([value] * count)
+        else:
+            if literals:
+                packed.append((tuple(literals), 0))
+                literals = []
+            packed.append((value, count))
+    
+    if literals:
+        packed.append((tuple(literals), 0))
+    
+    return packed
+
+
+def estimate_size(compressed_data):
+    """
+    Estimate the stored size of RLE output in bytes.
+    
+    Each run costs 1 byte for the value and 4 bytes for the count; each
+    literal block costs 1 byte per value plus a 4-byte length.
+    
+    Args:
+        compressed_data: Output of compress()
+        
+    Returns:
+        Estimated size in bytes
+    """
+    size = 0
+    for value, count in compressed_data:
+        size += 4 + (len(value) if count == 0 else 1)
+    return size
+
+
+def decompress(compressed_data, cancel=None):
     """
     Decompress RLE compressed data.
     
     Args:
         compressed_data: List of tuples (value, count)
+        cancel: Optional CancellationToken checked every CHECK_INTERVAL runs
         
     Returns:
         Original data as list
@@ -49,38 +141,46 @@ def decompress(compressed_data):
         return []
     
     decompressed = []
-    for value, count in compressed_data:
-        decompressed.extend([value] * count)
+    for i, (value, count) in enumerate(compressed_data):
+        if cancel is not None and not i % CHECK_INTERVAL:
+            cancel.check()
+        if count == 0:
+            decompressed.extend(value)
+        else:
+            decompressed.extend([value] * count)
     
     return decompressed
 
 
-def compress_to_bytes(data):
+def compress_to_bytes(data, min_run=1, cancel=None):
     """
     Compress data and convert to bytes for storage.
     
     Args:
-        data: Input data (list or bytes)
+        data: Input data (bytes or list; strings are encoded as UTF-8)
+        min_run: Shortest run kept as a pair (see compress())
+        cancel: Optional CancellationToken
         
     Returns:
         Compressed data as bytes
     """
-    compressed = compress(data)
+    compressed = compress(data, min_run, cancel)
     return pickle.dumps(compressed, protocol=pickle.HIGHEST_PROTOCOL)
 
 
-def decompress_from_bytes(compressed_bytes):
+def decompress_from_bytes(compressed_bytes, cancel=None):
     """
     Decompress data from bytes.
     
     Args:
         compressed_bytes: Compressed data as bytes
+        cancel: Optional CancellationToken
         
     Returns:
-        Original data as list
+        Original bytes
     """
     compressed_data = pickle.loads(compressed_bytes)
-    return decompress(compressed_data)
+    return bytes(decompress(compressed_data, cancel))
 
 
 def compress_string(text):
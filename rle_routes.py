@@ -3,7 +3,7 @@ RLE (Run Length Encoding) Algorithm Routes
 Handles all RLE compression operations
 """
 
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, current_app, send_file
 import sys
 import os
 import time
@@ -16,8 +16,9 @@ from pathlib import Path
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from algorithms import rle
-from handlers import image_handler, video_handler, document_handler
+from algorithms import rle, codec_registry
+from algorithms.cancellation import CancellationToken, CompressionCancelled
+from handlers import image_handler, video_handler, video_pipeline, document_handler, csv_pipeline
 from utils.database import get_db
 from utils.report_generator import get_report_generator
 
@@ -47,37 +48,45 @@ def compress_text():
     try:
         data = request.json
         text = data.get('text', '')
+        level = data.get('level')
+        try:
+            params = codec_registry.level_params('rle', level)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stop the codec if the request outlives its time budget
+        cancel = CancellationToken(timeout=current_app.config.get('COMPRESSION_TIMEOUT'))
         
         if not text:
             return jsonify({'error': 'No text provided'}), 400
         
-        # Convert text to byte array
-        data_array = [ord(c) for c in text]
+        # Encode once; the codec works on the UTF-8 bytes
+        data = text.encode('utf-8')
         
         # Measure compression time
         start_time = time.time()
-        compressed = rle.compress(data_array)
+        compressed = rle.compress(data, **params, cancel=cancel)
         compress_time = time.time() - start_time
         
         # Measure decompression time
         start_time = time.time()
-        decompressed = rle.decompress(compressed)
+        decompressed = rle.decompress(compressed, cancel=cancel)
         decompress_time = time.time() - start_time
         
         # Calculate metrics
-        original_size = len(data_array)
-        compressed_size = len(compressed)
+        original_size = len(data)
+        compressed_size = rle.estimate_size(compressed)
         ratio = compressed_size / original_size if original_size > 0 else 0
         savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
         
         # Verify correctness
-        is_correct = data_array == decompressed
+        is_correct = data == bytes(decompressed)
         
         # Store in database
         db = get_db()
         
         # Store original text
-        original_file_id = db.store_file(text.encode('utf-8'), 'text_input.txt', 'text')
+        original_file_id = db.store_file(data, 'text_input.txt', 'text')
         
         # Store compressed data
         compressed_bytes = pickle.dumps(compressed)
@@ -85,6 +94,7 @@ def compress_text():
         
         # Save compression record
         record = {
+            'level': level,
             'filename': 'text_input.txt',
             'file_type': 'text',
             'algorithm': 'RLE',
@@ -101,6 +111,7 @@ def compress_text():
         record_id = db.save_compression_record(record)
         
         return jsonify({
+            'level': level,
             'algorithm': 'RLE',
             'original_size': original_size,
             'compressed_size': compressed_size,
@@ -109,12 +120,14 @@ def compress_text():
             'compression_time': round(compress_time, 6),
             'decompression_time': round(decompress_time, 6),
             'is_correct': is_correct,
-            'decompressed_text': ''.join(chr(c) for c in decompressed) if is_correct else '',
+            'decompressed_text': bytes(decompressed).decode('utf-8') if is_correct else '',
             'record_id': record_id,
             'original_file_id': original_file_id,
             'compressed_file_id': compressed_file_id
         })
         
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -127,8 +140,19 @@ def compress_image():
             return jsonify({'error': 'No file uploaded'}), 400
         
         file = request.files['file']
+        level = request.form.get('level')
+        try:
+            params = codec_registry.level_params('rle', level)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stop the codec if the request outlives its time budget
+        cancel = CancellationToken(timeout=current_app.config.get('COMPRESSION_TIMEOUT'))
         grayscale = request.form.get('grayscale', 'false').lower() == 'true'
-        resize_percent = request.form.get('resize')
+        try:
+            resize_param = image_handler.parse_resize_percent(request.form.get('resize'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
@@ -143,7 +167,6 @@ def compress_image():
         file.save(filepath)
         
         # Process image with optional resize
-        resize_param = int(resize_percent) if resize_percent and resize_percent != 'none' else None
         image_data = image_handler.prepare_for_compression(
             filepath, 
             grayscale=grayscale,
@@ -151,39 +174,46 @@ def compress_image():
         )
         data = image_data['data']
         
-        # Compress
+        # Compress from the residual buffer; a memoryview indexes to plain
+        # ints like bytes does, without the tobytes() copy
         start_time = time.time()
-        compressed = rle.compress(data)
+        compressed = rle.compress(data.data, **params, cancel=cancel)
         compress_time = time.time() - start_time
         
         # Decompress
         start_time = time.time()
-        decompressed = rle.decompress(compressed)
+        decompressed = rle.decompress(compressed, cancel=cancel)
         decompress_time = time.time() - start_time
         
         # Calculate metrics - RLE compressed size estimation
-        original_size = len(data)
+        # Raw pixel bytes; the coded data may be a smaller palette index plane
+        original_size = image_data['raw_size']
         # For RLE: each tuple (value, count) = 1 byte for value + variable bytes for count
         # Estimate: 1 byte for value + 4 bytes for count (conservative)
-        compressed_size = sum(5 for _ in compressed)  # 5 bytes per run
+        compressed_size = rle.estimate_size(compressed)
         ratio = compressed_size / original_size if original_size > 0 else 0
         savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
-        is_correct = data == decompressed
+        is_correct = data.data == bytes(decompressed)
         
         # Store in database
         db = get_db()
         
         # Store original file
+        # Stream the upload into storage instead of reading it into memory
         with open(filepath, 'rb') as f:
-            original_bytes = f.read()
-        original_file_id = db.store_file(original_bytes, file.filename, 'image')
+            original_file_id = db.store_file(f, file.filename, 'image')
         
         # Store compressed data with metadata for reconstruction
         compressed_data = {
+            'level': level,
+            'params': params,
             'compressed': compressed,
             'shape': image_data.get('shape'),
             'mode': image_data.get('mode'),
-            'format': image_data.get('format')
+            'format': image_data.get('format'),
+            'predictor': image_data.get('predictor'),
+            'filters': image_data.get('filters'),
+            'palette': image_data.get('palette')
         }
         compressed_bytes = pickle.dumps(compressed_data)
         compressed_file_id = db.store_compressed_file(compressed_bytes, file.filename, 'rle')
@@ -195,6 +225,7 @@ def compress_image():
         
         # Save compression record
         record = {
+            'level': level,
             'filename': file.filename,
             'file_type': 'image',
             'algorithm': 'RLE',
@@ -217,6 +248,7 @@ def compress_image():
         os.remove(filepath)
         
         return jsonify({
+            'level': level,
             'algorithm': 'RLE',
             'file_type': 'image',
             'original_size': original_size,
@@ -236,10 +268,15 @@ def compress_image():
                 'shape': image_data.get('shape'),
                 'mode': image_data.get('mode'),
                 'format': image_data.get('format'),
-                'grayscale': grayscale
+                'grayscale': grayscale,
+                'predictor': image_data.get('predictor'),
+                'filters': image_handler.filter_summary(image_data['filters']),
+                'palette_colors': len(image_data['palette']) if image_data['palette'] is not None else None
             }
         })
         
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -252,7 +289,19 @@ def compress_video():
             return jsonify({'error': 'No file uploaded'}), 400
         
         file = request.files['file']
+        level = request.form.get('level')
+        try:
+            params = codec_registry.level_params('rle', level)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stop the codec if the request outlives its time budget
+        cancel = CancellationToken(timeout=current_app.config.get('COMPRESSION_TIMEOUT'))
         grayscale = request.form.get('grayscale', 'false').lower() == 'true'
+        # Frames after the first are coded as differences from the one before
+        temporal = request.form.get('temporal', 'diff')
+        if temporal not in video_pipeline.TEMPORAL_MODES:
+            return jsonify({'error': f"Unknown temporal mode: {temporal}"}), 400
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
@@ -266,48 +315,56 @@ def compress_video():
         filepath = os.path.join(upload_folder, safe_filename)
         file.save(filepath)
         
-        # Process video (first frame only for demo)
-        video_data = video_handler.prepare_for_compression(filepath, grayscale=grayscale, max_frames=1)
-        data = video_data['data'][0] if video_data['data'] else []
-        
-        # Compress
+        # Stream frames through the codec; only compressed frames are held
+        # in memory. The request codes at most VIDEO_FRAME_LIMIT frames so it
+        # finishes in time; /api/video/compress codes whole clips as a job
+        max_frames = current_app.config.get('VIDEO_FRAME_LIMIT')
+        video_data = video_handler.video_info(filepath)
         start_time = time.time()
-        compressed = rle.compress(data)
+        container = video_pipeline.compress_video(
+            video_handler.iter_frames(filepath, grayscale=grayscale, max_frames=max_frames, cancel=cancel),
+            'rle', params, temporal=temporal, cancel=cancel
+        )
         compress_time = time.time() - start_time
+        video_data['frame_count'] = container['frame_count']
         
-        # Decompress
+        # Decompress, comparing against a second pass over the file
         start_time = time.time()
-        decompressed = rle.decompress(compressed)
+        is_correct = video_pipeline.verify_video(
+            container, video_handler.iter_frames(filepath, grayscale=grayscale, max_frames=max_frames, cancel=cancel),
+            cancel=cancel
+        )
         decompress_time = time.time() - start_time
         
         # Calculate metrics
-        original_size = len(data)
-        compressed_size = len(compressed)
+        original_size = container['raw_size']
+        compressed_size = video_pipeline.compressed_size(container)
         ratio = compressed_size / original_size if original_size > 0 else 0
         savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
-        is_correct = data == decompressed
         
         # Store in database
         db = get_db()
         
         # Store original file
+        # Stream the upload into storage instead of reading it into memory
         with open(filepath, 'rb') as f:
-            original_bytes = f.read()
-        original_file_id = db.store_file(original_bytes, file.filename, 'video')
+            original_file_id = db.store_file(f, file.filename, 'video')
         
         # Store compressed data with metadata for reconstruction
-        compressed_data = {
-            'compressed': compressed,
-            'fps': video_data.get('fps'),
-            'width': video_data.get('width'),
-            'height': video_data.get('height'),
-            'frame_count': video_data.get('frame_count')
-        }
+        compressed_data = dict(
+            container,
+            level=level,
+            fps=video_data.get('fps'),
+            width=video_data.get('width'),
+            height=video_data.get('height'),
+            grayscale=grayscale
+        )
         compressed_bytes = pickle.dumps(compressed_data)
         compressed_file_id = db.store_compressed_file(compressed_bytes, file.filename, 'rle')
         
         # Save compression record
         record = {
+            'level': level,
             'filename': file.filename,
             'file_type': 'video',
             'algorithm': 'RLE',
@@ -325,7 +382,9 @@ def compress_video():
                 'width': video_data.get('width'),
                 'height': video_data.get('height'),
                 'frame_count': video_data.get('frame_count'),
-                'grayscale': grayscale
+                'total_frames': video_data.get('total_frames'),
+                'grayscale': grayscale,
+                'temporal': temporal
             }
         }
         record_id = db.save_compression_record(record)
@@ -334,6 +393,7 @@ def compress_video():
         os.remove(filepath)
         
         return jsonify({
+            'level': level,
             'record_id': record_id,
             'original_file_id': original_file_id,
             'compressed_file_id': compressed_file_id,
@@ -351,10 +411,14 @@ def compress_video():
                 'width': video_data.get('width'),
                 'height': video_data.get('height'),
                 'frame_count': video_data.get('frame_count'),
-                'grayscale': grayscale
+                'total_frames': video_data.get('total_frames'),
+                'grayscale': grayscale,
+                'temporal': temporal
             }
         })
         
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -367,6 +431,14 @@ def compress_document():
             return jsonify({'error': 'No file uploaded'}), 400
         
         file = request.files['file']
+        level = request.form.get('level')
+        try:
+            params = codec_registry.level_params('rle', level)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Stop the codec if the request outlives its time budget
+        cancel = CancellationToken(timeout=current_app.config.get('COMPRESSION_TIMEOUT'))
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
@@ -380,27 +452,56 @@ def compress_document():
         filepath = os.path.join(upload_folder, safe_filename)
         file.save(filepath)
         
-        # Process document
-        doc_data = document_handler.prepare_for_compression(filepath)
-        content = doc_data['data']
-        data = [ord(c) for c in content]
-        
-        # Compress
-        start_time = time.time()
-        compressed = rle.compress(data)
-        compress_time = time.time() - start_time
-        
-        # Decompress
-        start_time = time.time()
-        decompressed = rle.decompress(compressed)
-        decompress_time = time.time() - start_time
-        
-        # Calculate metrics
-        original_size = len(data)
-        compressed_size = len(compressed)
-        ratio = compressed_size / original_size if original_size > 0 else 0
-        savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
-        is_correct = data == decompressed
+        # CSV files are parsed into columns and coded by column type, one
+        # block of rows at a time; 'columnar=false' codes the raw text instead
+        columnar = (os.path.splitext(filepath)[1].lower() == '.csv'
+                    and request.form.get('columnar', 'true').lower() == 'true')
+        
+        if columnar:
+            dialect = document_handler.sniff_csv_dialect(filepath)
+            start_time = time.time()
+            container = csv_pipeline.compress_csv(
+                document_handler.iter_csv_records(filepath, dialect), 'rle', params, dialect, cancel=cancel
+            )
+            compress_time = time.time() - start_time
+            
+            # Decompress, comparing block by block against the file
+            start_time = time.time()
+            is_correct = csv_pipeline.verify_csv(container, filepath, cancel=cancel)
+            decompress_time = time.time() - start_time
+            
+            # Calculate metrics
+            original_size = os.path.getsize(filepath)
+            compressed_size = csv_pipeline.compressed_size(container)
+            ratio = compressed_size / original_size if original_size > 0 else 0
+            savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+            doc_data = {'format': '.csv', 'length': container['length']}
+            
+            # Small files, or columns the codec expands, can come out larger
+            # than the upload; code those as plain text instead
+            columnar = compressed_size < original_size
+        
+        if not columnar:
+            # Process document
+            doc_data = document_handler.prepare_for_compression(filepath)
+            data = doc_data['data']
+            
+            # Compress
+            start_time = time.time()
+            compressed = rle.compress(data, **params, cancel=cancel)
+            compress_time = time.time() - start_time
+            
+            # Decompress
+            start_time = time.time()
+            decompressed = rle.decompress(compressed, cancel=cancel)
+            decompress_time = time.time() - start_time
+            
+            # Calculate metrics
+            original_size = len(data)
+            compressed_size = rle.estimate_size(compressed)
+            ratio = compressed_size / original_size if original_size > 0 else 0
+            savings = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+            is_correct = data == bytes(decompressed)
         
         # Store in database
         db = get_db()
@@ -411,16 +512,22 @@ def compress_document():
         original_file_id = db.store_file(original_bytes, file.filename, 'document')
         
         # Store compressed data with metadata
-        compressed_data = {
-            'compressed': compressed,
-            'format': doc_data.get('format'),
-            'length': doc_data.get('length')
-        }
+        if columnar:
+            compressed_data = dict(container, level=level, format=doc_data['format'], length=doc_data['length'])
+        else:
+            compressed_data = {
+                'level': level,
+                'params': params,
+                'compressed': compressed,
+                'format': doc_data.get('format'),
+                'length': doc_data.get('length')
+            }
         compressed_bytes = pickle.dumps(compressed_data)
         compressed_file_id = db.store_compressed_file(compressed_bytes, file.filename, 'rle')
         
         # Save compression record
         record = {
+            'level': level,
             'filename': file.filename,
             'file_type': 'document',
             'algorithm': 'RLE',
@@ -435,7 +542,8 @@ def compress_document():
             'compressed_file_id': compressed_file_id,
             'metadata': {
                 'format': doc_data.get('format'),
-                'length': doc_data.get('length')
+                'length': doc_data.get('length'),
+                'columnar': columnar
             }
         }
         record_id = db.save_compression_record(record)
@@ -444,6 +552,7 @@ def compress_document():
         os.remove(filepath)
         
         return jsonify({
+            'level': level,
             'record_id': record_id,
             'original_file_id': original_file_id,
             'compressed_file_id': compressed_file_id,
@@ -458,9 +567,12 @@ def compress_document():
             'is_correct': is_correct,
             'metadata': {
                 'format': doc_data.get('format'),
-                'length': doc_data.get('length')
+                'length': doc_data.get('length'),
+                'columnar': columnar
             }
         })
         
+    except CompressionCancelled as e:
+        return jsonify({'error': f'Compression cancelled: {e}'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
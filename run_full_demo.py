@@ -31,11 +31,8 @@ def print_section(title):
 def test_compression(name, compress_func, decompress_func, data, data_str=None, is_huffman=False):
     """Test a compression algorithm."""
     
-    # Use appropriate data type for each algorithm
-    if is_huffman or name == "LZW":
-        test_data = data_str if data_str else ''.join([chr(d) for d in data])
-    else:  # RLE
-        test_data = data
+    # Every codec works on the same UTF-8 bytes
+    test_data = data_str.encode('utf-8') if data_str else bytes(data)
     
     # Compress
     start = time.time()
@@ -60,18 +57,12 @@ def test_compression(name, compress_func, decompress_func, data, data_str=None,
     decomp_time = time.time() - start
     
     # Calculate metrics
-    orig_size = len(data) if isinstance(data, list) else len(data_str)
+    orig_size = len(test_data)
     ratio = comp_size / orig_size if orig_size > 0 else 1
     space_saving = ((orig_size - comp_size) / orig_size * 100) if orig_size > 0 else 0
     
     # Verify
-    if is_huffman or name == "LZW":
-        is_correct = ''.join(decompressed) if is_huffman else decompressed == test_data
-        is_correct = is_correct if isinstance(is_correct, bool) else is_correct == test_data
-    elif name == "RLE":
-        is_correct = list(decompressed) == list(data)
-    else:
-        is_correct = decompressed == test_data
+    is_correct = bytes(decompressed) == test_data
     
     return {
         'name': name,
@@ -198,8 +189,8 @@ def demo_algorithm_details():
     print(f"  Codes: {codes}")
     print(f"  Encoded: {encoded[:50]}..." if len(encoded) > 50 else f"  Encoded: {encoded}")
     decoded = huffman.decompress(encoded, codes)
-    print(f"  Decoded: {''.join(decoded)}")
-    print(f"  ✓ Match: {''.join(decoded) == text}")
+    print(f"  Decoded: {decoded.decode('utf-8')}")
+    print(f"  ✓ Match: {decoded == text.encode('utf-8')}")
     
     # LZW Example
     print_section("Lempel-Ziv-Welch (LZW)")
@@ -210,8 +201,8 @@ def demo_algorithm_details():
     compressed = lzw.compress(text)
     print(f"  Compressed: {compressed}")
     decompressed = lzw.decompress(compressed)
-    print(f"  Decompressed: '{decompressed}'")
-    print(f"  ✓ Match: {decompressed == text}")
+    print(f"  Decompressed: '{decompressed.decode('utf-8')}'")
+    print(f"  ✓ Match: {decompressed == text.encode('utf-8')}")
 
 
 def demo_comparison_summary():
@@ -0,0 +1,68 @@
+"""
+Tests for cooperative cancellation of the codecs
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from algorithms import codec_registry, rle
+from algorithms.cancellation import CancellationToken, CompressionCancelled
+
+DATA = bytes(np.random.default_rng(0).integers(0, 4, 200000, dtype=np.uint8))
+
+
+def cancelled_token():
+    token = CancellationToken()
+    token.cancel('stop')
+    return token
+
+
+def test_token_starts_unset():
+    token = CancellationToken()
+    assert not token.cancelled
+    token.check()
+
+
+def test_cancel_raises_with_reason():
+    with pytest.raises(CompressionCancelled, match='stop'):
+        cancelled_token().check()
+
+
+def test_deadline_fires():
+    token = CancellationToken(timeout=0.01)
+    time.sleep(0.02)
+    assert token.cancelled
+    with pytest.raises(CompressionCancelled, match='deadline exceeded'):
+        token.check()
+
+
+def test_no_timeout_never_fires():
+    assert CancellationToken(timeout=None).deadline is None
+    assert CancellationToken(timeout=0).deadline is None
+
+
+@pytest.mark.parametrize('codec', list(codec_registry.CODECS))
+def test_every_codec_stops_when_cancelled(codec):
+    with pytest.raises(CompressionCancelled):
+        codec_registry.get_codec(codec)['module'].compress_to_bytes(DATA[:4096], cancel=cancelled_token())
+
+
+@pytest.mark.parametrize('codec', list(codec_registry.CODECS))
+def test_every_codec_stops_decompression_when_cancelled(codec):
+    compressed = codec_registry.compress(codec, DATA[:4096])
+    with pytest.raises(CompressionCancelled):
+        codec_registry.decompress(codec, compressed, cancel=cancelled_token())
+
+
+@pytest.mark.parametrize('min_run', [1, 3])
+def test_rle_byte_path_stops_when_cancelled(min_run):
+    # Buffers take the vectorized path, which polls once per chunk of runs
+    with pytest.raises(CompressionCancelled):
+        rle.compress(memoryview(DATA), min_run, cancel=cancelled_token())
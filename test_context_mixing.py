@@ -0,0 +1,54 @@
+"""
+Tests for the context-mixing codec and the archive level
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from algorithms import codec_registry, context_mixing
+from algorithms.cancellation import CancellationToken, CompressionCancelled
+
+SAMPLE = b"the quick brown fox jumps over the lazy dog\n" * 20 + bytes(range(256))
+
+
+@pytest.mark.parametrize('data', [b'', b'a', b'\x00', b'\xff'])
+def test_tiny_inputs_round_trip(data):
+    compressed = context_mixing.compress_to_bytes(data)
+    assert context_mixing.decompress_from_bytes(compressed) == data
+
+
+def test_text_is_coded_as_utf8():
+    compressed = context_mixing.compress_to_bytes('héllo')
+    assert context_mixing.decompress_from_bytes(compressed) == 'héllo'.encode('utf-8')
+
+
+@pytest.mark.parametrize('level', list(range(codec_registry.MIN_LEVEL, codec_registry.MAX_LEVEL + 1)) + ['archive'])
+def test_levels_round_trip(level):
+    params = codec_registry.level_params('cm', level)
+    compressed = codec_registry.compress('cm', SAMPLE, **params)
+    assert codec_registry.decompress('cm', compressed) == SAMPLE
+
+
+def test_repetitive_data_shrinks():
+    data = b"abcabcabd" * 200
+    assert len(context_mixing.compress_to_bytes(data)) < len(data) // 10
+
+
+def test_cancelled_token_stops_compression():
+    token = CancellationToken()
+    token.cancel('stop')
+    with pytest.raises(CompressionCancelled):
+        context_mixing.compress_to_bytes(SAMPLE, cancel=token)
+
+
+def test_cancelled_token_stops_decompression():
+    compressed = context_mixing.compress_to_bytes(SAMPLE)
+    token = CancellationToken()
+    token.cancel('stop')
+    with pytest.raises(CompressionCancelled):
+        context_mixing.decompress_from_bytes(compressed, cancel=token)
@@ -0,0 +1,81 @@
+"""
+Tests for columnar CSV compression
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from algorithms.cancellation import CancellationToken, CompressionCancelled
+from handlers import csv_pipeline, document_handler
+
+NUMBERS = "id,price,name\n" + "".join(f"{i},{i * 3 % 97}.{i % 100:02d},item{i % 7}\n" for i in range(500))
+
+
+def compress_file(path, codec='huffman', **kwargs):
+    dialect = document_handler.sniff_csv_dialect(path)
+    records = document_handler.iter_csv_records(path, dialect)
+    return csv_pipeline.compress_csv(records, codec, dialect=dialect, parallel=False, **kwargs)
+
+
+def write(tmp_path, text, name='data.csv'):
+    path = tmp_path / name
+    path.write_bytes(text.encode('utf-8'))
+    return str(path)
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    'a',
+    'a\n',
+    NUMBERS,
+    'name,quote\n"Smith, J","said ""hi"""\n"multi\nline",x\n',
+    'a,b\r\n1,2\r\n3,4\r\n',
+    'a,b,c\n1,2\n3,4,5,6\n\n7\n',
+    'a,b\n1,2\n3,4',
+    'n\n-0\n0.50\n007\n1e3\n',
+], ids=['empty', 'one-byte', 'one-line', 'numbers', 'quoted', 'crlf', 'ragged', 'no-final-newline', 'odd-numbers'])
+def test_round_trip_is_byte_exact(tmp_path, text):
+    path = write(tmp_path, text)
+    container = compress_file(path)
+    assert csv_pipeline.decompress_csv(container) == text
+    assert csv_pipeline.verify_csv(container, path)
+
+
+@pytest.mark.parametrize('codec', ['rle', 'huffman', 'lzw', 'rice'])
+def test_codecs_round_trip(tmp_path, codec):
+    path = write(tmp_path, NUMBERS)
+    container = compress_file(path, codec)
+    assert csv_pipeline.decompress_csv(container) == NUMBERS
+
+
+def test_blocks_split_rows(tmp_path):
+    path = write(tmp_path, NUMBERS)
+    container = compress_file(path, block_rows=64)
+    assert container['rows'] == 500
+    assert len(container['blocks']) == 8
+    assert csv_pipeline.decompress_csv(container) == NUMBERS
+
+
+def test_numeric_columns_shrink(tmp_path):
+    path = write(tmp_path, NUMBERS)
+    assert csv_pipeline.compressed_size(compress_file(path)) < len(NUMBERS) // 3
+
+
+def test_verify_detects_a_changed_file(tmp_path):
+    path = write(tmp_path, NUMBERS)
+    container = compress_file(path)
+    write(tmp_path, NUMBERS.replace('item3', 'item4', 1))
+    assert not csv_pipeline.verify_csv(container, path)
+
+
+def test_cancelled_token_stops_compression(tmp_path):
+    path = write(tmp_path, NUMBERS)
+    token = CancellationToken()
+    token.cancel('stop')
+    with pytest.raises(CompressionCancelled):
+        compress_file(path, cancel=token)
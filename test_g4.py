@@ -0,0 +1,52 @@
+"""
+Tests for G4-style 2D run coding of bilevel images
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from algorithms import g4
+from algorithms.cancellation import CancellationToken, CompressionCancelled
+
+RNG = np.random.default_rng(0)
+
+
+@pytest.mark.parametrize('bits', [
+    np.zeros((0, 0), dtype=np.uint8),
+    np.zeros((0, 5), dtype=np.uint8),
+    np.zeros((1, 1), dtype=np.uint8),
+    np.ones((1, 1), dtype=np.uint8),
+    np.ones((4, 9), dtype=np.uint8),
+    (RNG.random((37, 53)) < 0.5).astype(np.uint8),
+], ids=['empty', 'no-rows', 'white-pixel', 'black-pixel', 'solid', 'noise'])
+def test_round_trip(bits):
+    assert np.array_equal(g4.decode(g4.encode(bits), bits.shape), bits)
+
+
+def test_text_like_image_shrinks():
+    bits = np.zeros((200, 400), dtype=np.uint8)
+    bits[20:180:10, 30:370] = 1
+    bits[:, 100:104] = 1
+    assert len(g4.encode(bits)) < bits.size // 40
+
+
+def test_decode_accepts_token_lists():
+    bits = (RNG.random((8, 8)) < 0.5).astype(np.uint8)
+    assert np.array_equal(g4.decode(list(g4.encode(bits)), bits.shape), bits)
+
+
+def test_cancelled_token_stops_encode_and_decode():
+    bits = (RNG.random((64, 64)) < 0.5).astype(np.uint8)
+    tokens = g4.encode(bits)
+    token = CancellationToken()
+    token.cancel('stop')
+    with pytest.raises(CompressionCancelled):
+        g4.encode(bits, cancel=token)
+    with pytest.raises(CompressionCancelled):
+        g4.decode(tokens, bits.shape, cancel=token)
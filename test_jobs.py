@@ -0,0 +1,101 @@
+"""
+Tests for the background job runner
+"""
+
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils import jobs
+
+
+def wait_for(job_id, timeout=5):
+    """Poll a job until it finishes."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get_job(job_id)
+        if job['status'] in jobs.FINISHED_STATUSES:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_job_completes_with_result_and_progress():
+    def work(value, progress, cancel):
+        progress(0.5)
+        return value * 2
+
+    job = wait_for(jobs.submit_job('test', work, 21))
+    assert job['status'] == 'completed'
+    assert job['result'] == 42
+    assert job['progress'] == 1.0
+
+
+def test_failing_job_reports_its_error():
+    def work(progress, cancel):
+        raise ValueError('bad input')
+
+    job = wait_for(jobs.submit_job('test', work))
+    assert job['status'] == 'failed'
+    assert job['error'] == 'bad input'
+
+
+def test_cancel_stops_a_running_job():
+    started = threading.Event()
+
+    def work(progress, cancel):
+        started.set()
+        while True:
+            cancel.check()
+            time.sleep(0.01)
+
+    job_id = jobs.submit_job('test', work)
+    assert started.wait(5)
+    assert jobs.cancel_job(job_id)
+    job = wait_for(job_id)
+    assert job['status'] == 'cancelled'
+    assert not jobs.cancel_job(job_id)
+
+
+def test_timeout_cancels_a_job():
+    def work(progress, cancel):
+        while True:
+            cancel.check()
+            time.sleep(0.01)
+
+    job = wait_for(jobs.submit_job('test', work, timeout=0.05))
+    assert job['status'] == 'cancelled'
+
+
+def test_finished_jobs_expire_after_ttl():
+    expired = wait_for(jobs.submit_job('test', lambda progress, cancel: 'old'))['job_id']
+    recent = wait_for(jobs.submit_job('test', lambda progress, cancel: 'new'))['job_id']
+    with jobs._lock:
+        jobs._jobs[expired]['finished'] = datetime.now() - jobs.JOB_TTL * 2
+
+    listed = [job['job_id'] for job in jobs.list_jobs('test')]
+    assert expired not in listed
+    assert recent in listed
+    assert jobs.get_job(expired) is None
+    assert jobs.get_job(recent)['result'] == 'new'
+
+
+def test_unfinished_jobs_never_expire():
+    release = threading.Event()
+
+    def work(progress, cancel):
+        release.wait(5)
+
+    job_id = jobs.submit_job('test', work)
+    with jobs._lock:
+        jobs._jobs[job_id]['submitted'] = datetime.now() - jobs.JOB_TTL * 2
+    try:
+        assert job_id in [job['job_id'] for job in jobs.list_jobs('test')]
+    finally:
+        release.set()
+    wait_for(job_id)
@@ -0,0 +1,54 @@
+"""
+Tests for block motion estimation and compensation
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from algorithms import motion
+
+RNG = np.random.default_rng(0)
+
+
+def test_finds_a_global_shift():
+    # A smooth image, so the three-step search can follow the SAD downhill
+    y, x = np.mgrid[:64, :64]
+    reference = (127 + 60 * np.sin(y / 6) + 60 * np.cos(x / 7)).astype(np.uint8)
+    frame = np.roll(reference, (3, -5), axis=(0, 1))
+    vectors = motion.estimate(frame, reference)
+    # Blocks away from the wrapped edges see the shift exactly
+    assert tuple(vectors[1, 1]) == (-3, 5)
+    prediction = motion.compensate(reference, vectors)
+    assert np.array_equal(prediction[16:48, 16:48], frame[16:48, 16:48])
+
+
+def test_static_frame_has_zero_vectors():
+    frame = RNG.integers(0, 256, (40, 40, 3), dtype=np.uint8)
+    vectors = motion.estimate(frame, frame)
+    assert vectors.shape == (3, 3, 2)
+    assert not vectors.any()
+    assert np.array_equal(motion.compensate(frame, vectors), frame)
+
+
+def test_single_pixel_frame():
+    frame = np.zeros((1, 1), dtype=np.uint8)
+    vectors = motion.estimate(frame, frame)
+    assert vectors.shape == (1, 1, 2)
+    assert np.array_equal(motion.compensate(frame, vectors), frame)
+
+
+def test_shape_mismatch_is_rejected():
+    with pytest.raises(ValueError):
+        motion.estimate(np.zeros((16, 16), dtype=np.uint8), np.zeros((16, 32), dtype=np.uint8))
+
+
+def test_search_range_must_fit_a_byte():
+    frame = np.zeros((16, 16), dtype=np.uint8)
+    with pytest.raises(ValueError):
+        motion.estimate(frame, frame, search_range=128)
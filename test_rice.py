@@ -0,0 +1,61 @@
+"""
+Tests for the adaptive Rice codec
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from algorithms import codec_registry, rice
+from algorithms.cancellation import CancellationToken, CompressionCancelled
+
+RNG = np.random.default_rng(0)
+# Smooth residual-like bytes plus a few outliers past QUOTIENT_LIMIT
+SAMPLE = bytes((RNG.integers(-3, 4, 4000) % 256).astype(np.uint8)) + bytes([128, 255, 0, 127]) * 8
+
+
+@pytest.mark.parametrize('data', [b'', b'a', b'\x00', b'\xff'])
+def test_tiny_inputs_round_trip(data):
+    compressed = rice.compress_to_bytes(data)
+    assert rice.decompress_from_bytes(compressed) == data
+
+
+def test_zigzag_round_trip():
+    values = np.arange(256, dtype=np.uint8)
+    assert np.array_equal(rice.unzigzag(rice.zigzag(values)), values)
+
+
+@pytest.mark.parametrize('level', range(codec_registry.MIN_LEVEL, codec_registry.MAX_LEVEL + 1))
+def test_levels_round_trip(level):
+    params = codec_registry.level_params('rice', level)
+    compressed = codec_registry.compress('rice', SAMPLE, **params)
+    assert codec_registry.decompress('rice', compressed) == SAMPLE
+
+
+def test_archive_level_is_not_a_rice_level():
+    with pytest.raises(ValueError):
+        codec_registry.level_params('rice', 'archive')
+
+
+def test_small_residuals_shrink():
+    assert len(rice.compress_to_bytes(SAMPLE)) < len(SAMPLE) // 2
+
+
+def test_cancelled_token_stops_compression():
+    token = CancellationToken()
+    token.cancel('stop')
+    with pytest.raises(CompressionCancelled):
+        rice.compress_to_bytes(SAMPLE, cancel=token)
+
+
+def test_cancelled_token_stops_decompression():
+    compressed = rice.compress_to_bytes(SAMPLE)
+    token = CancellationToken()
+    token.cancel('stop')
+    with pytest.raises(CompressionCancelled):
+        rice.decompress_from_bytes(compressed, cancel=token)
@@ -0,0 +1,49 @@
+"""
+Tests for the reversible 5/3 wavelet transform
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from algorithms import wavelet
+
+RNG = np.random.default_rng(0)
+
+
+@pytest.mark.parametrize('shape', [(1, 1), (1, 9), (2, 2), (7, 5), (64, 33), (100, 100)])
+def test_round_trip_is_lossless(shape):
+    plane = RNG.integers(0, 256, shape)
+    ll, details = wavelet.forward(plane)
+    assert np.array_equal(wavelet.inverse(ll, details), plane)
+
+
+def test_signed_input_round_trips():
+    plane = RNG.integers(-255, 256, (31, 17))
+    assert np.array_equal(wavelet.inverse(*wavelet.forward(plane)), plane)
+
+
+def test_levels_are_clamped_to_the_image():
+    assert wavelet.max_levels((1, 1)) == 0
+    assert wavelet.max_levels((7, 500)) == 2
+    assert wavelet.max_levels((1024, 1024)) == wavelet.DEFAULT_LEVELS
+    _, details = wavelet.forward(np.zeros((7, 500)), levels=9)
+    assert len(details) == 2
+
+
+def test_partial_inverse_is_a_thumbnail():
+    plane = np.full((64, 48), 200)
+    ll, details = wavelet.forward(plane, levels=3)
+    thumbnail = wavelet.inverse(ll, details[:1])
+    assert thumbnail.shape == (16, 12)
+    assert np.all(thumbnail == 200)
+
+
+def test_flat_plane_has_zero_detail():
+    _, details = wavelet.forward(np.full((32, 32), 77))
+    assert all(not band.any() for level in details for band in level)
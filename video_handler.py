@@ -3,56 +3,271 @@ Video file handler for compression.
 Supports MP4, AVI, MOV formats.
 """
 
+import os
+import queue
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
 import cv2
 import numpy as np
-import os
 
+from handlers import video_pipeline
+
+
+# Frames decoded ahead of the consumer by iter_frames()
+FRAME_READ_AHEAD = 4
+
+# Seconds between checks for a stopped consumer while the read-ahead queue is full
+QUEUE_POLL_INTERVAL = 0.1
+
+# Captures decoding different parts of a clip at once in iter_frames()
+DECODE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Frames each capture decodes after one seek; clips shorter than two
+# ranges are read sequentially
+DECODE_CHUNK = 32
 
-def load_video(file_path, max_frames=None):
+# Decoded frames the parallel path of iter_frames() may hold at once, in
+# bytes. Ranges shrink to fit for large frames; once they would be shorter
+# than MIN_DECODE_CHUNK, seeking costs more than it saves and frames are
+# read sequentially instead
+DECODE_BUFFER_BYTES = 128 * 1024 * 1024
+MIN_DECODE_CHUNK = 8
+
+# FourCC used by save_video() and stream_video() for each output format
+OUTPUT_CODECS = {'.mp4': 'mp4v', '.mov': 'mp4v', '.mkv': 'mp4v', '.avi': 'MJPG'}
+
+# Bytes read from the growing output file per chunk sent by stream_video()
+STREAM_CHUNK = 64 * 1024
+
+
+def video_info(file_path):
     """
-    Load video from file.
+    Read a video's metadata without decoding any frames.
     
     Args:
         file_path: Path to video file
-        max_frames: Maximum number of frames to load (None for all)
-        
+    
     Returns:
-        Dictionary with frames and metadata
+        Dictionary with fps, width, height, total_frames (as reported by
+        the container, which may be approximate) and original_size
     """
     cap = cv2.VideoCapture(file_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {file_path}")
     
+    info = {
+        'fps': cap.get(cv2.CAP_PROP_FPS),
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'total_frames': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        'original_size': os.path.getsize(file_path)
+    }
+    cap.release()
+    return info
+
+
+def _open_capture(file_path, start=0):
+    """Open a video positioned at frame `start`."""
+    cap = cv2.VideoCapture(file_path)
     if not cap.isOpened():
         raise ValueError(f"Could not open video file: {file_path}")
+    if start and not cap.set(cv2.CAP_PROP_POS_FRAMES, start):
+        cap.release()
+        raise ValueError(f"Could not seek to frame {start} of {file_path}")
+    return cap
+
+
+def _decode_range(file_path, start, count, grayscale):
+    """
+    Decode frames start to start + count - 1 with a capture of its own.
     
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    Returns:
+        List of frames; shorter than count at the end of the video, and
+        running to the end of the video when count is None
+    """
+    cap = _open_capture(file_path, start)
+    try:
+        frames = []
+        while count is None or len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if grayscale:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            frames.append(np.ascontiguousarray(frame, dtype=np.uint8))
+        return frames
+    finally:
+        cap.release()
+
+
+def _range_length(cap, grayscale, workers):
+    """Frames per range that keep workers + 1 decoded ranges within DECODE_BUFFER_BYTES."""
+    frame_bytes = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) * int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if not grayscale:
+        frame_bytes *= 3
+    return min(DECODE_CHUNK, DECODE_BUFFER_BYTES // (max(frame_bytes, 1) * (workers + 1)))
+
+
+def _iter_ranges(file_path, start, end, total, grayscale, workers, chunk, cancel):
+    """
+    Parallel path of iter_frames(): decode chunk-frame ranges in a thread
+    pool, each capture seeking to its range, and yield them in order.
+    
+    At most `workers` ranges are decoded ahead of the consumer. Frame
+    counts reported by containers can be off, so the last range reads to
+    the end of the video (or to `end`), and a short range ends the video.
+    """
+    starts = list(range(start, total if end is None else min(end, total), chunk))
     
-    frames = []
-    frame_count = 0
+    def submit(pool, number):
+        if number < len(starts) - 1:
+            count = chunk
+        else:
+            count = None if end is None else end - starts[number]
+        return pool.submit(_decode_range, file_path, starts[number], count, grayscale)
     
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        frames.append(frame)
-        frame_count += 1
-        
-        if max_frames and frame_count >= max_frames:
-            break
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='video-decoder')
+    pending = deque()
+    try:
+        for number in range(min(workers, len(starts))):
+            pending.append(submit(pool, number))
+        for number in range(len(starts)):
+            future = pending.popleft()
+            while not future.done():
+                if cancel is not None:
+                    cancel.check()
+                wait([future], timeout=QUEUE_POLL_INTERVAL)
+            frames = future.result()
+            if number + workers < len(starts):
+                pending.append(submit(pool, number + workers))
+            
+            for frame in frames:
+                if cancel is not None:
+                    cancel.check()
+                yield frame
+            if number < len(starts) - 1 and len(frames) < chunk:
+                return
+    finally:
+        # Also reached when the consumer stops early: drop queued ranges
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+def _read_frames(cap, frames, stop, grayscale, max_frames):
+    """Reader thread for iter_frames(): decode into the bounded queue."""
+    def put(item):
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=QUEUE_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
     
-    cap.release()
+    try:
+        count = 0
+        while max_frames is None or count < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if grayscale:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if not put(np.ascontiguousarray(frame, dtype=np.uint8)):
+                return
+            count += 1
+        put(None)
+    except Exception as e:
+        put(e)
+    finally:
+        cap.release()
+
+
+def iter_frames(file_path, grayscale=False, max_frames=None, read_ahead=FRAME_READ_AHEAD, cancel=None,
+                start=0, workers=DECODE_WORKERS):
+    """
+    Yield a video's frames one at a time.
+    
+    A background thread decodes at most read_ahead frames ahead of the
+    consumer (OpenCV releases the GIL while decoding), so memory stays at
+    a few frames whatever the clip length.
+    
+    With several workers, longer clips are split into ranges of up to
+    DECODE_CHUNK frames instead, each decoded by its own capture after
+    seeking with CAP_PROP_POS_FRAMES, so decoding runs on several cores.
+    Ranges are sized so the buffered frames stay within DECODE_BUFFER_BYTES;
+    frames too large for that (1080p colour) are read sequentially.
+    
+    Args:
+        file_path: Path to video file
+        grayscale: Convert frames to grayscale
+        max_frames: Stop after this many frames (None for all)
+        read_ahead: Decoded frames buffered ahead of the consumer
+        cancel: Optional CancellationToken checked before every frame
+        start: First frame to decode
+        workers: Captures decoding concurrently (1 reads sequentially)
+    
+    Yields:
+        uint8 arrays of shape (H, W, 3) in BGR order, or (H, W) if grayscale
+    """
+    cap = _open_capture(file_path, start)
+    end = None if max_frames is None else start + max_frames
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    chunk = _range_length(cap, grayscale, workers)
+    if workers > 1 and chunk >= MIN_DECODE_CHUNK and min(total, end or total) - start >= 2 * chunk:
+        cap.release()
+        yield from _iter_ranges(file_path, start, end, total, grayscale, workers, chunk, cancel)
+        return
+    
+    frames = queue.Queue(maxsize=max(1, read_ahead))
+    stop = threading.Event()
+    reader = threading.Thread(target=_read_frames, args=(cap, frames, stop, grayscale, max_frames),
+                              name='video-reader', daemon=True)
+    reader.start()
+    try:
+        while True:
+            if cancel is not None:
+                cancel.check()
+            frame = frames.get()
+            if frame is None:
+                return
+            if isinstance(frame, Exception):
+                raise frame
+            yield frame
+    finally:
+        # Also reached when the consumer stops early: unblock the reader
+        stop.set()
+        reader.join()
+
+
+def load_video(file_path, max_frames=None, start=0):
+    """
+    Load video from file.
+    
+    Holds every frame in memory; use iter_frames() to stream them instead.
+    
+    Args:
+        file_path: Path to video file
+        max_frames: Maximum number of frames to load (None for all)
+        start: First frame to load
+    
+    Returns:
+        Dictionary with frames and metadata
+    """
+    info = video_info(file_path)
+    frames = list(iter_frames(file_path, max_frames=max_frames, start=start))
     
     return {
         'frames': frames,
-        'fps': fps,
-        'width': width,
-        'height': height,
-        'total_frames': total_frames,
-        'loaded_frames': frame_count,
-        'original_size': os.path.getsize(file_path)
+        'fps': info['fps'],
+        'width': info['width'],
+        'height': info['height'],
+        'total_frames': info['total_frames'],
+        'loaded_frames': len(frames),
+        'original_size': info['original_size']
     }
 
 
@@ -60,93 +275,199 @@ def save_video(frames, output_path, fps=30, codec='mp4v'):
     """
     Save frames as video.
     
+    Frames are written as they arrive, so a generator is never held in
+    memory as a whole.
+    
     Args:
-        frames: List of frame arrays
+        frames: Iterable of frame arrays (BGR, or 2D for grayscale)
         output_path: Path to save video
         fps: Frames per second
         codec: Video codec (mp4v, XVID, etc.)
     """
-    if not frames:
+    out = None
+    try:
+        for frame in frames:
+            if out is None:
+                height, width = frame.shape[:2]
+                fourcc = cv2.VideoWriter_fourcc(*codec)
+                out = cv2.VideoWriter(output_path, fourcc, fps, (width, height), isColor=frame.ndim == 3)
+            out.write(frame)
+    finally:
+        if out is not None:
+            out.release()
+    
+    if out is None:
         raise ValueError("No frames to save")
+
+
+def _write_queued(frames, output_path, fps, codec, stop, errors):
+    """Writer thread for stream_video(): feed queued frames to save_video()."""
+    def queued():
+        while True:
+            try:
+                frame = frames.get(timeout=QUEUE_POLL_INTERVAL)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if frame is None:
+                return
+            yield frame
     
-    height, width = frames[0].shape[:2]
-    fourcc = cv2.VideoWriter_fourcc(*codec)
+    try:
+        save_video(queued(), output_path, fps, codec)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        stop.set()
+
+
+def stream_video(frames, fps=30, suffix='.mp4', queue_size=FRAME_READ_AHEAD, cancel=None):
+    """
+    Encode frames into a video file and yield its bytes.
+    
+    Frames are pulled from the iterable (typically a decoder) in the
+    calling thread and handed through a bounded queue to a writer thread
+    running cv2.VideoWriter, so decoding and encoding overlap and only a
+    few frames are in memory. Both MP4 and AVI rewrite their headers when
+    the writer is released, so the file is only read back once it is
+    complete; it is removed at the end.
+    
+    Args:
+        frames: Iterable of frame arrays
+        fps: Frames per second
+        suffix: Output format, one of OUTPUT_CODECS
+        queue_size: Frames buffered between decoder and writer
+        cancel: Optional CancellationToken checked before every frame
     
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    Yields:
+        Chunks of the encoded file
+    """
+    codec = OUTPUT_CODECS.get(suffix)
+    if codec is None:
+        raise ValueError(f"Unsupported video format: {suffix}")
+    
+    handle, output_path = tempfile.mkstemp(suffix=suffix)
+    os.close(handle)
+    queued = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+    errors = []
+    writer = threading.Thread(target=_write_queued, args=(queued, output_path, fps, codec, stop, errors),
+                              name='video-writer', daemon=True)
+    writer.start()
     
-    for frame in frames:
-        out.write(frame)
+    def put(item):
+        while not stop.is_set():
+            try:
+                queued.put(item, timeout=QUEUE_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
     
-    out.release()
+    try:
+        for frame in frames:
+            if cancel is not None:
+                cancel.check()
+            # The writer only stops early when it failed
+            if not put(frame):
+                break
+        
+        put(None)
+        writer.join()
+        if errors:
+            raise errors[0]
+        
+        with open(output_path, 'rb') as output:
+            while True:
+                chunk = output.read(STREAM_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        # Also reached when the client goes away: stop the writer first
+        stop.set()
+        writer.join()
+        os.remove(output_path)
 
 
-def prepare_for_compression(file_path, grayscale=False, max_frames=100):
+def prepare_for_compression(file_path, grayscale=False, max_frames=100, as_list=False):
     """
     Prepare video for compression by extracting frames.
     
+    Holds every frame in memory; handlers.video_pipeline codes the frames
+    of iter_frames() as they arrive instead.
+    
     Args:
         file_path: Path to video
         grayscale: Convert to grayscale
         max_frames: Maximum frames to process
-        
+        as_list: Return each frame as a flat list of ints (the old format)
+                 instead of a flat uint8 array
+    
     Returns:
         Dictionary with video data and metadata
     """
-    cap = cv2.VideoCapture(file_path)
-    
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    
-    frames_data = []
-    frame_count = 0
-    
-    while frame_count < max_frames:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        if grayscale:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        frames_data.append(frame.flatten().tolist())
-        frame_count += 1
-    
-    cap.release()
+    info = video_info(file_path)
+    frames_data = [frame.ravel().tolist() if as_list else frame.ravel()
+                   for frame in iter_frames(file_path, grayscale, max_frames)]
     
     return {
         'data': frames_data,
-        'fps': fps,
-        'width': width,
-        'height': height,
-        'frame_count': frame_count,
+        'fps': info['fps'],
+        'width': info['width'],
+        'height': info['height'],
+        'frame_count': len(frames_data),
         'grayscale': grayscale,
-        'original_size': os.path.getsize(file_path)
+        'original_size': info['original_size']
     }
 
 
-def reconstruct_video(video_data):
+def iter_reconstructed(video_data, start=0, stop=None, cancel=None):
     """
-    Reconstruct video frames from compressed data.
+    Reconstruct video frames from compressed data, one at a time.
+    
+    Pipeline containers only decode the GOPs that hold the requested frames.
     
     Args:
         video_data: Dictionary with data and metadata
-        
-    Returns:
-        List of frame arrays
+        start: First frame to return
+        stop: Frame to stop before (None for the end of the video)
+        cancel: Optional CancellationToken
+    
+    Yields:
+        Frame arrays
     """
-    frames = []
+    if video_data.get('pipeline') == 'video':
+        yield from video_pipeline.decode_frames(video_data, start, stop, cancel)
+        return
+    
     width = video_data['width']
     height = video_data['height']
     grayscale = video_data.get('grayscale', False)
     
-    for frame_data in video_data['data']:
+    for frame_data in video_data['data'][start:stop]:
         if grayscale:
             shape = (height, width)
         else:
             shape = (height, width, 3)
         
-        frame = np.array(frame_data, dtype='uint8').reshape(shape)
-        frames.append(frame)
+        yield np.array(frame_data, dtype='uint8').reshape(shape)
+
+
+def reconstruct_video(video_data, start=0, stop=None):
+    """
+    Reconstruct video frames from compressed data.
     
-    return frames
+    Holds every frame in memory; use iter_reconstructed() with
+    stream_video() or save_video() to write them out instead.
+    
+    Args:
+        video_data: Dictionary with data and metadata
+        start: First frame to return
+        stop: Frame to stop before (None for the end of the video)
+    
+    Returns:
+        List of frame arrays
+    """
+    return list(iter_reconstructed(video_data, start, stop))
@@ -0,0 +1,533 @@
+"""
+Video compression pipeline.
+Codes a stream of frames one at a time, so memory holds the compressed
+video plus a few decoded frames regardless of clip length. Frames are
+grouped into GOPs (groups of pictures) that each start with a keyframe,
+so any frame can be decoded from the start of its GOP.
+"""
+
+import hashlib
+import os
+import pickle
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import wait
+from itertools import zip_longest
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from algorithms import motion
+from handlers import image_pipeline
+
+
+VIDEO_VERSION = 3
+
+# Frames per GOP; a keyframe every second or so at common frame rates
+# keeps seeking cheap for a small cost in ratio
+GOP_SIZE = 30
+
+# How frames after the first are predicted from the frame before them:
+# not at all, by wraparound subtraction, by XOR, or by subtracting a
+# motion-compensated prediction
+TEMPORAL_MODES = ['none', 'diff', 'xor', 'motion']
+
+# How far back (in frames, within a GOP) repeated and near-duplicate
+# frames are looked for; the decoder keeps this many frames
+DUPLICATE_WINDOW = 8
+
+# Edge length of the downsampled image behind the perceptual hash
+FINGERPRINT_SIZE = 8
+
+# Frames whose perceptual hashes differ in at most this many of their
+# 64 bits count as near duplicates
+NEAR_DUPLICATE_BITS = 4
+
+# GOPs VideoEncoder codes at once in worker processes
+ENCODE_WORKERS = os.cpu_count() or 1
+
+# Shared memory VideoEncoder may hold for frames of open and dispatched
+# GOPs, in bytes. Fewer GOPs are dispatched at once for large frames; once
+# two GOPs no longer fit (30 frames of 1080p colour), frames are coded
+# serially instead
+ENCODE_BUFFER_BYTES = 128 * 1024 * 1024
+
+
+def fingerprint(frame):
+    """
+    Perceptual (average) hash of a frame.
+    
+    The frame is shrunk to 8x8 brightness values and every bit says
+    whether one of them is above their mean, so noise and small changes
+    leave most bits alone.
+    
+    Args:
+        frame: uint8 frame array
+    
+    Returns:
+        64-bit integer
+    """
+    small = cv2.resize(frame, (FINGERPRINT_SIZE, FINGERPRINT_SIZE), interpolation=cv2.INTER_AREA)
+    small = small.astype(np.float32)
+    if small.ndim == 3:
+        small = small.mean(axis=2)
+    return int.from_bytes(np.packbits(small > small.mean()).tobytes(), 'big')
+
+
+def predict_frame(frame, reference, temporal):
+    """
+    Residual of a frame against the previous reconstructed frame.
+    
+    Static areas become zeros, which RLE turns into long runs and the
+    entropy coders into near one-bit symbols. 'motion' first moves every
+    block of the reference to where block matching found it, so pans and
+    moving objects leave small residuals too.
+    
+    Args:
+        frame: uint8 frame array
+        reference: Previous frame (same shape), or None for the first frame
+        temporal: One of TEMPORAL_MODES
+    
+    Returns:
+        Tuple of (uint8 residual of the frame's shape, motion vectors or None)
+    """
+    if reference is None or temporal == 'none':
+        return frame, None
+    if temporal == 'diff':
+        # uint8 arithmetic wraps around, so the residual is exact mod 256
+        return frame - reference, None
+    if temporal == 'xor':
+        return frame ^ reference, None
+    if temporal == 'motion':
+        vectors = motion.estimate(frame, reference)
+        return frame - motion.compensate(reference, vectors), vectors
+    raise ValueError(f"Unknown temporal mode: {temporal}")
+
+
+def reconstruct_frame(residual, reference, temporal, vectors=None):
+    """Invert predict_frame()."""
+    if reference is None or temporal == 'none':
+        return residual
+    if temporal == 'diff':
+        return residual + reference
+    if temporal == 'xor':
+        return residual ^ reference
+    if temporal == 'motion':
+        return residual + motion.compensate(reference, vectors)
+    raise ValueError(f"Unknown temporal mode: {temporal}")
+
+
+def _encode_frame(frame, recent, codec, params, color_transform, temporal, cancel=None, parallel=True):
+    """
+    Code one frame against the frames before it in its GOP.
+    
+    Exact repeats of a recent frame (same hash and pixels) become a
+    back-reference with no coded data. Otherwise the frame is predicted
+    from the previous frame, or from an older one whose perceptual hash is
+    closer, which catches content that flips back and forth.
+    
+    Args:
+        frame: uint8 frame array
+        recent: deque of (digest, fingerprint, frame) for the frames before
+                this one in the GOP, oldest first; the frame is appended
+    
+    Returns:
+        Frame entry dictionary
+    """
+    digest = hashlib.blake2b(np.ascontiguousarray(frame).data, digest_size=16).digest()
+    signature = fingerprint(frame) if temporal != 'none' else None
+    try:
+        for back, (seen_digest, _, seen) in enumerate(reversed(recent), 1):
+            if seen_digest == digest and np.array_equal(seen, frame):
+                return {'repeat': back}
+        
+        back, reference = 0, None
+        if temporal != 'none' and recent:
+            distances = [bin(signature ^ seen_signature).count('1') for _, seen_signature, _ in recent]
+            # Nearest hash, the latest frame among equals
+            nearest = min(range(len(recent)), key=lambda i: (distances[i], -i))
+            back = len(recent) - nearest if distances[nearest] <= NEAR_DUPLICATE_BITS else 1
+            reference = recent[-back][2]
+        
+        residual, vectors = predict_frame(frame, reference, temporal)
+        entry = image_pipeline.compress_planar(
+            residual, codec, params, color_transform=color_transform,
+            use_palette=False, cancel=cancel, parallel=parallel)
+        if vectors is not None:
+            entry['vectors'] = vectors
+        if back > 1:
+            entry['reference'] = back
+        return entry
+    finally:
+        recent.append((digest, signature, frame))
+
+
+def _encode_gop(name, shape, count, codec, params, color_transform, temporal):
+    """
+    Code one GOP held in shared memory (runs in a worker process).
+    
+    The frames are copied out of the block before coding so it can be
+    closed straight away, whatever the codecs keep referencing.
+    
+    Returns:
+        Tuple of (pickled list of frame entries, number of repeated frames)
+    """
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        frames = np.array(np.ndarray((count,) + shape, dtype=np.uint8, buffer=block.buf))
+    finally:
+        block.close()
+    
+    recent = deque(maxlen=DUPLICATE_WINDOW)
+    entries = [_encode_frame(frame, recent, codec, params, color_transform, temporal, parallel=False)
+               for frame in frames]
+    repeats = sum('repeat' in entry for entry in entries)
+    return pickle.dumps(entries, protocol=pickle.HIGHEST_PROTOCOL), repeats
+
+
+class VideoEncoder:
+    """
+    Incremental video encoder.
+    
+    Frames are coded as they are added and only their compressed form is
+    kept, along with the last DUPLICATE_WINDOW frames for prediction and
+    duplicate detection. Every gop_size frames the GOP is closed and pickled on its own, and
+    the next frame becomes a keyframe coded without a reference. Call
+    finish() for the container once the last frame is in.
+    
+    GOPs do not depend on each other, so in parallel mode frames are
+    written straight into a shared memory block per GOP and every full
+    GOP is coded in a worker process while the next one fills up. Frames
+    never pass through pickle on their way to the workers, and at most one
+    GOP per worker is waiting, fewer if their blocks would exceed
+    ENCODE_BUFFER_BYTES. Results are collected in order, so the container
+    is the same as in serial mode.
+    
+    Example:
+        encoder = VideoEncoder('huffman')
+        try:
+            for frame in video_handler.iter_frames(path):
+                encoder.add_frame(frame)
+            container = encoder.finish()
+        finally:
+            encoder.close()
+    """
+    
+    def __init__(self, codec, params=None, color_transform='none', temporal='none',
+                 gop_size=GOP_SIZE, cancel=None, parallel=True, workers=ENCODE_WORKERS):
+        """
+        Args:
+            codec: Codec key from the codec registry
+            params: Codec parameters (from codec_registry.level_params)
+            color_transform: 'none' or 'ycocg', applied to every frame
+            temporal: One of TEMPORAL_MODES
+            gop_size: Frames per GOP (keyframe interval)
+            cancel: Optional CancellationToken
+            parallel: Code GOPs in worker processes
+            workers: Most GOPs coded at once (1 codes serially)
+        """
+        if temporal not in TEMPORAL_MODES:
+            raise ValueError(f"Unknown temporal mode: {temporal}")
+        if gop_size < 1:
+            raise ValueError("GOP size must be at least 1")
+        self.codec = codec
+        self.params = params or {}
+        self.color_transform = color_transform
+        self.temporal = temporal
+        self.gop_size = gop_size
+        self.cancel = cancel
+        self.workers = workers
+        self.parallel = parallel and workers > 1
+        # GOPs that may wait on workers; set from the frame size
+        self.max_pending = workers
+        self.recent = deque(maxlen=DUPLICATE_WINDOW)
+        self.shape = None
+        self.frame_count = 0
+        self.raw_size = 0
+        self.repeats = 0
+        # Frames in the open GOP: coded entries in serial mode, slots of a
+        # shared memory block in parallel mode
+        self.gop = []
+        self.block = None
+        self.slots = None
+        # GOPs being coded by workers, as (first frame, block, future)
+        self.pending = deque()
+        # Every closed GOP with its first frame
+        self.gops = []
+        self.index = []
+    
+    def _open_block(self):
+        """Allocate shared memory for the next GOP's frames."""
+        size = self.gop_size * int(np.prod(self.shape))
+        self.block = shared_memory.SharedMemory(create=True, size=size)
+        self.slots = np.ndarray((self.gop_size,) + self.shape, dtype=np.uint8, buffer=self.block.buf)
+    
+    def _close_gop(self):
+        """Pickle or dispatch the open GOP and start a new one with a keyframe."""
+        count = len(self.gop)
+        first = self.frame_count - count
+        if self.parallel:
+            # Drop our view so the block can be closed once coded
+            self.slots = None
+            future = image_pipeline.get_pool().submit(
+                _encode_gop, self.block.name, self.shape, count, self.codec,
+                self.params, self.color_transform, self.temporal)
+            self.pending.append((first, self.block, future))
+            self.block = None
+            while len(self.pending) > self.max_pending:
+                self._collect()
+        else:
+            self.index.append(first)
+            self.gops.append(pickle.dumps(self.gop, protocol=pickle.HIGHEST_PROTOCOL))
+            self.repeats += sum('repeat' in entry for entry in self.gop)
+        self.gop = []
+        self.recent.clear()
+    
+    def _collect(self):
+        """Wait for the oldest dispatched GOP and append it."""
+        first, block, future = self.pending.popleft()
+        try:
+            # Workers cannot see the CancellationToken, so check it here
+            while not future.done():
+                if self.cancel is not None:
+                    self.cancel.check()
+                wait([future], timeout=image_pipeline.WAIT_INTERVAL)
+            gop, repeats = future.result()
+        finally:
+            block.close()
+            block.unlink()
+        self.index.append(first)
+        self.gops.append(gop)
+        self.repeats += repeats
+    
+    def add_frame(self, frame):
+        """
+        Code one frame.
+        
+        Args:
+            frame: uint8 array; every frame must have the first frame's shape
+        """
+        frame = np.asarray(frame, dtype=np.uint8)
+        if self.shape is None:
+            self.shape = frame.shape
+            # The open block and every dispatched one must fit the buffer
+            blocks = ENCODE_BUFFER_BYTES // max(self.gop_size * frame.nbytes, 1)
+            self.max_pending = min(self.workers, blocks - 1)
+            self.parallel = self.parallel and self.max_pending >= 1
+        elif frame.shape != self.shape:
+            raise ValueError(f"Frame {self.frame_count} has shape {frame.shape}, expected {self.shape}")
+        
+        if self.parallel:
+            if self.block is None:
+                self._open_block()
+            self.slots[len(self.gop)] = frame
+            # Placeholder; the worker codes the frames from the block
+            self.gop.append(None)
+        else:
+            # Coding is lossless, so later frames can refer to this one
+            self.gop.append(_encode_frame(frame, self.recent, self.codec, self.params,
+                                          self.color_transform, self.temporal, self.cancel))
+        self.frame_count += 1
+        self.raw_size += frame.nbytes
+        if len(self.gop) == self.gop_size:
+            self._close_gop()
+    
+    def finish(self):
+        """
+        Return the container for all frames added so far.
+        
+        A partly filled GOP is closed, so frames added afterwards start a
+        new GOP.
+        
+        Returns:
+            Container dictionary (picklable)
+        """
+        if self.gop:
+            self._close_gop()
+        while self.pending:
+            self._collect()
+        return {
+            'pipeline': 'video',
+            'version': VIDEO_VERSION,
+            'codec': self.codec,
+            'params': self.params,
+            'shape': self.shape,
+            'color_transform': self.color_transform,
+            'temporal': self.temporal,
+            'gop_size': self.gop_size,
+            'frame_count': self.frame_count,
+            'raw_size': self.raw_size,
+            'repeats': self.repeats,
+            'index': self.index,
+            'gops': self.gops
+        }
+    
+    def close(self):
+        """Drop unfinished GOPs and free their shared memory."""
+        self.slots = None
+        blocks = [block for _, block, _ in self.pending]
+        if self.block is not None:
+            blocks.append(self.block)
+        for _, _, future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.block = None
+        self.gop = []
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def compress_video(frames, codec, params=None, color_transform='none', temporal='none',
+                   gop_size=GOP_SIZE, cancel=None, progress=None, total=None, parallel=True,
+                   workers=ENCODE_WORKERS):
+    """
+    Compress an iterable of frames.
+    
+    Args:
+        frames: Iterable of uint8 arrays (e.g. video_handler.iter_frames())
+        codec: Codec key from the codec registry
+        params: Codec parameters
+        color_transform: 'none' or 'ycocg'
+        temporal: One of TEMPORAL_MODES
+        gop_size: Frames per GOP (keyframe interval)
+        cancel: Optional CancellationToken
+        progress: Optional callback(fraction), called after every frame
+        total: Expected frame count, needed for progress
+        parallel: Code GOPs in worker processes
+        workers: Most GOPs coded at once (1 codes serially)
+    
+    Returns:
+        Container dictionary
+    """
+    encoder = VideoEncoder(codec, params, color_transform, temporal, gop_size, cancel, parallel, workers)
+    try:
+        for frame in frames:
+            encoder.add_frame(frame)
+            if progress is not None and total:
+                progress(encoder.frame_count / total)
+        return encoder.finish()
+    finally:
+        encoder.close()
+
+
+def _gop_index(container):
+    """First frame of every GOP (version 1 containers are a single GOP)."""
+    return container['index'] if 'gops' in container else [0]
+
+
+def _load_gop(container, number):
+    """Frame entries of one GOP."""
+    if 'gops' not in container:
+        return container['frames']
+    return pickle.loads(container['gops'][number])
+
+
+def decode_frames(container, start=0, stop=None, cancel=None):
+    """
+    Decode frames start to stop - 1, one at a time.
+    
+    Decoding starts at the keyframe of the GOP holding `start`, so earlier
+    GOPs are never unpickled or decoded.
+    
+    Args:
+        container: Container dictionary
+        start: First frame to return
+        stop: Frame to stop before (None for the end of the video)
+        cancel: Optional CancellationToken
+    
+    Yields:
+        uint8 frame arrays
+    """
+    frame_count = container['frame_count']
+    stop = frame_count if stop is None else min(stop, frame_count)
+    if start < 0:
+        raise ValueError(f"Frame {start} is out of range")
+    if start >= stop:
+        return
+    
+    # Containers from before temporal prediction code every frame on its own
+    temporal = container.get('temporal', 'none')
+    index = _gop_index(container)
+    for number in range(bisect_right(index, start) - 1, len(index)):
+        if index[number] >= stop:
+            return
+        # Decoded frames that later entries can refer back to
+        recent = deque(maxlen=DUPLICATE_WINDOW)
+        for position, entry in enumerate(_load_gop(container, number), index[number]):
+            if position >= stop:
+                return
+            if 'repeat' in entry:
+                frame = recent[-entry['repeat']]
+            else:
+                reference = recent[-entry.get('reference', 1)] if temporal != 'none' and recent else None
+                residual = image_pipeline.decompress_planar(entry, cancel=cancel)
+                frame = reconstruct_frame(residual, reference, temporal, entry.get('vectors'))
+            recent.append(frame)
+            if position >= start:
+                yield frame
+
+
+def decode_frame(container, number, cancel=None):
+    """
+    Decode a single frame.
+    
+    Args:
+        container: Container dictionary
+        number: Frame number (0-based)
+        cancel: Optional CancellationToken
+    
+    Returns:
+        uint8 frame array
+    """
+    if not 0 <= number < container['frame_count']:
+        raise ValueError(f"Frame {number} is out of range (video has {container['frame_count']} frames)")
+    return next(decode_frames(container, number, number + 1, cancel))
+
+
+def decompress_video(container, cancel=None):
+    """
+    Decode a container produced by compress_video(), one frame at a time.
+    
+    Args:
+        container: Container dictionary
+        cancel: Optional CancellationToken
+    
+    Yields:
+        uint8 frame arrays
+    """
+    return decode_frames(container, cancel=cancel)
+
+
+def verify_video(container, frames, cancel=None):
+    """
+    Check that a container decodes to the given frames, streaming both.
+    
+    Args:
+        container: Container dictionary
+        frames: Iterable of the original frames (e.g. a second iter_frames())
+        cancel: Optional CancellationToken
+    
+    Returns:
+        True if every frame matches and the frame counts agree
+    """
+    for decoded, original in zip_longest(decompress_video(container, cancel), frames):
+        if decoded is None or original is None or not np.array_equal(decoded, original):
+            return False
+    return True
+
+
+def compressed_size(container):
+    """
+    Bytes of coded data in a container.
+    
+    Args:
+        container: Container dictionary
+    
+    Returns:
+        Size in bytes (pickled GOPs, or coded payload for version 1)
+    """
+    if 'gops' in container:
+        return sum(len(gop) for gop in container['gops'])
+    return sum(image_pipeline.compressed_size(entry) for entry in container['frames'])
@@ -0,0 +1,121 @@
+"""
+Reversible Integer Wavelet Transform (LeGall 5/3)
+Best for photographs and other smooth, continuous-tone images
+Splits an image into a small low-pass preview plus sparse detail bands
+"""
+
+import numpy as np
+
+
+# Decomposition levels used unless the image is too small for them
+DEFAULT_LEVELS = 5
+
+
+def _lift_forward(x):
+    """
+    One 5/3 lifting step along the last axis.
+    
+    Uses the JPEG 2000 reversible filter with whole-sample symmetric
+    extension at both edges; floor division keeps every value an integer.
+    
+    Args:
+        x: int32 array, at least 2 samples along the last axis
+    
+    Returns:
+        Tuple of (low-pass, high-pass) arrays
+    """
+    even = x[..., 0::2]
+    odd = x[..., 1::2]
+    n_odd = odd.shape[-1]
+    
+    # Predict: odd samples minus the mean of their even neighbours
+    right = np.concatenate([even[..., 1:], even[..., -1:]], axis=-1)[..., :n_odd]
+    high = odd - ((even[..., :n_odd] + right) >> 1)
+    
+    # Update: even samples plus a quarter of the neighbouring details
+    padded = np.concatenate([high[..., :1], high, high[..., -1:]], axis=-1)
+    n_even = even.shape[-1]
+    low = even + ((padded[..., :n_even] + padded[..., 1:n_even + 1] + 2) >> 2)
+    return low, high
+
+
+def _lift_inverse(low, high):
+    """Invert _lift_forward()."""
+    n_even = low.shape[-1]
+    n_odd = high.shape[-1]
+    
+    padded = np.concatenate([high[..., :1], high, high[..., -1:]], axis=-1)
+    even = low - ((padded[..., :n_even] + padded[..., 1:n_even + 1] + 2) >> 2)
+    right = np.concatenate([even[..., 1:], even[..., -1:]], axis=-1)[..., :n_odd]
+    odd = high + ((even[..., :n_odd] + right) >> 1)
+    
+    x = np.empty(low.shape[:-1] + (n_even + n_odd,), dtype=low.dtype)
+    x[..., 0::2] = even
+    x[..., 1::2] = odd
+    return x
+
+
+def max_levels(shape, levels=DEFAULT_LEVELS):
+    """
+    Clamp a level count so the coarsest band is at least 2x2 pixels before
+    its last split.
+    
+    Args:
+        shape: Image shape (H, W)
+        levels: Requested decomposition levels
+    
+    Returns:
+        Usable number of levels (0 for images smaller than 2x2)
+    """
+    smallest = min(shape[:2])
+    return max(0, min(levels, smallest.bit_length() - 1))
+
+
+def forward(plane, levels=DEFAULT_LEVELS):
+    """
+    Multi-level 2D 5/3 transform.
+    
+    Each level filters the rows, then the columns, of the previous level's
+    low-pass band, splitting it into LL, HL, LH and HH quarters.
+    
+    Args:
+        plane: 2D integer array
+        levels: Decomposition levels (clamped with max_levels())
+    
+    Returns:
+        Tuple of (LL band, details) where details lists one (HL, LH, HH)
+        tuple per level, coarsest first
+    """
+    ll = np.asarray(plane, dtype=np.int32)
+    details = []
+    for _ in range(max_levels(ll.shape, levels)):
+        low, high = _lift_forward(ll)
+        ll, lh = (band.T for band in _lift_forward(low.T))
+        hl, hh = (band.T for band in _lift_forward(high.T))
+        details.append((np.ascontiguousarray(hl), np.ascontiguousarray(lh), np.ascontiguousarray(hh)))
+        ll = np.ascontiguousarray(ll)
+    return ll, details[::-1]
+
+
+def inverse(ll, details):
+    """
+    Invert forward().
+    
+    Passing only the first k entries of details reconstructs the image at
+    1/2**(levels - k) of its size: the low-pass band of that level, which is
+    a low-pass filtered thumbnail of the image.
+    
+    Args:
+        ll: Coarsest LL band
+        details: (HL, LH, HH) tuples, coarsest first
+    
+    Returns:
+        2D int32 array
+    """
+    ll = np.asarray(ll, dtype=np.int32)
+    for hl, lh, hh in details:
+        low = _lift_inverse(ll.T, lh.T).T
+        high = _lift_inverse(hl.T, hh.T).T
+        ll = _lift_inverse(low, high)
+    return ll
+
@@ -1476,7 +1476,7 @@ def compress_document():
                 with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
                     text = f.read()
             
-            data_list = [ord(c) for c in text]
+            data_list = list(text.encode('utf-8'))
             
             results = []
             
@@ -1520,7 +1520,7 @@ def compress_text():
         if not text:
             return jsonify({'error': 'No text provided'})
         
-        data_list = [ord(c) for c in text]
+        data_list = list(text.encode('utf-8'))
         results = []
         
         # Use a default filename for text compression
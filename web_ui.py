@@ -531,43 +531,43 @@ def compress_file():
             elif ext in ['.txt', '.csv']:
                 # Text file
                 text = document_handler.load_text_file(filepath)
-                data_list = [ord(c) for c in text]
+                data_list = text.encode('utf-8')
                 file_type = 'Text Document'
                 
             elif ext == '.pdf':
                 # PDF file
                 text = document_handler.load_pdf(filepath)
-                data_list = [ord(c) for c in text]
+                data_list = text.encode('utf-8')
                 file_type = 'PDF Document'
                 
             elif ext == '.docx':
                 # DOCX file
                 text = document_handler.load_docx(filepath)
-                data_list = [ord(c) for c in text]
+                data_list = text.encode('utf-8')
                 file_type = 'DOCX Document'
                 
             else:
                 # Try as text
                 with open(filepath, 'rb') as f:
                     data_bytes = f.read()
-                data_list = list(data_bytes)
+                data_list = data_bytes
                 file_type = 'Binary File'
             
             # Run compression algorithms
             results = []
             
             if algorithm in ['all', 'rle']:
-                result = test_algorithm('RLE', rle.compress, rle.decompress, data_list, None, is_rle=True)
+                result = test_algorithm('RLE', rle.compress, rle.decompress, data_list, is_rle=True)
                 result['file_type'] = file_type
                 results.append(result)
             
             if algorithm in ['all', 'huffman']:
-                result = test_algorithm('Huffman', huffman.compress, huffman.decompress, data_list, None, is_huffman=True)
+                result = test_algorithm('Huffman', huffman.compress, huffman.decompress, data_list, is_huffman=True)
                 result['file_type'] = file_type
                 results.append(result)
             
             if algorithm in ['all', 'lzw']:
-                result = test_algorithm('LZW', lzw.compress, lzw.decompress, data_list, None)
+                result = test_algorithm('LZW', lzw.compress, lzw.decompress, data_list)
                 result['file_type'] = file_type
                 results.append(result)
             
@@ -600,20 +600,20 @@ def compress():
         if not text:
             return jsonify({'error': 'No text provided'})
         
-        data_list = [ord(c) for c in text]
+        data_list = text.encode('utf-8')
         results = []
         
         # Run selected algorithms
         if algorithm in ['all', 'rle']:
-            result = test_algorithm('RLE', rle.compress, rle.decompress, data_list, text, is_rle=True)
+            result = test_algorithm('RLE', rle.compress, rle.decompress, data_list, is_rle=True)
             results.append(result)
         
         if algorithm in ['all', 'huffman']:
-            result = test_algorithm('Huffman', huffman.compress, huffman.decompress, data_list, text, is_huffman=True)
+            result = test_algorithm('Huffman', huffman.compress, huffman.decompress, data_list, is_huffman=True)
             results.append(result)
         
         if algorithm in ['all', 'lzw']:
-            result = test_algorithm('LZW', lzw.compress, lzw.decompress, data_list, text)
+            result = test_algorithm('LZW', lzw.compress, lzw.decompress, data_list)
             results.append(result)
         
         # Generate summary
@@ -627,21 +627,19 @@ def compress():
     except Exception as e:
         return jsonify({'error': str(e)})
 
-def test_algorithm(name, compress_func, decompress_func, data_list, data_str, is_rle=False, is_huffman=False):
-    """Test an algorithm and return results."""
-    
-    # Choose data format
-    test_data = data_list if is_rle else data_str
+def test_algorithm(name, compress_func, decompress_func, data, is_rle=False, is_huffman=False):
+    """Test an algorithm on UTF-8 or raw bytes and return results."""
+    data = bytes(data)
     
     # Compress
     start = time.time()
-    compressed = compress_func(test_data)
+    compressed = compress_func(data)
     comp_time = time.time() - start
     
     # Get size
     if is_huffman:
         encoded, codes = compressed
-        comp_size = len(encoded)
+        comp_size = (len(encoded) + 7) // 8  # bitstring packed into bytes
     elif is_rle:
         comp_size = len(compressed) * 2
     else:
@@ -656,17 +654,12 @@ def test_algorithm(name, compress_func, decompress_func, data_list, data_str, is
     decomp_time = time.time() - start
     
     # Metrics
-    orig_size = len(data_str)
+    orig_size = len(data)
     ratio = comp_size / orig_size if orig_size > 0 else 1
     space_saving = ((orig_size - comp_size) / orig_size * 100) if orig_size > 0 else 0
     
-    # Verify
-    if is_huffman:
-        is_correct = ''.join(decompressed) == data_str
-    elif is_rle:
-        is_correct = list(decompressed) == data_list
-    else:
-        is_correct = decompressed == data_str
+    # Verify (every codec returns bytes, or a list of byte values for RLE)
+    is_correct = bytes(decompressed) == data
     
     return {
         'algorithm': name,